@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并发抓取 - asyncio 调度 + 每主机令牌桶限速
+
+The scrapers and poster downloads are blocking (http.client over the shared
+keep-alive session), so each job runs in a thread pool while an asyncio loop
+decides how many are in flight and when the next request to a host may start.
+
+Usage:
+    from async_fetch import fetch_all
+    results = fetch_all(codes, scrape, concurrency=8, rate=2.0)
+"""
+
+import sys
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from javbus_session import JAVBUS_BASE_URL
+from extract_code import has_source
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE = 2.0  # requests per second per host
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket
+
+    Args:
+        rate: Tokens added per second (<= 0 disables limiting)
+        burst: Bucket capacity (default: 1, i.e. evenly spaced requests)
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take one token and return how long the caller must wait for it"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def try_acquire(self):
+        """Take one token if available right now (no debt is taken on)"""
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        """Block until a token is available"""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait(self):
+        """Asynchronously wait until a token is available"""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class HostRateLimiter:
+    """One TokenBucket per host"""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host):
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[host] = bucket
+            return bucket
+
+
+def host_of_url(url):
+    """Host part of a URL ('' if it has none)"""
+    return (urlsplit(url).hostname or '') if url else ''
+
+
+async def _run_jobs(jobs, func, concurrency, limiter, host_of, local):
+    loop = asyncio.get_event_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    results = [None] * len(jobs)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        async def run(index, job):
+            async with semaphore:
+                if local is None or not local(job):
+                    await limiter.bucket(host_of(job)).wait()
+                try:
+                    results[index] = await loop.run_in_executor(executor, func, job)
+                except Exception as e:
+                    print(f"  ! {job}: {e}", file=sys.stderr)
+
+        await asyncio.gather(*(run(i, job) for i, job in enumerate(jobs)))
+
+    return results
+
+
+def run_concurrent(jobs, func, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE,
+                   host_of=None, limiter=None, local=None):
+    """
+    Run func(job) for every job with bounded concurrency and per-host pacing
+
+    Args:
+        jobs: List of job arguments (one positional argument each)
+        func: Blocking function to call
+        concurrency: Maximum jobs in flight
+        rate: Requests per second per host (ignored if limiter is given)
+        host_of: job -> host name, used to pick the rate bucket
+        limiter: Shared HostRateLimiter (to pace several batches together)
+        local: job -> True if func will answer it without a request, so it
+               does not wait for a rate token
+
+    Returns:
+        List of results in job order (None where func raised)
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    if limiter is None:
+        limiter = HostRateLimiter(rate)
+    if host_of is None:
+        host_of = lambda job: ''
+
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(
+            _run_jobs(jobs, func, max(1, concurrency), limiter, host_of, local)
+        )
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def fetch_all(codes, fetch, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE,
+              host=None, limiter=None, local=None):
+    """
+    Fetch metadata for many codes concurrently
+
+    Args:
+        codes: Iterable of codes (duplicates are fetched once)
+        fetch: code -> metadata dict or None
+
+    Returns:
+        dict code -> metadata (or None)
+    """
+    unique = list(dict.fromkeys(codes))
+    if host is None:
+        host = host_of_url(JAVBUS_BASE_URL)
+    results = run_concurrent(unique, fetch, concurrency, rate,
+                             host_of=lambda code: host, limiter=limiter, local=local)
+    return dict(zip(unique, results))
+
+
+def answered_locally(store, source, refresh, breaker=None, cache=None):
+    """
+    code -> True if the lookup will not touch the network (no rate token needed)
+
+    Args:
+        store: MetadataStore consulted before the network (None: not used)
+        source: Scraper name whose stored rows the lookup reuses
+        refresh: Stored results are ignored
+        breaker: CircuitBreaker; while it is open no request is made
+        cache: PageCache the scraper reads (None: not used); a fresh page
+            is parsed without a request
+    """
+    def local(code):
+        if not has_source(code):
+            return True
+        if breaker is not None and breaker.is_open():
+            return True
+        if cache is not None and cache.has_fresh(code):
+            return True
+        if store is None or refresh:
+            return False
+        return bool(store.get_metadata(code, source) or store.is_known_failure(code, source))
+    return local
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AV Organizer 共享 API - 进程内调用番号提取、爬虫和厂商规范化
+
+Organizers import this module instead of starting a new Python interpreter
+for every lookup. The old one-subprocess-per-call behaviour is still
+available with isolate=True for debugging a misbehaving scraper.
+
+Usage:
+    from av_api import extract_code, scrape, normalize_studio
+"""
+
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+# Get script directory
+SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from extract_code import extract_av_code
+from normalize_studio import normalize_studio as _normalize_studio
+from javbus_scraper import scrape_javbus
+from enhanced_javbus_scraper import scrape_javbus_enhanced
+from complete_javbus_scraper import scrape_javbus_complete
+from javbus_session import ScrapeError, DEFAULT_PROXY
+
+
+# scraper name -> (script file, in-process function, accepts proxy)
+SCRAPERS = {
+    'basic': ('javbus_scraper.py', scrape_javbus, False),
+    'enhanced': ('enhanced_javbus_scraper.py', scrape_javbus_enhanced, True),
+    'complete': ('complete_javbus_scraper.py', scrape_javbus_complete, True),
+}
+
+
+def run_script(script, args, timeout=None):
+    """
+    Run a bundled script in its own interpreter (isolation mode)
+
+    Returns:
+        (returncode, stdout) or (None, '') on timeout / launch error
+    """
+    try:
+        result = subprocess.run(
+            [sys.executable, str(SCRIPT_DIR / script)] + list(args),
+            capture_output=True,
+            text=True,
+            encoding='utf-8',
+            timeout=timeout
+        )
+        return result.returncode, result.stdout
+    except Exception as e:
+        print(f"  Error running {script}: {e}", file=sys.stderr)
+        return None, ''
+
+
+def extract_code(filename, isolate=False):
+    """Extract AV code from filename"""
+    if isolate:
+        returncode, stdout = run_script('extract_code.py', [filename], timeout=5)
+        return stdout.strip() if returncode == 0 else None
+    return extract_av_code(filename)
+
+
+def scrape(code, scraper='enhanced', proxy=DEFAULT_PROXY, isolate=False, timeout=20, cache=None,
+           raise_errors=False, stream=False):
+    """
+    Fetch metadata for a code with one of the bundled scrapers
+
+    Args:
+        code: AV code (e.g., SSIS-001)
+        scraper: 'basic', 'enhanced' or 'complete'
+        proxy: Proxy URL, ignored by the basic scraper
+        isolate: Run the scraper script in a subprocess
+        timeout: Subprocess timeout in seconds (isolation mode only)
+        cache: PageCache for the enhanced/complete scrapers (None disables)
+        raise_errors: Raise on failure instead of returning None (for
+                      MetadataStore.fetch, which records the error class)
+        stream: Streaming early-exit parse (enhanced scraper only)
+
+    Returns:
+        Metadata dict or None
+    """
+    script, func, accepts_proxy = SCRAPERS[scraper]
+
+    if not isolate:
+        if stream:
+            return func(code, proxy, cache=cache, raise_errors=raise_errors, stream=True)
+        if accepts_proxy:
+            return func(code, proxy, cache=cache, raise_errors=raise_errors)
+        return func(code, raise_errors=raise_errors)
+
+    args = [code]
+    if accepts_proxy:
+        if proxy:
+            args += ['--proxy', proxy]
+        if cache is None:
+            args.append('--no-cache')
+        if stream:
+            args.append('--stream')
+    returncode, stdout = run_script(script, args, timeout=timeout)
+    try:
+        data = json.loads(stdout) if returncode == 0 else None
+    except ValueError:
+        data = None
+    if not data or 'error' in data:
+        if raise_errors:
+            raise ScrapeError(f"{script} failed for {code}")
+        return None
+    return data
+
+
+def normalize_studio(studio_name, isolate=False):
+    """Normalize studio name to folder name"""
+    if isolate:
+        returncode, stdout = run_script('normalize_studio.py', [studio_name], timeout=5)
+        return stdout.strip() or 'others'
+    return _normalize_studio(studio_name)
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+状态文件位置
+
+Global state (page cache, metadata store) is keyed by code and shared by
+every library; it lives in ~/.av-organizer unless AV_ORGANIZER_HOME is set.
+Per-library state lives in a hidden .av-organizer folder inside the library.
+"""
+
+import os
+from pathlib import Path
+
+STATE_DIR_NAME = '.av-organizer'
+
+
+def global_state_dir():
+    """Directory for state shared by all libraries (created on demand)"""
+    path = Path(os.environ.get('AV_ORGANIZER_HOME') or Path.home() / STATE_DIR_NAME)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def library_state_dir(base_dir):
+    """Directory for state that belongs to one library (created on demand)"""
+    path = Path(base_dir) / STATE_DIR_NAME
+    path.mkdir(parents=True, exist_ok=True)
+    return path
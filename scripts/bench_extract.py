@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+番号提取基准 - 比较旧的双正则提取和排序候选的批量提取
+
+Runs the two-regex extractor the organizers used to carry (first
+[A-Z]{2,6}[-\\s]?\\d{3,5} match wins) and extract_code.extract_codes() over
+a list of filenames and reports names/sec and, where the expected code is
+known, how often each one is right. Filenames come from text files (one
+name per line, optionally "name<TAB>expected code"), from walking a
+library, or are generated: --synthetic N mixes clean names with the
+watermarks, encoder tags, glued site prefixes, lowercase/no-separator
+spellings, quality tags that look like codes (120fps_2160p, 500MB 1080p,
+265HEVC, a release date) and non-standard code families (FC2, HEYZO,
+Caribbeancom, 1pondo, 259LUXU) seen in download folders.
+
+Usage:
+    python bench_extract.py [names.txt ...] [--library DIR] [--synthetic N]
+                            [--rounds N] [--show N] [--json]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from extract_code import LABEL_STUDIOS, extract_codes
+
+WATERMARKS = ['hhd800.com@', 'bbs2048.org@', '[THZ.LA]', 'fun2048.com@', 'sis001.com-', '[javhd.today]',
+              'www.hjd2048.com-', '']
+TAGS = ['', '', '-C', '_FHD', '.HEVC265', ' x264 1080p', '-h264', '.AAC', '-uncensored', ' [4K]',
+        '_120fps_2160p', ' [500MB 1080p]', ' 265HEVC 1080P', ' 230101-001']
+UNKNOWN_LABELS = ['MKMP', 'SDDE', 'DVDMS', 'HUNTB', 'KIRE', 'SDAB', 'PPPE', 'OFJE', 'EBOD', 'MIAA',
+                  'TEK', 'BF', 'STARS', 'ROE', 'NSFS']
+
+
+def legacy_extract(filename):
+    """The extractor every organizer carried before extract_code.extract_codes()"""
+    name = filename.upper()
+    patterns = [
+        r'([A-Z]{2,6}[-\s]\d{3,5})',
+        r'([A-Z]{2,6}\d{3,5})',
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, name)
+        if match:
+            code = match.group(1)
+            code = re.sub(r'([A-Z]+)\s+(\d+)', r'\1-\2', code)
+            code = re.sub(r'([A-Z]+)(\d+)', r'\1-\2', code)
+            return code
+    return None
+
+
+def synthetic_names(count, seed=0):
+    """(filename, expected code) pairs shaped like real download folders ('' for no code)"""
+    rng = random.Random(seed)
+    labels = sorted(LABEL_STUDIOS) + UNKNOWN_LABELS
+    extensions = ['.mp4', '.mkv', '.avi', '.wmv', '.mp4', '.mp4']
+    names = []
+    for _ in range(count):
+        label = rng.choice(labels)
+        digits = f"{rng.randint(1, 999):03d}"
+        code = f"{label}-{digits}"
+        spelling = rng.random()
+        if spelling < 0.5:
+            core = code
+        elif spelling < 0.7:
+            core = f"{label.lower()}{digits}"
+        elif spelling < 0.85:
+            core = f"{label} {digits}"
+        else:
+            core = f"{label.lower()}_{digits}"
+        name = rng.choice(WATERMARKS) + core + rng.choice(TAGS) + rng.choice(extensions)
+        family = rng.random()
+        if family < 0.05:
+            # Non-standard families: (spelling, expected code)
+            number = rng.randint(100000, 9999999)
+            date = f"{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}{rng.randint(10, 24)}"
+            episode = f"{rng.randint(1, 999):03d}"
+            name, code = rng.choice([
+                (f"FC2-PPV-{number}", f"FC2-PPV-{number}"),
+                (f"fc2ppv_{number}", f"FC2-PPV-{number}"),
+                (f"HEYZO-{number % 10000:04d}", f"HEYZO-{number % 10000:04d}"),
+                (f"Caribbeancom {date}-{episode}", f"{date}-{episode}"),
+                (f"1pondo_{date}_{episode}", f"{date}_{episode}"),
+                (f"259LUXU-{number % 10000:04d}", f"259LUXU-{number % 10000:04d}"),
+            ])
+            name += rng.choice(extensions)
+        elif family < 0.08:
+            # No code at all
+            name, code = f"{rng.choice(['vacation', 'clip', 'movie'])}_{rng.randint(1, 99)}.mp4", ''
+        names.append((name, code))
+    return names
+
+
+def load_names(paths, library=None):
+    """(filename, expected code or None) pairs from name lists and a library walk"""
+    names = []
+    for path in paths:
+        with open(path, encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if not line:
+                    continue
+                name, _, expected = line.partition('\t')
+                names.append((name, expected.strip().upper() or None))
+    if library:
+        for root, dirs, files in os.walk(library):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            names.extend((name, None) for name in dirs + files)
+    return names
+
+
+def bench(extract_batch, filenames, rounds):
+    """Return (names/sec, codes)"""
+    codes = extract_batch(filenames)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        extract_batch(filenames)
+    elapsed = time.perf_counter() - started
+    return (rounds * len(filenames) / elapsed if elapsed else float('inf')), codes
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark AV code extraction on filenames')
+    parser.add_argument('paths', nargs='*', help='Files with one filename per line (optionally TAB expected code)')
+    parser.add_argument('--library', help='Also use every file and folder name below this directory')
+    parser.add_argument('--synthetic', type=int, default=0, help='Generate N filenames with known codes')
+    parser.add_argument('--rounds', type=int, default=1, help='Timed passes over the names')
+    parser.add_argument('--show', type=int, default=10, help='Disagreements to print')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    names = load_names(args.paths, args.library)
+    if args.synthetic or not names:
+        names.extend(synthetic_names(args.synthetic or 1000000))
+    filenames = [name for name, _ in names]
+    expected = [code for _, code in names]
+    known = [i for i, code in enumerate(expected) if code is not None]
+
+    report = {}
+    variants = [
+        ('legacy', lambda batch: [legacy_extract(name) for name in batch]),
+        ('extract_codes', extract_codes),
+    ]
+    for variant, func in variants:
+        names_per_sec, codes = bench(func, filenames, args.rounds)
+        row = {'names_per_sec': names_per_sec, 'found': sum(1 for code in codes if code), 'codes': codes}
+        if known:
+            row['correct'] = sum(1 for i in known if (codes[i] or '') == expected[i]) / len(known)
+        report[variant] = row
+
+    legacy, batch = report['legacy'].pop('codes'), report['extract_codes'].pop('codes')
+    differ = [i for i in range(len(filenames)) if legacy[i] != batch[i]]
+
+    if args.json:
+        print(json.dumps({'names': len(filenames), 'with_expected_code': len(known),
+                          'differ': len(differ), 'variants': report}, indent=2))
+        return
+
+    print(f"{len(filenames)} names ({len(known)} with an expected code), {args.rounds} rounds\n")
+    print(f"{'variant':14} {'names/s':>12} {'found':>9} {'correct':>8}")
+    for variant, row in report.items():
+        correct = f"{row['correct']:.1%}" if 'correct' in row else '-'
+        print(f"{variant:14} {row['names_per_sec']:12.0f} {row['found']:9} {correct:>8}")
+
+    print(f"\nDifferent results: {len(differ)}")
+    for i in differ[:args.show]:
+        want = f" (expected {expected[i] or 'none'})" if expected[i] is not None else ''
+        print(f"  {filenames[i]}: {legacy[i]} -> {batch[i]}{want}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+爬虫解析基准 - 用已保存的详情页离线比较各爬虫的解析器
+
+Replays recorded detail pages through the parse step of every scraper
+variant (no network) and reports pages/sec, peak memory per page and how
+often each field agrees with a reference variant. Pages come from
+fetch_full_page.py (<code>_raw.html / <code>_utf8.html) or the page cache.
+
+Fields are compared after normalizing the differences the variants are
+known to have: the code prefix of the title, relative poster URLs and the
+order of actresses.
+
+Usage:
+    python bench_parsers.py <page.html|directory> ... [--cache] [--rounds N]
+                            [--reference complete] [--only basic,complete] [--json]
+"""
+
+import os
+import sys
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from javbus_session import JAVBUS_BASE_URL
+from javbus_scraper import parse_javbus
+from enhanced_javbus_scraper import parse_javbus_enhanced
+from complete_javbus_scraper import parse_javbus_complete
+from proxy_javbus_scraper import parse_javbus_with_proxy
+from final_javbus_scraper import parse_javbus_final
+
+VARIANTS = {
+    'basic': parse_javbus,
+    'enhanced': parse_javbus_enhanced,
+    'complete': parse_javbus_complete,
+    'proxy': parse_javbus_with_proxy,
+    'final': parse_javbus_final,
+}
+
+FIELDS = ('studio', 'title', 'actresses', 'poster_url')
+
+
+def code_from_filename(path):
+    """SSIS-001_raw.html -> SSIS-001"""
+    return Path(path).stem.split('_')[0].upper()
+
+
+def load_pages(paths, use_cache=False):
+    """
+    Collect (code, html) pairs from files, directories and the page cache
+
+    When a code is recorded more than once the first page wins, with
+    <code>_raw.html preferred over other files in the same directory.
+    """
+    files = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            found = sorted(path.glob('*.html'), key=lambda p: (not p.stem.endswith('_raw'), p.name))
+            files.extend(found)
+        else:
+            files.append(path)
+
+    pages = {}
+    for path in files:
+        code = code_from_filename(path)
+        if code not in pages:
+            pages[code] = path.read_bytes().decode('utf-8', errors='ignore')
+
+    if use_cache:
+        from page_cache import get_page_cache
+        cache = get_page_cache()
+        for code in cache.codes():
+            if code not in pages:
+                body = cache.read(code)
+                if body is not None:
+                    pages[code] = body.decode('utf-8', errors='ignore')
+
+    return sorted(pages.items())
+
+
+def normalize(result, code):
+    """Comparable form of a parse result (None if the parser failed)"""
+    if not result:
+        return None
+    title = result.get('title') or ''
+    if title.upper().startswith(code):
+        title = title[len(code):]
+    normalized = {
+        'studio': result.get('studio'),
+        'title': title.strip(),
+        'actresses': sorted(result.get('actresses') or []),
+    }
+    if 'poster_url' in result:
+        poster_url = result['poster_url']
+        if poster_url and poster_url.startswith('//'):
+            poster_url = 'https:' + poster_url
+        elif poster_url and poster_url.startswith('/'):
+            poster_url = JAVBUS_BASE_URL + poster_url
+        normalized['poster_url'] = poster_url
+    return normalized
+
+
+def run_parser(func, html, code):
+    """Parse one page; exceptions count as a failed parse"""
+    try:
+        return func(html, code)
+    except Exception:
+        return None
+
+
+def bench_variant(func, pages, rounds):
+    """Return (pages/sec, peak KB of the hungriest page, normalized results)"""
+    results = [normalize(run_parser(func, html, code), code) for code, html in pages]
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for code, html in pages:
+            run_parser(func, html, code)
+    elapsed = time.perf_counter() - started
+
+    peak = 0
+    for code, html in pages:
+        tracemalloc.start()
+        run_parser(func, html, code)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    pages_per_sec = rounds * len(pages) / elapsed if elapsed else float('inf')
+    return pages_per_sec, peak / 1024, results
+
+
+def agreement(results, reference):
+    """Share of pages where each field equals the reference (None: variant lacks the field)"""
+    scores = {}
+    for field in FIELDS:
+        if not any(result is not None and field in result for result in results):
+            scores[field] = None
+            continue
+        agreed = 0
+        for result, expected in zip(results, reference):
+            got = result.get(field) if result is not None else None
+            want = expected.get(field) if expected is not None else None
+            if got == want:
+                agreed += 1
+        scores[field] = agreed / len(results)
+    return scores
+
+
+def format_score(score):
+    return '-' if score is None else f'{score:.0%}'
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark scraper parsers on recorded pages')
+    parser.add_argument('paths', nargs='*', help='Saved detail pages or directories of them')
+    parser.add_argument('--cache', action='store_true', help='Also replay pages from the page cache')
+    parser.add_argument('--rounds', type=int, default=10, help='Timed passes over the corpus')
+    parser.add_argument('--reference', default='complete', choices=sorted(VARIANTS),
+                        help='Variant the others are compared with (default: complete)')
+    parser.add_argument('--only', help='Comma separated variants to run')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    pages = load_pages(args.paths, args.cache)
+    if not pages:
+        parser.error('no pages found')
+
+    names = args.only.split(',') if args.only else list(VARIANTS)
+    unknown = [name for name in names if name not in VARIANTS]
+    if unknown:
+        parser.error(f"unknown variant: {', '.join(unknown)}")
+    if args.reference not in names:
+        names.insert(0, args.reference)
+
+    report = {}
+    for name in names:
+        pages_per_sec, peak_kb, results = bench_variant(VARIANTS[name], pages, args.rounds)
+        report[name] = {
+            'pages_per_sec': pages_per_sec,
+            'peak_kb': peak_kb,
+            'failed': sum(1 for result in results if result is None),
+            'results': results,
+        }
+    reference = report[args.reference]['results']
+    for name in names:
+        report[name]['agreement'] = agreement(report[name].pop('results'), reference)
+
+    if args.json:
+        print(json.dumps({'pages': len(pages), 'reference': args.reference, 'variants': report},
+                         indent=2))
+        return
+
+    print(f"{len(pages)} pages, {args.rounds} rounds, agreement with '{args.reference}'\n")
+    print(f"{'variant':10} {'pages/s':>10} {'peak KB':>9} {'failed':>7} "
+          + ' '.join(f'{field:>10}' for field in FIELDS))
+    for name in names:
+        row = report[name]
+        scores = ' '.join(f"{format_score(row['agreement'][field]):>10}" for field in FIELDS)
+        print(f"{name:10} {row['pages_per_sec']:10.1f} {row['peak_kb']:9.1f} {row['failed']:7} {scores}")
+
+    correct = [name for name in names
+               if all(score in (None, 1.0) for score in report[name]['agreement'].values())
+               and report[name]['failed'] <= report[args.reference]['failed']]
+    if correct:
+        fastest = max(correct, key=lambda name: report[name]['pages_per_sec'])
+        print(f"\nFastest variant agreeing on every field: {fastest}")
+
+
+if __name__ == "__main__":
+    main()
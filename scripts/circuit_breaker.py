@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+熔断器 - javbus 或代理不可用时快速切换到内置规则
+
+After `threshold` consecutive failures (timeouts, connection errors, 5xx,
+429, age verification pages) the breaker opens and every lookup is answered
+with CircuitOpenError immediately instead of waiting for its own timeout.
+Once `reset_timeout` has passed one probe request is let through
+(half-open): success closes the breaker, failure opens it again with the
+wait doubled up to `max_reset_timeout`.
+
+404s and pages that fail to parse prove the site is reachable and count as
+successes.
+
+Usage:
+    breaker = CircuitBreaker(threshold=5, reset_timeout=30)
+    metadata = breaker.call(scrape, code)   # may raise CircuitOpenError
+"""
+
+import time
+import threading
+
+from javbus_session import CircuitOpenError
+from metadata_store import classify_error
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+DEFAULT_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0    # seconds before the first probe
+MAX_RESET_TIMEOUT = 600.0
+
+# Error classes that show the site answered
+REACHABLE_ERROR_CLASSES = {'not_found', 'parse_failed'}
+
+
+def is_outage(error):
+    """True if the error means javbus / the proxy could not serve the request"""
+    return classify_error(error) not in REACHABLE_ERROR_CLASSES
+
+
+class CircuitBreaker:
+    """
+    Thread-safe consecutive-failure circuit breaker
+
+    Args:
+        threshold: Consecutive failures that open the breaker
+        reset_timeout: Seconds to wait before a half-open probe
+        max_reset_timeout: Upper bound for the doubled wait
+        is_failure: exception -> bool, which errors count as failures
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT,
+                 max_reset_timeout=MAX_RESET_TIMEOUT, is_failure=is_outage):
+        self.threshold = max(1, threshold)
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.is_failure = is_failure
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+        self.times_opened = 0
+        self.short_circuited = 0
+        self.probes = 0
+
+    def is_open(self):
+        """True while calls are being short-circuited (no probe is due yet)"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                return True
+            return self.state == OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self):
+        """Whether a call may go out now; moves an expired open breaker to half-open"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.probes += 1
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                print("  OK javbus reachable again, circuit closed")
+            self.state = CLOSED
+            self.failures = 0
+            self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+                self._open()
+            elif self.state == CLOSED and self.failures >= self.threshold:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        print(f"  ! {self.failures} consecutive failures, circuit open: "
+              f"using fallback rules, next probe in {self.reset_timeout:.0f}s")
+
+    def call(self, func, *args, **kwargs):
+        """Run func unless the breaker is open (then raise CircuitOpenError)"""
+        if not self.allow():
+            raise CircuitOpenError('javbus unavailable (circuit open)')
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def format_stats(self):
+        return (f"{self.state}, opened {self.times_opened}x, "
+                f"{self.short_circuited} short-circuited, {self.probes} probes")
@@ -17,8 +17,15 @@ if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from extract_code import extract_av_code
+from metadata_store import get_metadata_store
+from library_index import LibraryIndex
+from video_scan import ScanStats
+
 # 视频扩展名
 VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.wmv', '.flv', '.mov', '.m4v', '.rmvb', '.ts'}
+SCRAPER = 'complete'     # organize_v2 的抓取器, 统计它在元数据库中的结果
 
 def is_standard_video_folder(folder_path):
     """
@@ -156,10 +163,12 @@ def find_all_videos_in_directory(base_dir):
     
     return videos
 
-def check_video_in_standard_location(video_path):
+def check_video_in_standard_location(video_path, has_metadata=None):
     """
     检查视频是否在标准位置
     标准位置: base_dir/厂商/女优/[番号] 标题/[番号] 标题.ext
+    
+    has_metadata: 库索引中记录的 metadata.json 状态, None 时查看文件
     """
     path_parts = Path(video_path).parts
     
@@ -175,11 +184,29 @@ def check_video_in_standard_location(video_path):
         return False
     
     # 检查是否有 metadata.json
-    metadata_path = video_folder / 'metadata.json'
-    if not metadata_path.exists():
-        return False
+    if has_metadata is None:
+        has_metadata = (video_folder / 'metadata.json').exists()
     
-    return True
+    return has_metadata
+
+def count_known_codes(videos):
+    """
+    统计元数据库中已有结果的视频
+    
+    返回: (已有元数据的数量, 已知失败且未到重试时间的数量)
+    """
+    store = get_metadata_store()
+    stored = 0
+    known_failed = 0
+    for video in videos:
+        code = extract_av_code(os.path.basename(video))
+        if not code:
+            continue
+        if store.get_metadata(code, SCRAPER):
+            stored += 1
+        elif store.is_known_failure(code, SCRAPER):
+            known_failed += 1
+    return stored, known_failed
 
 def main():
     import argparse
@@ -188,6 +215,8 @@ def main():
     parser.add_argument('directory', help='要清理的目录')
     parser.add_argument('--dry-run', action='store_true', help='预览模式(不实际删除文件)')
     parser.add_argument('--clean-only', action='store_true', help='只清理，不重新整理')
+    parser.add_argument('--no-index', action='store_true', help='不使用库索引(遍历整个目录)')
+    parser.add_argument('--full', action='store_true', help='重新列出库中所有文件夹(忽略目录修改时间记录)')
     
     args = parser.parse_args()
     
@@ -229,11 +258,24 @@ def main():
         print("扫描非标准位置的视频...")
         print("=" * 70)
         
-        all_videos = find_all_videos_in_directory(base_dir)
-        non_standard_videos = [
-            v for v in all_videos 
-            if not check_video_in_standard_location(v)
-        ]
+        if args.no_index:
+            all_videos = find_all_videos_in_directory(base_dir)
+            non_standard_videos = [
+                v for v in all_videos 
+                if not check_video_in_standard_location(v)
+            ]
+        else:
+            # 只重新列出修改时间有变化的文件夹, 元数据状态取自索引
+            index = LibraryIndex(base_dir)
+            scan_stats = ScanStats()
+            index.refresh(scan_stats, full=args.full)
+            indexed = index.videos()
+            all_videos = [v['path'] for v in indexed]
+            non_standard_videos = [
+                v['path'] for v in indexed
+                if not check_video_in_standard_location(v['path'], v['has_metadata'])
+            ]
+            print(f"库索引: {index.format_stats()} ({scan_stats.format()})")
         
         print(f"找到 {len(all_videos)} 个视频文件")
         print(f"其中 {len(non_standard_videos)} 个不在标准位置")
@@ -245,6 +287,12 @@ def main():
             if len(non_standard_videos) > 10:
                 print(f"  ... 还有 {len(non_standard_videos) - 10} 个")
             
+            # 查询元数据库: 哪些可以离线重新整理, 哪些是已知抓取失败
+            stored, known_failed = count_known_codes(non_standard_videos)
+            print(f"\n元数据库中已有 {stored} 个的元数据(重新整理时无需联网)")
+            if known_failed:
+                print(f"{known_failed} 个为已知抓取失败, 重试时间前不会再请求")
+            
             print("\n提示: 运行以下命令重新整理这些视频:")
             print(f"  py -3 organize_v2.py \"{base_dir}\" --reorganize")
     
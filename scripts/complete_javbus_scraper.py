@@ -5,145 +5,313 @@ JavBus 完整爬虫 - 支持代理、正确编码和女优抓取
 
 Usage:
     python complete_javbus_scraper.py <code> [--proxy http://127.0.0.1:7890]
+    python complete_javbus_scraper.py --bench <page.html> [<page.html> ...]
+
+    --bench: 对已保存的详情页比较单次扫描提取器、旧的多次正则和
+             EnhancedJavBusParser 的解析速度，并检查单次扫描结果与旧版一致
 """
 
+import os
 import sys
 import re
 import json
-import http.cookiejar
-import urllib.request
+import time
 import urllib.error
-import ssl
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from javbus_session import (get_session, DEFAULT_PROXY, JAVBUS_BASE_URL,
+                            AgeVerificationError, ParseError)
+from page_cache import get_page_cache
+
+
+# Every field of the detail page as one alternation, scanned once from left
+# to right. Each branch is the pattern the scraper used to run as a separate
+# search over the whole page; none of them can swallow the start of another.
+# The shared "<" prefix lets the regex engine skip straight to the next tag.
+_FIELD_BRANCHES = r"""
+    h3>(?P<title>[^<]+)</h3>
+  | a[^>]*href="[^"]*/studio/[^"]*"[^>]*>(?P<studio>[^<]+)</a>
+  | a[^>]*class="bigImage"[^>]*href="(?P<poster>[^"]+)"
+  | img[^>]*src="/pics/actress/[^"]*"[^>]*title="(?P<img_title>[^"]+)"
+  | div[^>]*class="star-name"[^>]*><a[^>]*title="(?P<star_name>[^"]+)"
+"""
+
+# Avatar-waterfall spans only matter between the section's opening tag and
+# the first "</div></div>", so each part of the page gets its own scanner.
+DETAIL_TOKEN_BEFORE_AVATARS = re.compile(r"""<(?:""" + _FIELD_BRANCHES + r"""
+  | (?P<avatar_open>div[^>]*id="avatar-waterfall"[^>]*>)
+)""", re.VERBOSE)
+DETAIL_TOKEN_IN_AVATARS = re.compile(r"""<(?:""" + _FIELD_BRANCHES + r"""
+  | (?P<avatar_close>/div>\s*</div>)
+  | span>(?P<span>[^<]+)</span>
+)""", re.VERBOSE)
+DETAIL_TOKEN_AFTER_AVATARS = re.compile(r"""<(?:""" + _FIELD_BRANCHES + r""")""", re.VERBOSE)
+
+
+def _clean_actresses(actresses):
+    """Strip, drop numbers / single characters and remove duplicates in order"""
+    actresses = [a.strip() for a in actresses if a.strip()]
+    return list(dict.fromkeys([
+        a for a in actresses
+        if a and len(a) > 1 and not a.isdigit()
+    ]))
+
+
+def _absolute_poster_url(poster_url):
+    if poster_url.startswith('//'):
+        return 'https:' + poster_url
+    if poster_url.startswith('/'):
+        return JAVBUS_BASE_URL + poster_url
+    return poster_url
+
+
+def extract_detail(html, code):
+    """
+    Extract title, studio, actresses and poster from a detail page in one scan
+
+    Gives the same result as the former one-regex-per-field extraction
+    (extract_detail_multipass): first title / studio / poster win, actresses
+    are the avatar-waterfall spans (up to the first "</div></div>"), then the
+    actress image titles, then the star-name links.
+    """
+    title = studio = poster = None
+    pending_spans = []
+    avatar_spans = []
+    img_titles = []
+    star_names = []
+
+    scanner = DETAIL_TOKEN_BEFORE_AVATARS
+    pos = 0
+    while True:
+        match = scanner.search(html, pos)
+        if not match:
+            break
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'title':
+            if title is None:
+                title = value
+        elif kind == 'studio':
+            if studio is None:
+                studio = value
+        elif kind == 'poster':
+            if poster is None:
+                poster = value
+        elif kind == 'img_title':
+            img_titles.append(value)
+        elif kind == 'star_name':
+            star_names.append(value)
+        elif kind == 'span':
+            pending_spans.append(value)
+        elif kind == 'avatar_open':
+            scanner = DETAIL_TOKEN_IN_AVATARS
+        elif kind == 'avatar_close':
+            # Spans count only when the section is closed
+            avatar_spans = pending_spans
+            scanner = DETAIL_TOKEN_AFTER_AVATARS
+
+    metadata = {
+        'code': code,
+        'studio': studio.strip() if studio else None,
+        'title': None,
+        'actresses': _clean_actresses(avatar_spans + img_titles + star_names),
+        'poster_url': _absolute_poster_url(poster) if poster else None,
+    }
+    if title:
+        # Remove code prefix (e.g., "SSNI-424 " from the beginning)
+        metadata['title'] = re.sub(rf'^{code}\s+', '', title.strip()).strip()
+    return metadata
+
+
+def extract_detail_multipass(html, code):
+    """Former extraction, one regex search per field (kept as the reference)"""
+    # Initialize metadata
+    metadata = {
+        'code': code,
+        'studio': None,
+        'title': None,
+        'actresses': [],
+        'poster_url': None
+    }
+    
+    # Extract title from h3 tag
+    title_match = re.search(r'<h3>([^<]+)</h3>', html)
+    if title_match:
+        full_title = title_match.group(1).strip()
+        # Remove code prefix (e.g., "SSNI-424 " from the beginning)
+        # Pattern: CODE followed by space
+        title_cleaned = re.sub(rf'^{code}\s+', '', full_title)
+        metadata['title'] = title_cleaned.strip()
+    
+    # Extract studio
+    studio_match = re.search(r'<a[^>]*href="[^"]*\/studio\/[^"]*"[^>]*>([^<]+)</a>', html)
+    if studio_match:
+        metadata['studio'] = studio_match.group(1).strip()
+    
+    # Extract actresses - multiple methods
+    actresses = []
+    
+    # Method 1: From avatar-waterfall section with span tags
+    avatar_section = re.search(r'<div[^>]*id="avatar-waterfall"[^>]*>(.*?)</div>\s*</div>', html, re.DOTALL)
+    if avatar_section:
+        # Find all span tags with actress names
+        span_matches = re.findall(r'<span>([^<]+)</span>', avatar_section.group(1))
+        actresses.extend([a.strip() for a in span_matches if a.strip()])
+    
+    # Method 2: From img title attributes
+    img_matches = re.findall(r'<img[^>]*src="/pics/actress/[^"]*"[^>]*title="([^"]+)"', html)
+    actresses.extend([a.strip() for a in img_matches if a.strip()])
+    
+    # Method 3: From star-name div
+    star_name_matches = re.findall(r'<div[^>]*class="star-name"[^>]*><a[^>]*title="([^"]+)"', html)
+    actresses.extend([a.strip() for a in star_name_matches if a.strip()])
+    
+    # Remove duplicates and filter
+    metadata['actresses'] = list(dict.fromkeys([
+        a for a in actresses 
+        if a and len(a) > 1 and not a.isdigit()
+    ]))
+    
+    # Extract poster URL
+    poster_match = re.search(r'<a[^>]*class="bigImage"[^>]*href="([^"]+)"', html)
+    if poster_match:
+        poster_url = poster_match.group(1)
+        if poster_url.startswith('//'):
+            metadata['poster_url'] = 'https:' + poster_url
+        elif poster_url.startswith('/'):
+            metadata['poster_url'] = JAVBUS_BASE_URL + poster_url
+        else:
+            metadata['poster_url'] = poster_url
+    
+    return metadata
+
+
+def parse_javbus_complete(html, code):
+    """
+    Extract metadata from a detail page
+
+    Raises:
+        AgeVerificationError, ParseError
+    """
+    # Check for age verification
+    if 'Age Verification' in html or len(html) < 10000:
+        raise AgeVerificationError("Age verification page received")
+    
+    metadata = extract_detail(html, code)
+    
+    # Validate
+    if not metadata['title']:
+        raise ParseError(f"No title found for {code}")
+    
+    # Defaults
+    if not metadata['studio']:
+        metadata['studio'] = 'Unknown'
+    
+    return metadata
 
 
-def scrape_javbus_complete(code, proxy='http://127.0.0.1:7890'):
+def scrape_javbus_complete(code, proxy=DEFAULT_PROXY, session=None, cache=None,
+                           raise_errors=False):
     """
     Complete JavBus scraper with proper encoding and actress extraction
+
+    The shared keep-alive session for the proxy is used unless one is passed,
+    so consecutive lookups reuse the same proxy tunnel and TLS connection.
+    With a PageCache, fresh cached pages are parsed without a request.
+    With raise_errors=True failures are raised (HTTPError, timeouts,
+    AgeVerificationError, ParseError) instead of returning None.
     """
     try:
         code = code.upper().strip().replace(' ', '-')
-        url = f"https://www.javbus.com/{code}"
-        
-        # Cookie jar
-        cookie_jar = http.cookiejar.CookieJar()
-        cookie_processor = urllib.request.HTTPCookieProcessor(cookie_jar)
+        url = f"{JAVBUS_BASE_URL}/{code}"
         
-        # Proxy
-        proxy_handler = urllib.request.ProxyHandler({'http': proxy, 'https': proxy})
-        
-        # SSL
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        https_handler = urllib.request.HTTPSHandler(context=ssl_context)
-        
-        # Opener
-        opener = urllib.request.build_opener(proxy_handler, https_handler, cookie_processor)
-        
-        # Headers with age verification bypass
-        opener.addheaders = [
-            ('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'),
-            ('Accept', 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'),
-            ('Accept-Language', 'zh-CN,zh;q=0.9,ja;q=0.8,en;q=0.7'),
-            ('Cookie', 'existmag=all'),
-            ('Referer', 'https://www.javbus.com/'),
-        ]
+        # Keep-alive session (cookie existmag=all bypasses age verification)
+        if session is None:
+            session = get_session(proxy)
         
         # Fetch
-        response = opener.open(url, timeout=20)
-        html = response.read().decode('utf-8', errors='ignore')
-        
-        # Check for age verification
-        if 'Age Verification' in html or len(html) < 10000:
-            raise Exception("Age verification page received")
-        
-        # Initialize metadata
-        metadata = {
-            'code': code,
-            'studio': None,
-            'title': None,
-            'actresses': [],
-            'poster_url': None
-        }
-        
-        # Extract title from h3 tag
-        title_match = re.search(r'<h3>([^<]+)</h3>', html)
-        if title_match:
-            full_title = title_match.group(1).strip()
-            # Remove code prefix (e.g., "SSNI-424 " from the beginning)
-            # Pattern: CODE followed by space
-            title_cleaned = re.sub(rf'^{code}\s+', '', full_title)
-            metadata['title'] = title_cleaned.strip()
-        
-        # Extract studio
-        studio_match = re.search(r'<a[^>]*href="[^"]*\/studio\/[^"]*"[^>]*>([^<]+)</a>', html)
-        if studio_match:
-            metadata['studio'] = studio_match.group(1).strip()
-        
-        # Extract actresses - multiple methods
-        actresses = []
-        
-        # Method 1: From avatar-waterfall section with span tags
-        avatar_section = re.search(r'<div[^>]*id="avatar-waterfall"[^>]*>(.*?)</div>\s*</div>', html, re.DOTALL)
-        if avatar_section:
-            # Find all span tags with actress names
-            span_matches = re.findall(r'<span>([^<]+)</span>', avatar_section.group(1))
-            actresses.extend([a.strip() for a in span_matches if a.strip()])
-        
-        # Method 2: From img title attributes
-        img_matches = re.findall(r'<img[^>]*src="/pics/actress/[^"]*"[^>]*title="([^"]+)"', html)
-        actresses.extend([a.strip() for a in img_matches if a.strip()])
-        
-        # Method 3: From star-name div
-        star_name_matches = re.findall(r'<div[^>]*class="star-name"[^>]*><a[^>]*title="([^"]+)"', html)
-        actresses.extend([a.strip() for a in star_name_matches if a.strip()])
-        
-        # Remove duplicates and filter
-        metadata['actresses'] = list(dict.fromkeys([
-            a for a in actresses 
-            if a and len(a) > 1 and not a.isdigit()
-        ]))
-        
-        # Extract poster URL
-        poster_match = re.search(r'<a[^>]*class="bigImage"[^>]*href="([^"]+)"', html)
-        if poster_match:
-            poster_url = poster_match.group(1)
-            if poster_url.startswith('//'):
-                metadata['poster_url'] = 'https:' + poster_url
-            elif poster_url.startswith('/'):
-                metadata['poster_url'] = 'https://www.javbus.com' + poster_url
-            else:
-                metadata['poster_url'] = poster_url
-        
-        # Validate
-        if not metadata['title']:
-            return None
-        
-        # Defaults
-        if not metadata['studio']:
-            metadata['studio'] = 'Unknown'
+        if cache is not None:
+            body = cache.fetch(session, url, code)
+        else:
+            _, body = session.get(url)
+        html = body.decode('utf-8', errors='ignore')
         
-        return metadata
+        try:
+            return parse_javbus_complete(html, code)
+        except (AgeVerificationError, ParseError):
+            # Not a page worth keeping until the TTL runs out
+            if cache is not None:
+                cache.invalidate(code)
+            raise
     
     except urllib.error.HTTPError as e:
+        if raise_errors:
+            raise
         if e.code == 404:
             print(f"Error: {code} not found", file=sys.stderr)
         else:
             print(f"HTTP {e.code}: {e.reason}", file=sys.stderr)
         return None
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error: {e}", file=sys.stderr)
         return None
 
 
+def bench(paths, rounds=20):
+    """Parse saved pages with each extractor and print pages/sec"""
+    from enhanced_javbus_scraper import EnhancedJavBusParser
+
+    def enhanced(html, code):
+        parser = EnhancedJavBusParser()
+        parser.feed(html)
+        return parser
+
+    pages = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            html = f.read().decode('utf-8', errors='ignore')
+        code = os.path.basename(path).split('_')[0].upper()
+        pages.append((path, code, html))
+
+    mismatches = 0
+    for path, code, html in pages:
+        if extract_detail(html, code) != extract_detail_multipass(html, code):
+            print(f"MISMATCH: {path}")
+            mismatches += 1
+
+    for name, func in (('single-pass', extract_detail),
+                       ('multi-pass regex', extract_detail_multipass),
+                       ('EnhancedJavBusParser', enhanced)):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for _, code, html in pages:
+                func(html, code)
+        elapsed = time.perf_counter() - started
+        print(f"{name:22} {rounds * len(pages) / elapsed:10.1f} pages/sec")
+
+    print(f"{len(pages)} pages, {mismatches} mismatches")
+    return mismatches == 0
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument('code', help='AV code')
-    parser.add_argument('--proxy', default='http://127.0.0.1:7890')
+    parser.add_argument('code', nargs='?', help='AV code')
+    parser.add_argument('--proxy', default=DEFAULT_PROXY)
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the page cache')
+    parser.add_argument('--bench', nargs='+', metavar='PAGE', help='Benchmark extractors on saved pages')
     args = parser.parse_args()
     
-    result = scrape_javbus_complete(args.code, args.proxy)
+    if args.bench:
+        sys.exit(0 if bench(args.bench) else 1)
+    if not args.code:
+        parser.error('code is required')
+    
+    cache = None if args.no_cache else get_page_cache()
+    result = scrape_javbus_complete(args.code, args.proxy, cache=cache)
     
     if result:
         print(json.dumps(result, ensure_ascii=False, indent=2))
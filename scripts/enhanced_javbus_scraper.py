@@ -3,18 +3,27 @@
 增强版 JavBus 爬虫 - 支持海报下载
 
 Usage:
-    python enhanced_javbus_scraper.py <code>
+    python enhanced_javbus_scraper.py <code> [--stream]
+
+    --stream: 边下载边解析, 所有字段找到后立即断开连接
 
 Returns JSON with: studio, title, actresses, poster_url
 """
 
+import os
 import sys
 import re
 import json
-from urllib.request import urlopen, Request
+import time
+import codecs
+import threading
 from urllib.parse import quote
 from html.parser import HTMLParser
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from javbus_session import get_session, DEFAULT_PROXY, JAVBUS_BASE_URL, ParseError
+from page_cache import get_page_cache
+
 
 class EnhancedJavBusParser(HTMLParser):
     """Parse JavBus HTML to extract metadata including poster"""
@@ -31,8 +40,14 @@ class EnhancedJavBusParser(HTMLParser):
         self._next_is_studio = False
         self._in_title = False
         self._in_actress_section = False
+        self._actress_section_closed = False
         self._next_is_actress = False
     
+    @property
+    def done(self):
+        """True once every field has been seen and later markup cannot add to them"""
+        return bool(self.title and self.studio and self.poster_url and self._actress_section_closed)
+    
     def handle_starttag(self, tag, attrs):
         attrs_dict = dict(attrs)
         
@@ -78,6 +93,8 @@ class EnhancedJavBusParser(HTMLParser):
         if tag == 'p':
             self._in_info_section = False
         if tag == 'div':
+            if self._in_actress_section:
+                self._actress_section_closed = True
             self._in_actress_section = False
     
     def handle_data(self, data):
@@ -100,13 +117,120 @@ class EnhancedJavBusParser(HTMLParser):
             self._next_is_actress = False
 
 
-def scrape_javbus_enhanced(code, proxy=None):
+CHUNK_SIZE = 16 * 1024
+
+
+class ParseStats:
+    """Bytes received and parse time per page, for comparing full and streaming parses"""
+    
+    def __init__(self):
+        # mode -> [pages, bytes, parse seconds, early exits]; running totals
+        # only, so a --watch process does not grow with every page
+        self.modes = {}
+        self._lock = threading.Lock()
+    
+    def record(self, code, mode, received, parse_seconds, early_exit):
+        with self._lock:
+            totals = self.modes.setdefault(mode, [0, 0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += received
+            totals[2] += parse_seconds
+            totals[3] += bool(early_exit)
+    
+    def summary(self):
+        """One line per mode: pages, average KB received, average parse ms, early exits"""
+        with self._lock:
+            modes = {mode: list(totals) for mode, totals in self.modes.items()}
+        lines = []
+        for mode, (pages, received, seconds, early) in sorted(modes.items()):
+            lines.append(f"{mode}: {pages} pages, {received / pages / 1024:.1f} KB/page, "
+                         f"{seconds / pages * 1000:.2f} ms parse/page, {early} early exits")
+        return lines
+
+
+PARSE_STATS = ParseStats()
+
+
+def stream_page(session, url, parser, chunk_size=CHUNK_SIZE):
+    """
+    Feed the response to parser chunk by chunk, stopping once parser.done
+    
+    Returns:
+        (body bytes read, parse seconds, read_to_end)
+        The connection is dropped instead of pooled when the read stopped early.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    chunks = []
+    parse_seconds = 0.0
+    read_to_end = False
+    
+    with session.open(url) as response:
+        while True:
+            chunk = response.read(chunk_size)
+            if not chunk:
+                read_to_end = True
+                break
+            chunks.append(chunk)
+            started = time.perf_counter()
+            parser.feed(decoder.decode(chunk))
+            parse_seconds += time.perf_counter() - started
+            if parser.done:
+                break
+    
+    return b''.join(chunks), parse_seconds, read_to_end
+
+
+def finish_parse(parser, html, code):
+    """
+    Build the result once the parser has seen the page
+    
+    Falls back to regexes for the poster and raises ParseError when neither
+    studio nor title was found.
+    """
+    # Extract poster URL using regex as fallback
+    if not parser.poster_url:
+        # Pattern: <a class="bigImage" href="...">
+        poster_match = re.search(r'<a[^>]*class="bigImage"[^>]*href="([^"]+)"', html)
+        if poster_match:
+            parser.poster_url = poster_match.group(1)
+        else:
+            # Pattern: <img ... src="https://pics.dmm.co.jp/..."
+            img_match = re.search(r'<img[^>]*src="(https://pics\.dmm\.co\.jp/[^"]+)"', html)
+            if img_match:
+                parser.poster_url = img_match.group(1)
+    
+    # Validate results
+    if not parser.studio and not parser.title:
+        raise ParseError(f"No title or studio found for {code}")
+    
+    return {
+        'studio': parser.studio or 'Unknown',
+        'title': parser.title or code,
+        'actresses': parser.actresses,
+        'poster_url': parser.poster_url
+    }
+
+
+def parse_javbus_enhanced(html, code):
+    """Extract metadata from a detail page (raises ParseError)"""
+    parser = EnhancedJavBusParser()
+    parser.feed(html)
+    return finish_parse(parser, html, code)
+
+
+def scrape_javbus_enhanced(code, proxy=None, session=None, cache=None, raise_errors=False,
+                           stream=False):
     """
     Scrape metadata from javbus.com including poster
     
     Args:
         code: AV code (e.g., SSIS-001)
         proxy: Proxy URL (e.g., 'http://127.0.0.1:7890')
+        session: JavBusSession to use (default: shared session for proxy)
+        cache: PageCache to read/fill (default: no caching)
+        raise_errors: Raise the underlying error instead of returning None
+        stream: Parse while downloading and close the connection as soon as
+                every field is found (fresh cached pages are still used)
     
     Returns:
         dict with keys: studio, title, actresses, poster_url
@@ -117,54 +241,42 @@ def scrape_javbus_enhanced(code, proxy=None):
         code = code.upper().strip().replace(' ', '-')
         
         # Build URL
-        url = f"https://www.javbus.com/{quote(code)}"
+        url = f"{JAVBUS_BASE_URL}/{quote(code)}"
         
-        # Fetch page with user agent
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Referer': 'https://www.javbus.com/'
-        }
-        req = Request(url, headers=headers)
-        
-        # Set up proxy if provided
-        if proxy:
-            from urllib.request import ProxyHandler, build_opener
-            proxy_handler = ProxyHandler({'http': proxy, 'https': proxy})
-            opener = build_opener(proxy_handler)
-            response = opener.open(req, timeout=15)
-            html = response.read().decode('utf-8', errors='ignore')
-        else:
-            with urlopen(req, timeout=15) as response:
-                html = response.read().decode('utf-8', errors='ignore')
-        
-        # Parse HTML
+        # Fetch page over the shared keep-alive session
+        if session is None:
+            session = get_session(proxy)
         parser = EnhancedJavBusParser()
-        parser.feed(html)
         
-        # Extract poster URL using regex as fallback
-        if not parser.poster_url:
-            # Pattern: <a class="bigImage" href="...">
-            poster_match = re.search(r'<a[^>]*class="bigImage"[^>]*href="([^"]+)"', html)
-            if poster_match:
-                parser.poster_url = poster_match.group(1)
+        if stream and not (cache is not None and cache.has_fresh(code)):
+            # Streaming parse; only complete pages go into the cache
+            body, parse_seconds, read_to_end = stream_page(session, url, parser)
+            if read_to_end and cache is not None:
+                cache.put(code, body)
+            html = body.decode('utf-8', errors='ignore')
+            PARSE_STATS.record(code, 'stream', len(body), parse_seconds, not read_to_end)
+        else:
+            if cache is not None:
+                body = cache.fetch(session, url, code)
             else:
-                # Pattern: <img ... src="https://pics.dmm.co.jp/..."
-                img_match = re.search(r'<img[^>]*src="(https://pics\.dmm\.co\.jp/[^"]+)"', html)
-                if img_match:
-                    parser.poster_url = img_match.group(1)
+                _, body = session.get(url)
+            html = body.decode('utf-8', errors='ignore')
+            
+            # Parse HTML
+            started = time.perf_counter()
+            parser.feed(html)
+            PARSE_STATS.record(code, 'full', len(body), time.perf_counter() - started, False)
         
-        # Validate results
-        if not parser.studio and not parser.title:
-            return None
-        
-        return {
-            'studio': parser.studio or 'Unknown',
-            'title': parser.title or code,
-            'actresses': parser.actresses,
-            'poster_url': parser.poster_url
-        }
+        try:
+            return finish_parse(parser, html, code)
+        except ParseError:
+            if cache is not None:
+                cache.invalidate(code)
+            raise
     
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error scraping {code}: {e}", file=sys.stderr)
         return None
 
@@ -173,11 +285,20 @@ def main():
     import argparse
     parser = argparse.ArgumentParser(description='Scrape JavBus metadata')
     parser.add_argument('code', help='AV code (e.g., SSIS-001)')
-    parser.add_argument('--proxy', default='http://127.0.0.1:7890', 
-                       help='Proxy URL (default: http://127.0.0.1:7890)')
+    parser.add_argument('--proxy', default=DEFAULT_PROXY, 
+                       help=f'Proxy URL (default: {DEFAULT_PROXY or "direct"})')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the page cache')
+    parser.add_argument('--stream', action='store_true',
+                       help='Parse while downloading and stop once all fields are found')
+    parser.add_argument('--stats', action='store_true', help='Print bytes/parse time to stderr')
     args = parser.parse_args()
     
-    result = scrape_javbus_enhanced(args.code, args.proxy)
+    cache = None if args.no_cache else get_page_cache()
+    result = scrape_javbus_enhanced(args.code, args.proxy, cache=cache, stream=args.stream)
+    
+    if args.stats:
+        for line in PARSE_STATS.summary():
+            print(line, file=sys.stderr)
     
     if result:
         print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -10,82 +10,70 @@
 4. 重新处理 others/unknown 文件夹
 
 使用方法:
-    python enhanced_organizer.py <directory> [--dry-run] [--retry-failed]
+    python enhanced_organizer.py <directory> [--dry-run] [--retry-failed] [--isolate]
+                                 [--concurrency N] [--rate R] [--no-cache] [--no-store] [--refresh]
+                                 [--stream] [--max-rate MB/s] [--verify-hash]
+
+    --isolate: 每次提取/抓取/规范化都启动独立子进程（旧行为，仅用于排查问题）
+    --concurrency: 同时进行的抓取/海报下载数量（默认 4）
+    --rate: 每个主机每秒最多请求数（默认 2）
+    --no-cache: 不使用详情页磁盘缓存（默认缓存 7 天，过期后条件请求验证）
+    --no-store: 不读写元数据库（默认先查库，已知失败的番号在重试时间前不再联网）
+    --refresh: 忽略元数据库中的结果重新抓取
+    --stream: 边下载边解析详情页，字段齐全后立即断开（跳过页面剩余部分）
+    --max-rate: 跨磁盘移动（复制）时每秒最多写入多少 MB
+    --verify-hash: 跨磁盘移动时比较 SHA-256 后再删除源文件（默认只比较大小）
 """
 
 import os
 import sys
-import json
-import shutil
-import subprocess
-import time
 from pathlib import Path
 import re
-from urllib.request import urlopen, Request
 
 # Video file extensions
 VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.wmv', '.flv', '.mov', '.m4v', '.rmvb'}
+SCRAPER = 'enhanced'     # Only this scraper's rows are reused from the metadata store
 
 # Get script directory
 SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR))
 
+import av_api
+from javbus_session import get_session
+from page_cache import get_page_cache
+from metadata_store import get_metadata_store
+from enhanced_javbus_scraper import PARSE_STATS
+from video_scan import ScanStats, iter_items
+from move_engine import get_move_engine
+from name_registry import NameRegistry
+from async_fetch import (fetch_all, run_concurrent, host_of_url, HostRateLimiter,
+                         DEFAULT_CONCURRENCY, DEFAULT_RATE)
 
-def extract_code(filename):
-    """Extract AV code from filename using script"""
-    try:
-        result = subprocess.run(
-            ['python', str(SCRIPT_DIR / 'extract_code.py'), filename],
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            timeout=5
-        )
-        
-        if result.returncode == 0:
-            return result.stdout.strip()
-        return None
-    except Exception as e:
-        print(f"  Error extracting code: {e}")
-        return None
 
+def extract_code(filename, isolate=False):
+    """Extract AV code from filename"""
+    return av_api.extract_code(filename, isolate)
 
-def fetch_metadata_enhanced(code):
-    """Fetch metadata from javbus using enhanced script"""
-    try:
-        result = subprocess.run(
-            ['python', str(SCRIPT_DIR / 'enhanced_javbus_scraper.py'), code],
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            timeout=20
-        )
-        
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            # Add code to metadata
-            data['code'] = code
-            return data
-        return None
-    except Exception as e:
-        print(f"  Error fetching metadata: {e}")
-        return None
 
+def fetch_metadata_enhanced(code, isolate=False, cache=None, store=None, refresh=False,
+                            stream=False):
+    """Fetch metadata from javbus using enhanced scraper"""
+    if store is not None:
+        # Stored results and known failures are answered without a request
+        data = store.fetch(code, lambda c: av_api.scrape(c, SCRAPER, isolate=isolate, cache=cache,
+                                                          raise_errors=True, stream=stream),
+                           SCRAPER, refresh=refresh)
+    else:
+        data = av_api.scrape(code, SCRAPER, isolate=isolate, cache=cache, stream=stream)
+    if data:
+        # Add code to metadata
+        data['code'] = code
+    return data
 
-def normalize_studio(studio_name):
-    """Normalize studio name using script"""
-    try:
-        result = subprocess.run(
-            ['python', str(SCRIPT_DIR / 'normalize_studio.py'), studio_name],
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            timeout=5
-        )
-        
-        return result.stdout.strip()
-    except Exception as e:
-        print(f"  Error normalizing studio: {e}")
-        return 'others'
+
+def normalize_studio(studio_name, isolate=False):
+    """Normalize studio name to folder name"""
+    return av_api.normalize_studio(studio_name, isolate)
 
 
 def sanitize_filename(filename):
@@ -105,14 +93,8 @@ def download_poster(poster_url, target_path, code):
         return False
     
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Referer': 'https://www.javbus.com/'
-        }
-        req = Request(poster_url, headers=headers)
-        
-        with urlopen(req, timeout=15) as response:
-            image_data = response.read()
+        # Reuse the scraper's keep-alive session (same proxy, same pool)
+        response, image_data = get_session(av_api.DEFAULT_PROXY).get(poster_url)
         
         # Determine image extension
         content_type = response.headers.get('Content-Type', '')
@@ -136,46 +118,25 @@ def download_poster(poster_url, target_path, code):
         return False
 
 
-def scan_directory(directory, retry_failed=False):
+def scan_directory(directory, retry_failed=False, stats=None):
     """
     Scan for video files (both standalone and in folders)
     
     Args:
         directory: Target directory
         retry_failed: If True, only process others/ and unknown/ folders
+        stats: ScanStats counting the filesystem calls of the scan
     
     Returns:
         List of tuples: (item_path, is_folder)
     """
-    results = []
-    
-    for item in Path(directory).iterdir():
-        # Skip studio folders unless retry_failed
-        if item.is_dir() and not retry_failed:
-            # Check if it's a studio folder or special folder
-            if item.name in ['others', 'unknown']:
-                # Process contents of these folders
-                for subitem in item.iterdir():
-                    if subitem.is_file() and subitem.suffix.lower() in VIDEO_EXTENSIONS:
-                        results.append((str(subitem), False))
-                    elif subitem.is_dir():
-                        # Check if folder contains videos
-                        video_files = [f for f in subitem.rglob('*') 
-                                     if f.is_file() and f.suffix.lower() in VIDEO_EXTENSIONS]
-                        if video_files:
-                            results.append((str(subitem), True))
-            else:
-                # Check if folder contains video files (not already organized)
-                video_files = [
-                    f for f in item.rglob('*') 
-                    if f.is_file() and f.suffix.lower() in VIDEO_EXTENSIONS
-                ]
-                if video_files:
-                    results.append((str(item), True))
-        
-        elif item.is_file() and item.suffix.lower() in VIDEO_EXTENSIONS:
-            # Standalone video file
-            results.append((str(item), False))
+    if retry_failed:
+        results = list(iter_items(directory, skip_folders=True, extensions=VIDEO_EXTENSIONS,
+                                  stats=stats))
+    else:
+        # others/ and unknown/ contents are items of their own
+        results = list(iter_items(directory, expand=('others', 'unknown'),
+                                  extensions=VIDEO_EXTENSIONS, stats=stats))
     
     # If retry_failed, only process items from others/unknown
     if retry_failed:
@@ -185,15 +146,20 @@ def scan_directory(directory, retry_failed=False):
     return results
 
 
-def organize_item_enhanced(item_path, is_folder, metadata, base_directory, dry_run=False):
+def organize_item_enhanced(item_path, is_folder, metadata, base_directory, dry_run=False, isolate=False,
+                           poster_jobs=None, names=None):
     """
     Rename and move item with actress subfolder and poster download
     
+    If poster_jobs is a list, the poster download is queued on it as
+    (poster_url, actress_path, code) instead of being downloaded inline.
+    names is the NameRegistry duplicates are resolved against.
+    
     Returns:
         (success, new_path_or_error, poster_downloaded)
     """
     # Get studio folder name
-    studio_folder = normalize_studio(metadata['studio'])
+    studio_folder = normalize_studio(metadata['studio'], isolate)
     
     # Get actress name (first actress or "Unknown")
     actress_name = 'Unknown'
@@ -207,26 +173,11 @@ def organize_item_enhanced(item_path, is_folder, metadata, base_directory, dry_r
     safe_title = sanitize_filename(metadata['title'])
     new_name = f"[{metadata['code']}]-[{safe_title}]"
     
-    if is_folder:
-        # Move entire folder
-        new_path = actress_path / new_name
-    else:
-        # Move single file, preserve extension
-        ext = Path(item_path).suffix
-        new_path = actress_path / f"{new_name}{ext}"
-    
-    # Handle duplicate names
-    if new_path.exists():
-        counter = 1
-        original_new_path = new_path
-        while new_path.exists():
-            if is_folder:
-                new_path = original_new_path.parent / f"{original_new_path.name}_{counter}"
-            else:
-                stem = original_new_path.stem
-                ext = original_new_path.suffix
-                new_path = original_new_path.parent / f"{stem}_{counter}{ext}"
-            counter += 1
+    # Handle duplicate names (preserve the extension of a single file)
+    if names is None:
+        names = NameRegistry()
+    ext = '' if is_folder else Path(item_path).suffix
+    new_path = Path(names.claim(actress_path, new_name, ext))
     
     if dry_run:
         print(f"  [DRY RUN] Would move to: {new_path}")
@@ -238,12 +189,13 @@ def organize_item_enhanced(item_path, is_folder, metadata, base_directory, dry_r
         actress_path.mkdir(parents=True, exist_ok=True)
         
         # Move item
-        shutil.move(str(item_path), str(new_path))
+        get_move_engine().move(item_path, new_path)
         
         # Download poster
         poster_downloaded = False
-        if metadata.get('poster_url'):
-            time.sleep(0.5)  # Rate limiting
+        if metadata.get('poster_url') and poster_jobs is not None:
+            poster_jobs.append((metadata['poster_url'], str(actress_path), metadata['code']))
+        elif metadata.get('poster_url'):
             poster_downloaded = download_poster(
                 metadata['poster_url'], 
                 actress_path,
@@ -254,29 +206,22 @@ def organize_item_enhanced(item_path, is_folder, metadata, base_directory, dry_r
         
         return (True, str(new_path), poster_downloaded)
     except Exception as e:
+        names.release(new_path)
         return (False, str(e), False)
 
 
-def handle_failed_item(item_path, is_folder, base_directory, reason, dry_run=False):
+def handle_failed_item(item_path, is_folder, base_directory, reason, dry_run=False, names=None):
     """Move failed items to /others folder"""
     others_path = Path(base_directory) / 'others'
     
     # Keep original name
     item_name = os.path.basename(item_path)
-    new_path = others_path / item_name
+    stem, ext = (item_name, '') if is_folder else os.path.splitext(item_name)
     
     # Handle duplicates
-    if new_path.exists():
-        counter = 1
-        original_new_path = new_path
-        while new_path.exists():
-            if is_folder:
-                new_path = original_new_path.parent / f"{original_new_path.name}_{counter}"
-            else:
-                stem = original_new_path.stem
-                ext = original_new_path.suffix
-                new_path = original_new_path.parent / f"{stem}_{counter}{ext}"
-            counter += 1
+    if names is None:
+        names = NameRegistry()
+    new_path = Path(names.claim(others_path, stem, ext))
     
     if dry_run:
         print(f"  [DRY RUN] Would move to /others: {item_name} (reason: {reason})")
@@ -284,13 +229,16 @@ def handle_failed_item(item_path, is_folder, base_directory, reason, dry_run=Fal
     
     try:
         others_path.mkdir(exist_ok=True)
-        shutil.move(str(item_path), str(new_path))
+        get_move_engine().move(item_path, new_path)
         print(f"  Moved to /others: {item_name} (reason: {reason})")
     except Exception as e:
+        names.release(new_path)
         print(f"  Error moving to /others: {e}")
 
 
-def organize_av_directory_enhanced(directory, dry_run=False, retry_failed=False):
+def organize_av_directory_enhanced(directory, dry_run=False, retry_failed=False, isolate=False,
+                                   concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, use_cache=True,
+                                   use_store=True, refresh=False, stream=False):
     """
     Complete workflow to organize AV directory with enhancements
     """
@@ -298,8 +246,9 @@ def organize_av_directory_enhanced(directory, dry_run=False, retry_failed=False)
     if retry_failed:
         print("Mode: Retry failed items from /others and /unknown")
     
-    items = scan_directory(directory, retry_failed)
-    print(f"Found {len(items)} items\n")
+    scan_stats = ScanStats()
+    items = scan_directory(directory, retry_failed, scan_stats)
+    print(f"Found {len(items)} items ({scan_stats.format()})\n")
     
     if len(items) == 0:
         print("No items to process.")
@@ -309,6 +258,22 @@ def organize_av_directory_enhanced(directory, dry_run=False, retry_failed=False)
     failed_count = 0
     poster_count = 0
     
+    # Extract all codes first, then fetch metadata concurrently
+    codes = {item_path: extract_code(os.path.basename(item_path), isolate) for item_path, _ in items}
+    wanted = [code for code in codes.values() if code]
+    limiter = HostRateLimiter(rate)
+    print(f"Fetching metadata for {len(set(wanted))} codes "
+          f"(concurrency {concurrency}, {rate}/s per host)...")
+    cache = get_page_cache() if use_cache else None
+    store = get_metadata_store() if use_store else None
+    fetched = fetch_all(wanted,
+                        lambda code: fetch_metadata_enhanced(code, isolate, cache, store, refresh, stream),
+                        concurrency, limiter=limiter)
+    
+    poster_jobs = []
+    names = NameRegistry()
+    
+    # Apply moves one by one in scan order
     for item_path, is_folder in items:
         item_name = os.path.basename(item_path)
         item_type = "Folder" if is_folder else "File"
@@ -317,26 +282,22 @@ def organize_av_directory_enhanced(directory, dry_run=False, retry_failed=False)
         print(f"{item_type}: {item_name}")
         print('='*60)
         
-        # Extract code
-        print("Extracting code...")
-        code = extract_code(item_name)
+        code = codes[item_path]
         
         if not code:
             print("  ✗ Code not found")
             failed_count += 1
-            handle_failed_item(item_path, is_folder, directory, 'code_not_found', dry_run)
+            handle_failed_item(item_path, is_folder, directory, 'code_not_found', dry_run, names)
             continue
         
         print(f"  ✓ Code: {code}")
         
-        # Fetch metadata
-        print("Fetching metadata from javbus.com...")
-        metadata = fetch_metadata_enhanced(code)
+        metadata = fetched.get(code)
         
         if not metadata:
             print("  ✗ Metadata not found on javbus.com")
             failed_count += 1
-            handle_failed_item(item_path, is_folder, directory, 'metadata_not_found', dry_run)
+            handle_failed_item(item_path, is_folder, directory, 'metadata_not_found', dry_run, names)
             continue
         
         print(f"  ✓ Studio: {metadata['studio']}")
@@ -349,7 +310,7 @@ def organize_av_directory_enhanced(directory, dry_run=False, retry_failed=False)
         # Organize
         print("Organizing...")
         success, result, poster_downloaded = organize_item_enhanced(
-            item_path, is_folder, metadata, directory, dry_run
+            item_path, is_folder, metadata, directory, dry_run, isolate, poster_jobs, names
         )
         
         if success:
@@ -360,7 +321,15 @@ def organize_av_directory_enhanced(directory, dry_run=False, retry_failed=False)
         else:
             print(f"  ✗ Error: {result}")
             failed_count += 1
-            handle_failed_item(item_path, is_folder, directory, 'move_error', dry_run)
+            handle_failed_item(item_path, is_folder, directory, 'move_error', dry_run, names)
+    
+    # Download queued posters concurrently (one per target)
+    poster_jobs = list({(job[1], job[2]): job for job in poster_jobs}.values())
+    if poster_jobs:
+        print(f"\nDownloading {len(poster_jobs)} posters...")
+        results = run_concurrent(poster_jobs, lambda job: download_poster(*job), concurrency,
+                                 host_of=lambda job: host_of_url(job[0]), limiter=limiter)
+        poster_count += sum(1 for ok in results if ok)
     
     # Summary
     print(f"\n{'='*60}")
@@ -370,25 +339,52 @@ def organize_av_directory_enhanced(directory, dry_run=False, retry_failed=False)
     print(f"Success: {success_count}")
     print(f"Failed: {failed_count}")
     print(f"Posters downloaded: {poster_count}")
+    print(f"Moves: {get_move_engine().format_stats()}")
+    print(f"Connections: {get_session(av_api.DEFAULT_PROXY).format_stats()}")
+    if cache is not None:
+        print(f"Page cache: {cache.format_stats()}")
+    if store is not None:
+        print(f"Metadata store: {store.format_stats()}")
+    for line in PARSE_STATS.summary():
+        print(f"Parse ({line})")
     
     if dry_run:
         print("\n[DRY RUN] No actual changes were made")
 
 
+def get_option(name, default):
+    """Value following a command-line option, or default"""
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return default
+
+
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python enhanced_organizer.py <directory> [--dry-run] [--retry-failed]")
+        print("Usage: python enhanced_organizer.py <directory> [--dry-run] [--retry-failed] [--isolate] [--concurrency N] [--rate R] [--no-cache] [--no-store] [--refresh] [--stream] [--max-rate MB/s] [--verify-hash]")
         sys.exit(1)
     
     directory = sys.argv[1]
     dry_run = '--dry-run' in sys.argv
     retry_failed = '--retry-failed' in sys.argv
+    isolate = '--isolate' in sys.argv
+    concurrency = int(get_option('--concurrency', DEFAULT_CONCURRENCY))
+    rate = float(get_option('--rate', DEFAULT_RATE))
+    use_cache = '--no-cache' not in sys.argv
+    use_store = '--no-store' not in sys.argv
+    refresh = '--refresh' in sys.argv
+    stream = '--stream' in sys.argv
+    max_rate = float(get_option('--max-rate', 0)) * 1024 ** 2
+    get_move_engine().configure(max_rate or None, '--verify-hash' in sys.argv)
     
     if not os.path.isdir(directory):
         print(f"Error: Directory not found: {directory}")
         sys.exit(1)
     
-    organize_av_directory_enhanced(directory, dry_run, retry_failed)
+    organize_av_directory_enhanced(directory, dry_run, retry_failed, isolate, concurrency, rate,
+                                   use_cache, use_store, refresh, stream)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+待补全队列 - 记录用内置规则整理的条目，之后联网补全片名和女优
+
+hybrid_organizer.py stores every item it organized with fallback metadata
+in <library>/.av-organizer/enrich-queue.json; `--enrich` later looks those
+codes up again and moves the items to their proper studio/actress folder.
+The parts of one code (ABC-123-CD1, ABC-123-CD2) share one entry.
+
+Usage:
+    python enrich_queue.py <library>
+"""
+
+import sys
+import json
+import time
+import threading
+
+from av_state import library_state_dir
+
+
+class EnrichQueue:
+    """
+    Per-library queue of items organized without javbus metadata
+
+    Args:
+        base_dir: Library root
+    """
+
+    def __init__(self, base_dir):
+        self.path = library_state_dir(base_dir) / 'enrich-queue.json'
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def add(self, code, path, is_folder, reason):
+        """Queue an item; further parts of a queued code go to its 'parts' list"""
+        with self._lock:
+            entry = self.entries.get(code)
+            if entry and entry['path'] != str(path):
+                part = {'path': str(path), 'is_folder': is_folder}
+                if part not in entry.setdefault('parts', []):
+                    entry['parts'].append(part)
+                return
+            self.entries[code] = {
+                'path': str(path),
+                'is_folder': is_folder,
+                'reason': reason,
+                'queued_at': time.time(),
+            }
+
+    def remove(self, code):
+        with self._lock:
+            self.entries.pop(code, None)
+
+    def items(self):
+        """(code, entry) pairs in code order"""
+        with self._lock:
+            return sorted(self.entries.items())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def save(self):
+        with self._lock:
+            tmp = self.path.with_suffix('.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+            tmp.replace(self.path)
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python enrich_queue.py <library>")
+        sys.exit(1)
+
+    queue = EnrichQueue(sys.argv[1])
+    for code, entry in queue.items():
+        print(f"{code}\t{entry['reason']}\t{entry['path']}")
+    print(f"{len(queue)} items waiting for enrichment")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,65 +2,376 @@
 """
 AV Code Extractor - Extract AV codes from filenames
 
+Every LETTERS[-]DIGITS run in a name is a candidate; candidates are ranked
+instead of taking the first one, so a site watermark (HHD800.COM@ABP-123)
+or junk glued to the label ([THZ.LA]thzlaabp123) does not win over the real
+code. A candidate scores higher when its label is a known studio label,
+when it is written with a separator, and lower when it is a known watermark.
+Known labels are kept in a trie of reversed labels, so a known label at the
+end of a longer letter run is found in one walk from the digits backwards.
+
+The patterns and the trie are compiled once at import; extract_codes()
+extracts a whole batch with a per-batch cache for repeated names.
+
 Usage:
     python extract_code.py <filename>
+    python extract_code.py --candidates <filename>
 
 Returns the extracted code or empty string if not found
 """
 
+import os
 import sys
 import re
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from studio_table import get_studio_table
+
+
+# Studio labels (code prefix -> studio), used to rank candidates and as the
+# fallback studio when no metadata can be fetched; kept in studios.json
+LABEL_STUDIOS = get_studio_table().label_studios()
+
+# Letter runs that look like codes but are site watermarks or encoder tags
+JUNK_LABELS = {'HHD', 'HJD', 'SIS', 'BBS', 'FUN', 'THZ', 'JAVHD', 'FHD', 'HEVC', 'AVC', 'AAC', 'DTS',
+               'FPS', 'MB', 'GB', 'KBPS', 'MBPS', 'BIT'}
+
+MIN_LABEL = 2           # letters of an unknown label
+MAX_LABEL = 6
+
+SCORE_KNOWN = 4
+SCORE_SEPARATOR = 2     # ABC-123 / ABC 123
+SCORE_UNDERSCORE = 1    # ABC_123
+SCORE_TRUNCATED = -1    # unknown label cut from a longer letter run
+SCORE_JUNK = -6
+SCORE_NAMED_FAMILY = SCORE_KNOWN + SCORE_SEPARATOR  # FC2-PPV-123456, HEYZO-1234
+SCORE_DATE_CODE = 0     # 010121-001: ties with a bare ABC123 and loses to ABC-123
+
+# A letter run, an optional separator and 3-5 digits not followed by another digit
+CANDIDATE_RE = re.compile(r'([A-Z]+)([-_\s]?)(\d{3,5})(?!\d)')
+
+# Part numbers and variant tags right after the code (ABC-123-CD1, ABC-123-C,
+# abc123hhb); a tag must end at a separator or the end of the name
+PART_RE = re.compile(r'(?:[-_. ]?(?:CD|PART|PT|DISC|DISK)[-_ ]?(\d{1,2})|[-_]([1-9])'
+                     r'|[-_.]?(CH|UC|HHB|FHD|HD|4K|UNCENSORED|LEAKED|LEAK|[A-Z]))(?=[-_. \[(]|$)')
+# The same suffixes at the end of the name, where the organizers put them
+# after the title ([ABC-123] Title-CD1.mp4). A single letter there is only
+# a variant tag if it is one of the known variant letters (C: Chinese
+# subtitles, U: uncensored), unless the name is one an organizer wrote
+# ([ABC-123] ...), whose lettered parts (-A, -B) are kept too
+_END_TAGS = r'CD\d{1,2}|CH|UC|HHB|FHD|HD|4K|UNCENSORED|LEAKED|LEAK'
+_END_AHEAD = r'(?=(?:\.[A-Z0-9]{2,4})?$)'
+END_PART_RE = re.compile(r'(?:-(?:%s|[CU]))+%s' % (_END_TAGS, _END_AHEAD))
+ORGANIZED_END_PART_RE = re.compile(r'(?:-(?:%s|[A-Z]))+%s' % (_END_TAGS, _END_AHEAD))
+
+_END = None             # trie key marking the end of a label
+
+
+class CodeFamily:
+    """
+    Codes that do not follow LETTERS-DIGITS, with their own spelling and source
+
+    Args:
+        name: Family name
+        pattern: Regex on the uppercased filename (also matches the normalized code)
+        template: str.format template building the code from the pattern's groups
+        source: Site that has metadata for the family ('javbus'), or None when
+            no supported source does and lookups would only time out
+        studio: Studio for the fallback rules (None: look the label up)
+        score: Rank of a match among the LETTERS-DIGITS candidates; None for
+            patterns with (prefix, label, separator, digits) groups, which are
+            ranked like a candidate with that label and separator
+    """
+
+    def __init__(self, name, pattern, template, source, studio=None, score=SCORE_NAMED_FAMILY):
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.template = template
+        self.source = source
+        self.studio = studio
+        self.score = score
+
+    def normalize(self, match):
+        return self.template.format(*match.groups())
+
+
+# Ranked together with the LETTERS-DIGITS candidates, so a quality tag
+# (120FPS_2160P) or a date (230101-001) next to a real code does not win
+CODE_FAMILIES = [
+    CodeFamily('fc2', r'FC2[-_ ]?(?:PPV[-_ ]?)?(\d{5,8})(?!\d)', 'FC2-PPV-{0}', None, 'FC2'),
+    CodeFamily('heyzo', r'HEYZO[-_ ]?(?:HD[-_ ]?)?(\d{4})(?!\d)', 'HEYZO-{0}', 'javbus', 'HEYZO'),
+    CodeFamily('caribbeancom', r'(?<!\d)(\d{6})-(\d{3})(?!\d)', '{0}-{1}', 'javbus', 'Caribbeancom',
+               SCORE_DATE_CODE),
+    CodeFamily('1pondo', r'(?<!\d)(\d{6})_(\d{3})(?!\d)', '{0}_{1}', 'javbus', '1pondo', SCORE_DATE_CODE),
+    # MGStage amateur labels keep their numeric prefix (259LUXU-1234, 300MIUM-123);
+    # without a separator only a known label counts (not 265HEVC1080)
+    CodeFamily('mgstage', r'(?<![A-Z\d])(\d{3})([A-Z]{2,6})([-_ ]?)(\d{3,5})(?!\d)', '{0}{1}-{3}', 'javbus',
+               score=None),
+]
+
+FAMILY_RE = re.compile('|'.join('(?P<f%d>%s)' % (i, family.pattern.pattern)
+                                for i, family in enumerate(CODE_FAMILIES)))
+# Cheap test that rules out FAMILY_RE (slow: no common prefix) for most names
+FAMILY_HINT_RE = re.compile(r'FC2|HEYZO|\d\d\d(?:[A-Z][A-Z]|\d\d\d[-_])')
+# Letters of a code that name its label, after an MGStage-style numeric prefix
+LABEL_RE = re.compile(r'\d*([A-Z]+)')
+
+
+def _family_candidates(name, trie):
+    """(score, position, code, match end) of every code family occurrence in an uppercased name"""
+    found = []
+    for match in FAMILY_RE.finditer(name):
+        for i, family in enumerate(CODE_FAMILIES):
+            text = match.group('f%d' % i)
+            if text is None:
+                continue
+            groups = family.pattern.match(text)
+            score = family.score
+            if score is None:
+                label, separator = groups.group(2), groups.group(3)
+                scored = _score(label, separator, trie)
+                if scored is None or not (separator or known_label_length(label, trie) == len(label)):
+                    break
+                score = scored[0]
+            found.append((score, match.start(), family.normalize(groups), match.end()))
+            break
+    return found
+
+
+def code_family(code):
+    """The CodeFamily of a normalized code, or None for a LETTERS-DIGITS code"""
+    if not code:
+        return None
+    for family in CODE_FAMILIES:
+        if family.pattern.fullmatch(code):
+            return family
+    return None
+
+
+def has_source(code):
+    """False for codes of a family no supported site has metadata for (skip the lookup)"""
+    family = code_family(code)
+    return family is None or family.source is not None
+
+
+def code_label(code):
+    """Studio label of a normalized code (LUXU for 259LUXU-1234), or None"""
+    match = LABEL_RE.match(code.upper()) if code else None
+    return match.group(1) if match else None
+
+
+def build_label_trie(labels):
+    """Trie of the reversed labels (nested dicts, _END marks a complete label)"""
+    root = {}
+    for label in labels:
+        node = root
+        for char in reversed(label.upper()):
+            node = node.setdefault(char, {})
+        node[_END] = True
+    return root
+
+
+LABEL_TRIE = build_label_trie(LABEL_STUDIOS)
+
+
+def known_label_length(run, trie=LABEL_TRIE):
+    """Length of the longest known label that ends run (0 if none)"""
+    node = trie
+    longest = 0
+    for i in range(len(run) - 1, -1, -1):
+        node = node.get(run[i])
+        if node is None:
+            break
+        if _END in node:
+            longest = len(run) - i
+    return longest
+
+
+def _score(run, separator, trie):
+    """(score, label) of one candidate, or None if its letter run is no label"""
+    score = 0
+    known = known_label_length(run, trie)
+    if known:
+        label = run[-known:]
+        score += SCORE_KNOWN
+    elif len(run) < MIN_LABEL:
+        return None
+    else:
+        label = run[-MAX_LABEL:]
+        if len(run) > MAX_LABEL:
+            score += SCORE_TRUNCATED
+        if label in JUNK_LABELS:
+            score += SCORE_JUNK
+    if separator == '_':
+        score += SCORE_UNDERSCORE
+    elif separator:
+        score += SCORE_SEPARATOR
+    return score, label
+
+
+def code_candidates(filename, trie=LABEL_TRIE):
+    """
+    All codes in a filename (code families included), best first
+
+    Returns:
+        List of (score, position, code); equal scores keep name order
+    """
+    name = filename.upper()
+    candidates = []
+    if FAMILY_HINT_RE.search(name):
+        candidates.extend(found[:3] for found in _family_candidates(name, trie))
+    for match in CANDIDATE_RE.finditer(name):
+        run, separator, digits = match.groups()
+        scored = _score(run, separator, trie)
+        if scored is not None:
+            candidates.append((scored[0], match.start(), scored[1] + '-' + digits))
+    candidates.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+    return candidates
+
 
 def extract_av_code(filename):
     """
     Extract AV code from filename
-    
+
     Common patterns:
     - SSIS-001
     - IPX-123
     - MIDV-456
     - ABP-789
     - etc.
-    
+
+    and the CODE_FAMILIES (FC2-PPV-1234567, HEYZO-1234, 010121-001,
+    010121_001, 259LUXU-1234).
+
     Args:
         filename: Full filename or path
-    
+
     Returns:
-        Extracted code (uppercase) or None
+        Extracted code (uppercase, LABEL-DIGITS or the family's form) or None
     """
-    # Remove file extension and path
     name = filename.upper()
-    
-    # Pattern: Letters + hyphen/space + numbers
-    # Examples: SSIS-001, IPX 123, MIDV-456
-    patterns = [
-        r'([A-Z]{2,6}[-\s]\d{3,5})',  # Standard: ABC-123 or ABC 123
-        r'([A-Z]{2,6}\d{3,5})',       # No separator: ABC123
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, name)
-        if match:
-            code = match.group(1)
-            # Normalize to hyphen format
-            code = re.sub(r'([A-Z]+)\s+(\d+)', r'\1-\2', code)
-            code = re.sub(r'([A-Z]+)(\d+)', r'\1-\2', code)
-            return code
-    
-    return None
+    if FAMILY_HINT_RE.search(name):
+        candidates = code_candidates(name)
+        return candidates[0][2] if candidates else None
+    # code_candidates()[0] without building and sorting the list
+    best = None
+    best_score = None
+    for run, separator, digits in CANDIDATE_RE.findall(name):
+        scored = _score(run, separator, LABEL_TRIE)
+        if scored is not None and (best_score is None or scored[0] > best_score):
+            best_score = scored[0]
+            best = scored[1] + '-' + digits
+    return best
+
+
+def split_code(filename):
+    """
+    Code and part/variant suffix of a filename
+
+    The suffix is read right after the last occurrence of the code, or else
+    at the end of the name (names written by the organizers, such as
+    [ABC-123] Title-CD1.mp4, split the same way as ABC-123-CD1.mp4). At the
+    end of other names a single letter only counts as the variant letters C
+    and U, so "ABC-123 Title-A.mp4" has no suffix. Part numbers are written
+    CD<n>.
+
+    Returns:
+        (code, suffix), e.g. ('ABC-123', 'CD1'), ('ABC-123', 'C'),
+        ('ABC-123', ''); (None, '') without a code
+    """
+    code = extract_av_code(filename)
+    if code is None:
+        return None, ''
+    name = filename.upper()
+    end = None
+    for _, _, found, found_end in _family_candidates(name, LABEL_TRIE):
+        if found == code:
+            end = found_end
+    if end is None:
+        for match in CANDIDATE_RE.finditer(name):
+            scored = _score(match.group(1), match.group(2), LABEL_TRIE)
+            if scored is not None and scored[1] + '-' + match.group(3) == code:
+                end = match.end()
+    if name[end:end + 1] in (']', ')'):
+        end += 1
+    if not PART_RE.match(name, end):
+        organized = name.startswith('[' + code + ']')
+        at_end = (ORGANIZED_END_PART_RE if organized else END_PART_RE).search(name, end)
+        if at_end:
+            end = at_end.start()
+    parts = []
+    match = PART_RE.match(name, end)
+    while match:
+        number = match.group(1) or match.group(2)
+        parts.append("CD%d" % int(number) if number else match.group(3))
+        match = PART_RE.match(name, match.end())
+    return code, '-'.join(parts)
+
+
+def group_by_code(items, name=lambda item: item):
+    """
+    Group the parts and variants of one code into one work unit
+
+    Args:
+        items: Items to group (filenames, or anything name() maps to one)
+        name: Filename of an item
+
+    Returns:
+        List of (code, [(item, suffix), ...]) in the order each code first
+        appears; every item without a code is a unit of its own (code None)
+    """
+    units = []
+    by_code = {}
+    for item in items:
+        code, suffix = split_code(name(item))
+        if code is None:
+            units.append((None, [(item, suffix)]))
+        elif code in by_code:
+            by_code[code].append((item, suffix))
+        else:
+            by_code[code] = [(item, suffix)]
+            units.append((code, by_code[code]))
+    return units
+
+
+def extract_codes(filenames):
+    """
+    Extract the codes of many filenames
+
+    Args:
+        filenames: Iterable of filenames or paths
+
+    Returns:
+        List of codes (None where no code was found), in input order
+    """
+    seen = {}
+    codes = []
+    for filename in filenames:
+        code = seen.get(filename, False)
+        if code is False:
+            code = seen[filename] = extract_av_code(filename)
+        codes.append(code)
+    return codes
 
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python extract_code.py <filename>")
+    args = sys.argv[1:]
+    show_candidates = '--candidates' in args
+    if show_candidates:
+        args.remove('--candidates')
+    if len(args) != 1:
+        print("Usage: python extract_code.py [--candidates] <filename>")
         sys.exit(1)
-    
-    filename = sys.argv[1]
+
+    filename = args[0]
+    if show_candidates:
+        for score, position, code in code_candidates(filename):
+            print("{:3d}  {}".format(score, code))
     code = extract_av_code(filename)
-    
+
     if code:
-        print(code)
+        if not show_candidates:
+            print(code)
         sys.exit(0)
     else:
         sys.exit(1)
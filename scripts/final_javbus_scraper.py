@@ -15,6 +15,70 @@ import urllib.error
 import ssl
 
 
+def parse_javbus_final(html, code):
+    """
+    Extract metadata from a detail page
+    """
+    # Extract metadata
+    metadata = {
+        'code': code,
+        'studio': None,
+        'title': None,
+        'actresses': [],
+        'poster_url': None
+    }
+    
+    # Extract title
+    title_match = re.search(r'<h3>([^<]+)</h3>', html)
+    if title_match:
+        metadata['title'] = title_match.group(1).strip()
+    
+    # Extract studio
+    studio_match = re.search(r'<a[^>]*href="[^"]*\/studio\/[^"]*"[^>]*>([^<]+)</a>', html)
+    if studio_match:
+        metadata['studio'] = studio_match.group(1).strip()
+    
+    # Extract actresses - multiple patterns
+    # Pattern 1: avatar-box with title attribute
+    actress_pattern1 = r'<a[^>]*class="avatar-box"[^>]*title="([^"]+)"'
+    matches1 = re.findall(actress_pattern1, html)
+    
+    # Pattern 2: span inside avatar waterfall
+    actress_pattern2 = r'<div[^>]*class="star-name"[^>]*>([^<]+)</div>'
+    matches2 = re.findall(actress_pattern2, html)
+    
+    # Pattern 3: text after avatar image
+    actress_pattern3 = r'<div[^>]*id="avatar-waterfall"[^>]*>.*?<span>([^<]+)</span>'
+    matches3 = re.findall(actress_pattern3, html, re.DOTALL)
+    
+    # Combine all matches
+    all_actresses = list(set(matches1 + matches2 + matches3))
+    metadata['actresses'] = [a.strip() for a in all_actresses if a.strip() and len(a.strip()) > 1]
+    
+    # Extract poster
+    poster_match = re.search(r'<a[^>]*class="bigImage"[^>]*href="([^"]+)"', html)
+    if poster_match:
+        poster_url = poster_match.group(1)
+        if poster_url.startswith('//'):
+            metadata['poster_url'] = 'https:' + poster_url
+        elif poster_url.startswith('/'):
+            metadata['poster_url'] = 'https://www.javbus.com' + poster_url
+        else:
+            metadata['poster_url'] = poster_url
+    
+    # Validate
+    if not metadata['studio'] and not metadata['title']:
+        return None
+    
+    # Defaults
+    if not metadata['studio']:
+        metadata['studio'] = 'Unknown'
+    if not metadata['title']:
+        metadata['title'] = code
+    
+    return metadata
+
+
 def scrape_javbus_final(code, proxy='http://127.0.0.1:7890'):
     """
     Scrape javbus with age verification bypass
@@ -67,64 +131,7 @@ def scrape_javbus_final(code, proxy='http://127.0.0.1:7890'):
             response = opener.open(url, timeout=20)
             html = response.read().decode('utf-8', errors='ignore')
         
-        # Extract metadata
-        metadata = {
-            'code': code,
-            'studio': None,
-            'title': None,
-            'actresses': [],
-            'poster_url': None
-        }
-        
-        # Extract title
-        title_match = re.search(r'<h3>([^<]+)</h3>', html)
-        if title_match:
-            metadata['title'] = title_match.group(1).strip()
-        
-        # Extract studio
-        studio_match = re.search(r'<a[^>]*href="[^"]*\/studio\/[^"]*"[^>]*>([^<]+)</a>', html)
-        if studio_match:
-            metadata['studio'] = studio_match.group(1).strip()
-        
-        # Extract actresses - multiple patterns
-        # Pattern 1: avatar-box with title attribute
-        actress_pattern1 = r'<a[^>]*class="avatar-box"[^>]*title="([^"]+)"'
-        matches1 = re.findall(actress_pattern1, html)
-        
-        # Pattern 2: span inside avatar waterfall
-        actress_pattern2 = r'<div[^>]*class="star-name"[^>]*>([^<]+)</div>'
-        matches2 = re.findall(actress_pattern2, html)
-        
-        # Pattern 3: text after avatar image
-        actress_pattern3 = r'<div[^>]*id="avatar-waterfall"[^>]*>.*?<span>([^<]+)</span>'
-        matches3 = re.findall(actress_pattern3, html, re.DOTALL)
-        
-        # Combine all matches
-        all_actresses = list(set(matches1 + matches2 + matches3))
-        metadata['actresses'] = [a.strip() for a in all_actresses if a.strip() and len(a.strip()) > 1]
-        
-        # Extract poster
-        poster_match = re.search(r'<a[^>]*class="bigImage"[^>]*href="([^"]+)"', html)
-        if poster_match:
-            poster_url = poster_match.group(1)
-            if poster_url.startswith('//'):
-                metadata['poster_url'] = 'https:' + poster_url
-            elif poster_url.startswith('/'):
-                metadata['poster_url'] = 'https://www.javbus.com' + poster_url
-            else:
-                metadata['poster_url'] = poster_url
-        
-        # Validate
-        if not metadata['studio'] and not metadata['title']:
-            return None
-        
-        # Defaults
-        if not metadata['studio']:
-            metadata['studio'] = 'Unknown'
-        if not metadata['title']:
-            metadata['title'] = code
-        
-        return metadata
+        return parse_javbus_final(html, code)
     
     except urllib.error.HTTPError as e:
         if e.code == 404:
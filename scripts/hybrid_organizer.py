@@ -7,105 +7,145 @@
 1. 尝试从 javbus.com 抓取真实片名和女优
 2. 失败时使用内置规则（番号作为标题，Unknown 女优）
 3. 支持女优二级文件夹
-4. 支持海报下载（当可用时）
+4. 支持海报下载（当可用时）；已有的有效海报不再下载，下载失败的记入重试队列，之后的运行中重试
 5. 支持 --retry-failed 重新处理 others/unknown
+6. javbus 连续失败时熔断，直接使用内置规则；用内置规则整理的条目记入待补全队列
+7. --watch 常驻监视下载目录，下载完成（大小稳定、无临时文件）的条目立即整理
+8. --plan 只抓取并写出移动计划（JSON），--apply 离线执行保存的计划
+9. 每次整理先把计划写入预写日志；被中断的整理在下次运行时从日志继续，不重新扫描和抓取
+10. 抓取、移动、海报下载组成流水线重叠执行，各阶段单独设置线程数并报告忙碌比例
+11. 同一番号的分段和版本（-CD1、-CD2、-C 等）合并为一个单元：只抓取一次、只下载一张海报，文件名保留后缀
+12. 识别 FC2-PPV、HEYZO、加勒比 (010121-001)、一本道 (010121_001)、259LUXU 等非标准番号；没有数据源的番号 (FC2) 不联网，直接使用内置规则
+13. 内置规则不认识的番号前缀，按已抓取元数据中该前缀的厂牌统计决定厂牌（label_learner.py）
 
 使用方法:
-    python hybrid_organizer.py <directory> [--dry-run] [--retry-failed] [--first-only]
+    python hybrid_organizer.py <directory> [--dry-run] [--retry-failed] [--first-only] [--isolate]
+                               [--concurrency N] [--rate R] [--no-cache] [--no-store] [--refresh]
+                               [--stream] [--enrich] [--breaker-threshold N] [--breaker-reset S]
+                               [--watch] [--settle S] [--poll S] [--max-rate MB/s] [--verify-hash]
+                               [--plan FILE] [--apply FILE] [--move-workers N] [--label-confidence P]
+
+    --isolate: 每次抓取都启动独立的爬虫子进程（旧行为，仅用于排查问题）
+    --concurrency: 同时进行的抓取/海报下载数量（默认 4）
+    --rate: 每个主机每秒最多请求数（默认 2）
+    --no-cache: 不使用详情页磁盘缓存（默认缓存 7 天，过期后条件请求验证）
+    --no-store: 不读写元数据库（默认先查库，已知失败的番号在重试时间前不再联网）
+    --refresh: 忽略元数据库中的结果重新抓取
+    --stream: 边下载边解析详情页，字段齐全后立即断开（跳过页面剩余部分）
+    --enrich: 重新抓取待补全队列中的条目（之前用内置规则整理的），成功后移动到正确位置
+    --breaker-threshold: 连续失败多少次后熔断（默认 5，0 表示不熔断）
+    --breaker-reset: 熔断后多少秒再试探一次（默认 30，试探失败则加倍）
+    --watch: 常驻监视目录（Linux 用 inotify，其他系统轮询），Ctrl+C 退出
+    --settle: 大小和修改时间保持多少秒不变才算下载完成（默认 30）
+    --poll: 每隔多少秒列一次目录，代替 inotify
+    --max-rate: 跨磁盘移动（复制）时每秒最多写入多少 MB
+    --verify-hash: 跨磁盘移动时比较 SHA-256 后再删除源文件（默认只比较大小）
+    --plan: 扫描、抓取并把完整的移动计划写入 FILE，不移动任何文件
+    --apply: 执行 --plan 保存的计划（只做文件操作，可中断后重新执行）
+    --move-workers: 同时进行的移动数量（默认 1，目标在不同磁盘时可调大）
+    --label-confidence: 内置规则使用学习到的前缀厂牌时，该厂牌至少占前缀已见番号的比例（默认 0.6）
 """
 
 import os
 import sys
-import json
-import shutil
-import subprocess
-import time
+import threading
+from itertools import islice
 from pathlib import Path
 import re
-from urllib.request import urlopen, Request
 
 # Video file extensions
 VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.wmv', '.flv', '.mov', '.m4v', '.rmvb'}
+SCRAPER = 'enhanced'     # Only this scraper's rows are reused from the metadata store
 
 # Get script directory
 SCRIPT_DIR = Path(__file__).parent
-
-# Studio mappings (fallback)
-STUDIO_MAPPING = {
-    'SSIS': 'S1', 'SSNI': 'S1', 'SONE': 'S1',
-    'IPX': 'IdeaPocket', 'IPZZ': 'IdeaPocket',
-    'MIDV': 'MOODYZ', 'MIAB': 'MOODYZ', 'MIDA': 'MOODYZ', 'MFYD': 'MOODYZ',
-    'PRED': 'Premium',
-    'JUR': 'Madonna', 'JUQ': 'Madonna', 'URE': 'Madonna',
-    'EBWH': 'E-Body',
-    'HMN': 'Hon Naka',
-    'ADN': 'Attackers', 'ATID': 'Attackers',
-    'MEYD': 'Tameike Goro',
-    'ROYD': 'Royal',
-    'DASS': 'DAS!',
-    'DLDSS': 'DAHLIA',
-    'SONE': 'S1',
-    'START': 'SOD Create',
-    'WAAA': 'Wanz Factory',
-    'CAWD': 'kawaii',
-    'ABF': 'Prestige',
-    'FFT': 'Faleno', 'FNS': 'Faleno Star', 'FSDSS': 'FALENO',
-    'NGOD': 'JET Eizou',
-    'GVH': 'Glory Quest',
-}
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import av_api
+from javbus_session import get_session, CircuitOpenError, JAVBUS_BASE_URL
+from circuit_breaker import CircuitBreaker, DEFAULT_THRESHOLD, DEFAULT_RESET_TIMEOUT
+from enrich_queue import EnrichQueue
+from video_scan import ScanStats, iter_items, list_dir
+from intake_watch import watch, DEFAULT_SETTLE
+from move_engine import get_move_engine
+from move_plan import MovePlan
+from move_journal import MoveJournal, interrupted_journals
+from pipeline import Stage, Pipeline
+from name_registry import NameRegistry
+from extract_code import (extract_av_code, split_code, group_by_code, code_family, has_source,
+                          code_label)
+from studio_table import get_studio_table
+from label_learner import get_label_learner
+from poster_downloader import get_poster_downloader
+from av_state import STATE_DIR_NAME
+from page_cache import get_page_cache
+from metadata_store import get_metadata_store
+from enhanced_javbus_scraper import PARSE_STATS
+from async_fetch import (fetch_all, host_of_url, HostRateLimiter, answered_locally,
+                         DEFAULT_CONCURRENCY, DEFAULT_RATE)
 
 
 def extract_code(filename):
     """Extract AV code from filename"""
-    name = filename.upper()
-    
-    patterns = [
-        r'([A-Z]{2,6}[-\s]\d{3,5})',  # ABC-123 or ABC 123
-        r'([A-Z]{2,6}\d{3,5})',       # ABC123
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, name)
-        if match:
-            code = match.group(1)
-            # Normalize to hyphen format
-            code = re.sub(r'([A-Z]+)\s+(\d+)', r'\1-\2', code)
-            code = re.sub(r'([A-Z]+)(\d+)', r'\1-\2', code)
-            return code
+    return extract_av_code(filename)
+
+
+def group_items(items):
+    """
+    Group scanned (path, is_folder) items into one work unit per code
     
-    return None
+    Returns:
+        List of (code, [((path, is_folder), part), ...]); parts and variants
+        (ABC-123-CD1, ABC-123-C, abc123hhb) share one lookup and one poster
+    """
+    return group_by_code(items, lambda item: os.path.basename(item[0]))
 
 
-def fetch_metadata_from_javbus(code):
-    """Try to fetch metadata from javbus.com"""
-    try:
-        result = subprocess.run(
-            ['python', str(SCRIPT_DIR / 'enhanced_javbus_scraper.py'), code],
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            timeout=20
-        )
-        
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            if 'error' not in data:
-                data['code'] = code
-                data['source'] = 'javbus'
-                return data
-    except:
-        pass
+def fetch_metadata_from_javbus(code, isolate=False, cache=None, store=None, refresh=False,
+                               stream=False, breaker=None):
+    """
+    Try to fetch metadata from javbus.com (through the circuit breaker if given)
+    
+    Codes of a family javbus has no pages for (FC2) are not looked up.
+    """
+    if not has_source(code):
+        return None
+    
+    def scrape(c):
+        lookup = lambda: av_api.scrape(c, SCRAPER, isolate=isolate, cache=cache,
+                                       raise_errors=True, stream=stream)
+        return breaker.call(lookup) if breaker is not None else lookup()
+    
+    if store is not None:
+        # Stored results and known failures are answered without a request
+        data = store.fetch(code, scrape, SCRAPER, refresh=refresh)
+    else:
+        try:
+            data = scrape(code)
+        except CircuitOpenError:
+            data = None
+        except Exception as e:
+            print(f"Error scraping {code}: {e}", file=sys.stderr)
+            data = None
+    if data:
+        data['code'] = code
+        data['source'] = 'javbus'
+        return data
     
     return None
 
 
 def get_fallback_metadata(code):
     """Generate fallback metadata using internal rules"""
-    # Extract studio prefix
-    prefix_match = re.match(r'([A-Z]+)', code.upper())
-    if prefix_match:
-        prefix = prefix_match.group(1)
-        studio = STUDIO_MAPPING.get(prefix, 'Unknown')
+    family = code_family(code)
+    # Studio label (after the digits of 259LUXU-style codes): the studio
+    # table first, then what earlier scrapes say about the label
+    label = code_label(code)
+    if family and family.studio:
+        studio = family.studio
+    elif label:
+        studio = (get_studio_table().studio_for_label(label)
+                  or get_label_learner().studio_for_label(label) or 'Unknown')
     else:
         studio = 'Unknown'
     
@@ -119,32 +159,9 @@ def get_fallback_metadata(code):
     }
 
 
-def fetch_metadata(code):
-    """Fetch metadata with fallback"""
-    print("  Trying javbus.com...")
-    metadata = fetch_metadata_from_javbus(code)
-    
-    if metadata:
-        print(f"  OK Got data from javbus.com")
-        return metadata
-    
-    print("  ! javbus.com unavailable, using fallback rules")
-    return get_fallback_metadata(code)
-
-
 def normalize_studio(studio_name):
-    """Normalize studio name to folder name"""
-    if not studio_name:
-        return 'others'
-    
-    cleaned = studio_name.lower().strip()
-    
-    # Remove special chars and convert spaces to hyphens
-    normalized = re.sub(r'[^\w\s-]', '', cleaned)
-    normalized = re.sub(r'[\s]+', '-', normalized)
-    normalized = re.sub(r'-+', '-', normalized)
-    
-    return normalized if normalized else 'others'
+    """Normalize studio name to folder name (studios.json, else a slug)"""
+    return get_studio_table().normalize(studio_name)
 
 
 def sanitize_filename(filename):
@@ -155,78 +172,43 @@ def sanitize_filename(filename):
     return sanitized[:200]
 
 
-def download_poster(poster_url, target_path, code):
-    """Download poster image"""
+def download_poster(poster_url, target_path, code, limiter=None):
+    """
+    Download poster image as [CODE]-poster.jpg/.png into target_path
+    
+    Nothing is requested if a valid poster is there already; failures go
+    to the poster retry queue.
+    """
     if not poster_url:
         return False
+    poster_path = Path(target_path) / f"[{code}]-poster.jpg"
+    return get_poster_downloader().download(poster_url, poster_path, av_api.DEFAULT_PROXY,
+                                            match_ext=True, limiter=limiter)
+
+
+def scan_directory(directory, retry_failed=False, first_only=False, stats=None):
+    """Scan for video files (os.scandir, stops at the first video in each folder)"""
+    if retry_failed:
+        # Items inside others/unknown; organized studio folders are skipped
+        items = iter_items(directory, expand=('others', 'unknown'), skip_folders=True,
+                           extensions=VIDEO_EXTENSIONS, stats=stats)
+    else:
+        items = iter_items(directory, extensions=VIDEO_EXTENSIONS, stats=stats)
     
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Referer': 'https://www.javbus.com/'
-        }
-        req = Request(poster_url, headers=headers)
-        
-        with urlopen(req, timeout=15) as response:
-            image_data = response.read()
-        
-        # Determine extension
-        content_type = response.headers.get('Content-Type', '')
-        if 'jpeg' in content_type or 'jpg' in content_type:
-            ext = '.jpg'
-        elif 'png' in content_type:
-            ext = '.png'
-        else:
-            ext = '.jpg'
-        
-        # Save poster
-        poster_filename = f"[{code}]-poster{ext}"
-        poster_path = Path(target_path) / poster_filename
-        
-        with open(poster_path, 'wb') as f:
-            f.write(image_data)
-        
-        return True
-    except Exception as e:
-        print(f"  ! Failed to download poster: {e}")
-        return False
+    if first_only:
+        return list(islice(items, 1))
+    return list(items)
 
 
-def scan_directory(directory, retry_failed=False, first_only=False):
-    """Scan for video files"""
-    results = []
+def target_path(item_path, is_folder, metadata, base_directory, names=None, part=''):
+    """
+    Path an item moves to: studio/actress/[Code]-[Title] (-CD1, -C ... for
+    a part or variant) with a _N suffix if that name exists already or was
+    claimed earlier in the run
     
-    for item in Path(directory).iterdir():
-        if item.is_file() and item.suffix.lower() in VIDEO_EXTENSIONS:
-            results.append((str(item), False))
-        
-        elif item.is_dir():
-            # Skip already organized studio folders unless retry_failed
-            if retry_failed and item.name in ['others', 'unknown']:
-                # Process contents
-                for subitem in item.iterdir():
-                    if subitem.is_file() and subitem.suffix.lower() in VIDEO_EXTENSIONS:
-                        results.append((str(subitem), False))
-                    elif subitem.is_dir():
-                        video_files = [f for f in subitem.rglob('*') 
-                                     if f.is_file() and f.suffix.lower() in VIDEO_EXTENSIONS]
-                        if video_files:
-                            results.append((str(subitem), True))
-            elif not retry_failed:
-                # Check if folder contains videos
-                video_files = [f for f in item.rglob('*') 
-                             if f.is_file() and f.suffix.lower() in VIDEO_EXTENSIONS]
-                if video_files:
-                    results.append((str(item), True))
-    
-    if first_only and results:
-        results = results[:1]
-    
-    return results
-
-
-def organize_item(item_path, is_folder, metadata, base_directory, dry_run=False):
-    """Organize item with actress subfolder"""
+    The name is claimed in names (a NameRegistry shared by the run; a
+    fresh one lists the actress folder once).
+    """
     # Get studio folder
     studio_folder = normalize_studio(metadata['studio'])
     
@@ -241,25 +223,42 @@ def organize_item(item_path, is_folder, metadata, base_directory, dry_run=False)
     # Build new name: [Code]-[Title]
     safe_title = sanitize_filename(metadata['title'])
     new_name = f"[{metadata['code']}]-[{safe_title}]"
+    if part:
+        new_name += f"-{part}"
     
-    if is_folder:
-        new_path = actress_path / new_name
-    else:
-        ext = Path(item_path).suffix
-        new_path = actress_path / f"{new_name}{ext}"
+    # Handle duplicates
+    if names is None:
+        names = NameRegistry()
+    ext = '' if is_folder else Path(item_path).suffix
+    return Path(names.claim(actress_path, new_name, ext))
+
+
+def others_path_for(item_path, base_directory, names=None):
+    """Path in /others for an item that cannot be organized"""
+    others_path = Path(base_directory) / 'others'
+    base_name, ext = os.path.splitext(os.path.basename(item_path))
     
     # Handle duplicates
-    if new_path.exists():
-        counter = 1
-        original_new_path = new_path
-        while new_path.exists():
-            if is_folder:
-                new_path = original_new_path.parent / f"{original_new_path.name}_{counter}"
-            else:
-                stem = original_new_path.stem
-                ext = original_new_path.suffix
-                new_path = original_new_path.parent / f"{stem}_{counter}{ext}"
-            counter += 1
+    if names is None:
+        names = NameRegistry()
+    return Path(names.claim(others_path, base_name, ext))
+
+
+def organize_item(item_path, is_folder, metadata, base_directory, dry_run=False, poster_jobs=None,
+                  names=None):
+    """
+    Organize item with actress subfolder
+    
+    If poster_jobs is a list, the poster download is queued on it as
+    (poster_url, actress_path, code) instead of being downloaded inline.
+    names is the NameRegistry duplicates are resolved against. A part or
+    variant suffix in the item's name (-CD1, -C) is kept.
+    """
+    if names is None:
+        names = NameRegistry()
+    part = split_code(os.path.basename(item_path))[1]
+    new_path = target_path(item_path, is_folder, metadata, base_directory, names, part)
+    actress_path = new_path.parent
     
     if dry_run:
         print(f"  [DRY RUN] Would move to: {new_path}")
@@ -272,12 +271,13 @@ def organize_item(item_path, is_folder, metadata, base_directory, dry_run=False)
         actress_path.mkdir(parents=True, exist_ok=True)
         
         # Move item
-        shutil.move(str(item_path), str(new_path))
+        get_move_engine().move(item_path, new_path)
         
         # Download poster
         poster_downloaded = False
-        if metadata.get('poster_url'):
-            time.sleep(0.5)  # Rate limiting
+        if metadata.get('poster_url') and poster_jobs is not None:
+            poster_jobs.append((metadata['poster_url'], str(actress_path), metadata['code']))
+        elif metadata.get('poster_url'):
             poster_downloaded = download_poster(
                 metadata['poster_url'],
                 actress_path,
@@ -288,137 +288,650 @@ def organize_item(item_path, is_folder, metadata, base_directory, dry_run=False)
         
         return (True, str(new_path), poster_downloaded)
     except Exception as e:
+        names.release(new_path)
         return (False, str(e), False)
 
 
-def handle_failed_item(item_path, base_directory, reason, dry_run=False):
+def handle_failed_item(item_path, base_directory, reason, dry_run=False, names=None):
     """Move failed items to /others"""
-    others_path = Path(base_directory) / 'others'
     item_name = os.path.basename(item_path)
-    new_path = others_path / item_name
-    
-    # Handle duplicates
-    if new_path.exists():
-        counter = 1
-        base_name, ext = os.path.splitext(item_name)
-        while new_path.exists():
-            new_name = f"{base_name}_{counter}{ext if ext else ''}"
-            new_path = others_path / new_name
-            counter += 1
+    new_path = others_path_for(item_path, base_directory, names)
     
     if dry_run:
         print(f"  [DRY RUN] Would move to /others: {item_name}")
         return
     
     try:
-        others_path.mkdir(exist_ok=True)
-        shutil.move(str(item_path), str(new_path))
+        new_path.parent.mkdir(exist_ok=True)
+        get_move_engine().move(item_path, new_path)
         print(f"  Moved to /others: {item_name} (reason: {reason})")
     except Exception as e:
         print(f"  Error: {e}")
 
 
-def organize_av_directory(directory, dry_run=False, retry_failed=False, first_only=False):
-    """Main organization workflow"""
+def download_queued_posters(poster_jobs, concurrency, limiter):
+    """Download queued posters concurrently (one per target); returns the number in place"""
+    jobs = [(url, Path(folder) / f"[{code}]-poster.jpg", av_api.DEFAULT_PROXY, True)
+            for url, folder, code in poster_jobs]
+    if not jobs:
+        return 0
+    print(f"\nDownloading {len(jobs)} posters...")
+    return get_poster_downloader().download_all(jobs, concurrency, limiter)
+
+
+def retry_failed_posters(concurrency, limiter):
+    """Download posters of earlier runs that are due for another try"""
+    retried, saved = get_poster_downloader().retry(concurrency, limiter)
+    if retried:
+        print(f"Retried {retried} failed posters: {saved} saved")
+
+
+def print_network_stats(cache, store, breaker):
+    print(f"Moves: {get_move_engine().format_stats()}")
+    print(f"Posters: {get_poster_downloader().format_stats()}")
+    print(f"Connections: {get_session(av_api.DEFAULT_PROXY).format_stats()}")
+    if cache is not None:
+        print(f"Page cache: {cache.format_stats()}")
+    if store is not None:
+        print(f"Metadata store: {store.format_stats()}")
+    if breaker is not None:
+        print(f"Circuit breaker: {breaker.format_stats()}")
+    for line in PARSE_STATS.summary():
+        print(f"Parse ({line})")
+
+
+def plan_item(plan, item_path, is_folder, code, metadata, directory, store, counts, dry_run=False,
+              part='', poster=True):
+    """
+    Decide where one item goes and add it to the plan
+    
+    metadata is the javbus result for code (None: use the fallback rules).
+    part is the item's part or variant suffix; poster=False leaves the
+    poster to another part of the same code. counts['javbus'] and
+    counts['no_code'] are updated.
+    
+    Returns:
+        The plan item
+    """
+    item_name = os.path.basename(item_path)
+    item_type = "Folder" if is_folder else "File"
+    
+    print(f"\n{'='*60}")
+    print(f"{item_type}: {item_name}")
+    print('='*60)
+    
+    if not code:
+        print("  X Code not found")
+        counts['no_code'] += 1
+        target = others_path_for(item_path, directory, plan.names)
+        if dry_run:
+            print(f"  [DRY RUN] Would move to /others: {item_name}")
+        return plan.add(item_path, target, is_folder, status='code_not_found')
+    
+    print(f"  OK Code: {code}")
+    
+    if metadata:
+        print(f"  OK Got data from javbus.com")
+    elif not has_source(code):
+        print(f"  ! No source for {code_family(code).name} codes, using fallback rules")
+        metadata = get_fallback_metadata(code)
+    else:
+        print("  ! javbus.com unavailable, using fallback rules")
+        metadata = get_fallback_metadata(code)
+    
+    print(f"  OK Studio: {metadata['studio']}")
+    print(f"  OK Title: {metadata['title']}")
+    
+    if metadata.get('actresses'):
+        print(f"  OK Actress: {metadata['actresses'][0]}")
+        if len(metadata['actresses']) > 1:
+            print(f"    (+ {len(metadata['actresses'])-1} more)")
+    else:
+        print(f"  OK Actress: Unknown")
+    
+    if metadata.get('source') == 'javbus':
+        counts['javbus'] += 1
+    
+    target = target_path(item_path, is_folder, metadata, directory, plan.names, part)
+    if poster and metadata.get('poster_url'):
+        poster = {'url': metadata['poster_url'], 'folder': str(target.parent), 'code': code}
+    else:
+        poster = None
+    enqueue = None
+    if metadata.get('source') == 'fallback' and has_source(code):
+        # Look it up again later with --enrich
+        entry = store.lookup(code, SCRAPER) if store is not None else None
+        enqueue = {'reason': entry['error_class'] if entry and entry['error_class'] else 'unavailable'}
+    
+    if dry_run:
+        print(f"  [DRY RUN] Would move to: {target}")
+        if poster:
+            print(f"  [DRY RUN] Would download poster")
+    return plan.add(item_path, target, is_folder, code, poster=poster, enqueue=enqueue)
+
+
+def plan_items(items, directory, dry_run=False, isolate=False, concurrency=DEFAULT_CONCURRENCY,
+               limiter=None, cache=None, store=None, refresh=False, stream=False, breaker=None):
+    """
+    Fetch metadata for the items concurrently and decide where each one goes
+    
+    Returns:
+        (MovePlan, counts) with counts of items that use javbus data and of
+        items without a code
+    """
+    counts = {'javbus': 0, 'no_code': 0}
+    plan = MovePlan(directory, 'hybrid_organizer')
+    
+    # Group parts and variants by code first, then fetch metadata concurrently
+    units = group_items(items)
+    wanted = [code for code, _ in units if code]
+    print(f"Fetching metadata for {len(wanted)} codes "
+          f"(concurrency {concurrency}, {limiter.rate if limiter else DEFAULT_RATE}/s per host)...")
+    fetched = fetch_all(wanted,
+                        lambda code: fetch_metadata_from_javbus(code, isolate, cache, store, refresh,
+                                                                stream, breaker),
+                        concurrency, limiter=limiter,
+                        local=answered_locally(store, SCRAPER, refresh, breaker, None if isolate else cache))
+    
+    # Decide targets in scan order
+    for code, members in units:
+        for i, ((item_path, is_folder), part) in enumerate(members):
+            plan_item(plan, item_path, is_folder, code, fetched.get(code), directory, store, counts, dry_run,
+                      part, poster=i == 0)
+    
+    return plan, counts
+
+
+def apply_plan(plan, concurrency=DEFAULT_CONCURRENCY, limiter=None, journal=None):
+    """
+    Create the target folders, move the items, then download posters
+    
+    With a journal every move is recorded in it, and it is deleted once
+    the posters are done. Items the journal already has as moved get their
+    missing posters and enrichment entries (a killed run never got to them).
+    
+    Returns:
+        Dict of counts: success, failed, skipped, posters, queued, and the
+        list of paths the items were moved to ('moved')
+    """
+    directory = plan.directory
+    counts = {'success': 0, 'failed': 0, 'skipped': 0, 'posters': 0, 'queued': 0, 'moved': []}
+    queue = EnrichQueue(directory)
+    poster_jobs = []
+    
+    def on_moved(item):
+        if item['status'] != 'ok':
+            print(f"  Moved to /others: {os.path.basename(item['source'])} (reason: {item['status']})")
+            return
+        print(f"  OK {os.path.basename(item['source'])} -> {item['target']}")
+        counts['success'] += 1
+        counts['moved'].append(item['target'])
+        if item.get('poster'):
+            poster = item['poster']
+            poster_jobs.append((poster['url'], poster['folder'], poster['code']))
+        if item.get('enqueue'):
+            queue.add(item['code'], item['target'], item['is_folder'], item['enqueue']['reason'])
+            counts['queued'] += 1
+    
+    def on_skipped(item):
+        if item['status'] != 'ok':
+            return
+        poster = item.get('poster')
+        if poster:
+            # Posters that are present cost no request
+            poster_jobs.append((poster['url'], poster['folder'], poster['code']))
+        if item.get('enqueue'):
+            queue.add(item['code'], item['target'], item['is_folder'], item['enqueue']['reason'])
+    
+    def on_error(item, error):
+        print(f"  X {os.path.basename(item['source'])}: {error}")
+        plan.names.release(item['target'])
+        if item['status'] == 'ok':
+            handle_failed_item(item['source'], directory, 'move_error', names=plan.names)
+    
+    print(f"\nApplying {len(plan)} moves ({len(plan.folders())} folders)...")
+    result = plan.apply(on_moved, on_error, journal, on_skipped if journal is not None else None)
+    counts['failed'] = result['failed'] + result['missing']
+    counts['skipped'] = result['skipped']
+    
+    if counts['queued'] or journal is not None:
+        queue.save()
+    
+    counts['posters'] = download_queued_posters(poster_jobs, concurrency, limiter)
+    if journal is not None:
+        journal.complete()
+    return counts
+
+
+def resume_interrupted_runs(directory, concurrency=DEFAULT_CONCURRENCY, limiter=None):
+    """
+    Finish runs of this library that were killed halfway (see move_journal)
+    
+    The plan is taken from the journal, so nothing is scanned or looked up.
+    """
+    for journal in interrupted_journals(directory):
+        plan = journal.load()
+        if plan is None:
+            # Killed while planning; nothing was moved
+            journal.complete()
+            continue
+        if plan.tool != 'hybrid_organizer':
+            continue
+        progress = journal.counts()
+        print(f"Resuming interrupted run: {len(plan)} planned moves, {progress['done']} done, "
+              f"{progress['started']} interrupted")
+        counts = apply_plan(plan, concurrency, limiter, journal)
+        print(f"Resumed: {counts['success']} moved, {counts['skipped']} already done, "
+              f"{counts['failed']} failed\n")
+
+
+def process_items(items, directory, dry_run=False, isolate=False, concurrency=DEFAULT_CONCURRENCY,
+                  limiter=None, cache=None, store=None, refresh=False, stream=False, breaker=None,
+                  move_workers=1):
+    """
+    Organize the items (with dry_run only plan them)
+    
+    Items are grouped into one unit per code (parts and variants share a
+    lookup and a poster). Metadata fetches, target decisions, moves and
+    poster downloads run as pipeline stages connected by bounded queues, so
+    the next units are fetched while earlier ones are moved. Targets are
+    decided in scan order and each item is journaled before it is moved.
+    
+    Returns:
+        Dict of counts: success, failed, javbus, posters, queued, the list of
+        paths the items were moved to ('moved') and the pipeline statistics
+    """
+    if dry_run:
+        plan, planned = plan_items(items, directory, dry_run, isolate, concurrency, limiter, cache, store,
+                                   refresh, stream, breaker)
+        return {'success': len(plan) - planned['no_code'], 'failed': planned['no_code'],
+                'javbus': planned['javbus'], 'posters': 0, 'queued': 0, 'moved': [], 'pipeline': None}
+    
+    if limiter is None:
+        limiter = HostRateLimiter(DEFAULT_RATE)
+    plan = MovePlan(directory, 'hybrid_organizer')
+    journal = MoveJournal.create(directory)
+    journal.begin(plan)
+    queue = EnrichQueue(directory)
+    planned = {'javbus': 0, 'no_code': 0}
+    counts = {'success': 0, 'failed': 0, 'posters': 0, 'queued': 0, 'moved': []}
+    lock = threading.Lock()
+    fetched = {}
+    local = answered_locally(store, SCRAPER, refresh, breaker, None if isolate else cache)
+    host = host_of_url(JAVBUS_BASE_URL)
+    
+    def fetch(unit):
+        # One lookup per code: its parts and variants are one unit
+        code = unit[0]
+        if code:
+            if not local(code):
+                limiter.bucket(host).acquire()
+            fetched[code] = fetch_metadata_from_javbus(code, isolate, cache, store, refresh,
+                                                       stream, breaker)
+        return unit
+    
+    def decide(unit):
+        code, members = unit
+        numbers = []
+        for i, ((item_path, is_folder), part) in enumerate(members):
+            plan_item(plan, item_path, is_folder, code, fetched.get(code), directory, store, planned,
+                      part=part, poster=i == 0)
+            n = len(plan.items) - 1
+            journal.add(n, plan.items[n])
+            numbers.append(n)
+        return numbers
+    
+    def move_one(n):
+        item = plan.items[n]
+        name = os.path.basename(item['source'])
+        try:
+            outcome = plan.move_item(n, item, journal)
+        except OSError as e:
+            print(f"  X {name}: {e}")
+            plan.names.release(item['target'])
+            with lock:
+                counts['failed'] += 1
+            if item['status'] == 'ok':
+                handle_failed_item(item['source'], directory, 'move_error', names=plan.names)
+            return False
+        if outcome != 'moved':
+            with lock:
+                counts['failed'] += 1
+            return False
+        plan.complete_item(n, item, journal)
+        if item['status'] != 'ok':
+            print(f"  Moved to /others: {name} (reason: {item['status']})")
+            with lock:
+                counts['failed'] += 1
+            return False
+        print(f"  OK {name} -> {item['target']}")
+        with lock:
+            counts['success'] += 1
+            counts['moved'].append(item['target'])
+            if item.get('enqueue'):
+                queue.add(item['code'], item['target'], item['is_folder'], item['enqueue']['reason'])
+                counts['queued'] += 1
+        return True
+    
+    def move(numbers):
+        moved = [move_one(n) for n in numbers]
+        return numbers if any(moved) else None
+    
+    def poster(numbers):
+        # The unit's poster is planned with its first part
+        job = plan.items[numbers[0]].get('poster')
+        if job and download_poster(job['url'], job['folder'], job['code'], limiter):
+            with lock:
+                counts['posters'] += 1
+        return numbers
+    
+    units = group_items(items)
+    print(f"Organizing {len(items)} items with {len(units)} codes (fetch {concurrency}, "
+          f"move {move_workers}, {limiter.rate}/s per host)...")
+    pipeline = Pipeline([
+        Stage('fetch', fetch, concurrency),
+        Stage('plan', decide, ordered=True),
+        Stage('move', move, move_workers),
+        Stage('poster', poster, concurrency),
+    ])
+    pipeline.run(units)
+    if counts['queued']:
+        queue.save()
+    journal.complete()
+    
+    counts['javbus'] = planned['javbus']
+    counts['pipeline'] = pipeline.format_stats()
+    return counts
+
+
+def organize_av_directory(directory, dry_run=False, retry_failed=False, first_only=False, isolate=False,
+                          concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, use_cache=True,
+                          use_store=True, refresh=False, stream=False, breaker=None, plan_path=None,
+                          move_workers=1):
+    """Main organization workflow (with plan_path: write the move plan instead of moving)"""
+    if plan_path:
+        # The plan may be applied from another working directory
+        directory = os.path.abspath(directory)
+    elif interrupted_journals(directory):
+        if dry_run:
+            print("An interrupted run will be resumed first (run without --dry-run)\n")
+        else:
+            resume_interrupted_runs(directory, concurrency, HostRateLimiter(rate))
     print(f"Scanning directory: {directory}")
     if retry_failed:
         print("Mode: Retry failed items")
     if first_only:
         print("Mode: First item only")
     
-    items = scan_directory(directory, retry_failed, first_only)
-    print(f"Found {len(items)} items\n")
+    scan_stats = ScanStats()
+    items = scan_directory(directory, retry_failed, first_only, scan_stats)
+    print(f"Found {len(items)} items ({scan_stats.format()})\n")
     
     if not items:
         print("No items to process.")
         return
     
-    success_count = 0
-    failed_count = 0
-    poster_count = 0
-    javbus_count = 0
+    cache = get_page_cache() if use_cache else None
+    store = get_metadata_store() if use_store else None
     
-    for item_path, is_folder in items:
-        item_name = os.path.basename(item_path)
-        item_type = "Folder" if is_folder else "File"
-        
+    if plan_path:
+        plan, planned = plan_items(items, directory, False, isolate, concurrency, HostRateLimiter(rate),
+                                   cache, store, refresh, stream, breaker)
+        plan.save(plan_path)
         print(f"\n{'='*60}")
-        print(f"{item_type}: {item_name}")
+        print(f"Plan saved: {plan_path}")
         print('='*60)
-        
-        # Extract code
-        print("Extracting code...")
-        code = extract_code(item_name)
-        
-        if not code:
-            print("  X Code not found")
-            failed_count += 1
-            handle_failed_item(item_path, directory, 'code_not_found', dry_run)
-            continue
-        
-        print(f"  OK Code: {code}")
-        
-        # Fetch metadata
-        metadata = fetch_metadata(code)
-        
-        print(f"  OK Studio: {metadata['studio']}")
-        print(f"  OK Title: {metadata['title']}")
-        
-        if metadata.get('actresses'):
-            print(f"  OK Actress: {metadata['actresses'][0]}")
-            if len(metadata['actresses']) > 1:
-                print(f"    (+ {len(metadata['actresses'])-1} more)")
-        else:
-            print(f"  OK Actress: Unknown")
-        
-        if metadata.get('source') == 'javbus':
-            javbus_count += 1
-        
-        # Organize
-        print("Organizing...")
-        success, result, poster_downloaded = organize_item(
-            item_path, is_folder, metadata, directory, dry_run
-        )
-        
-        if success:
-            print(f"  OK Moved to: {result}")
-            success_count += 1
-            if poster_downloaded:
-                poster_count += 1
-        else:
-            print(f"  X Error: {result}")
-            failed_count += 1
-            handle_failed_item(item_path, directory, 'move_error', dry_run)
+        print(f"Moves: {len(plan)} ({planned['no_code']} to /others)")
+        print(f"Folders: {len(plan.folders())}")
+        print(f"Posters: {len(plan.posters())}")
+        print(f"Data from javbus: {planned['javbus']}")
+        print_network_stats(cache, store, breaker)
+        print(f"\nApply with: python hybrid_organizer.py \"{directory}\" --apply \"{plan_path}\"")
+        return
+    
+    limiter = HostRateLimiter(rate)
+    counts = process_items(items, directory, dry_run, isolate, concurrency, limiter,
+                           cache, store, refresh, stream, breaker, move_workers)
+    if not dry_run:
+        retry_failed_posters(concurrency, limiter)
     
     # Summary
     print(f"\n{'='*60}")
     print("SUMMARY")
     print('='*60)
     print(f"Total items: {len(items)}")
-    print(f"Success: {success_count}")
-    print(f"Failed: {failed_count}")
-    print(f"Data from javbus: {javbus_count}")
-    print(f"Posters downloaded: {poster_count}")
+    print(f"Success: {counts['success']}")
+    print(f"Failed: {counts['failed']}")
+    print(f"Data from javbus: {counts['javbus']}")
+    print(f"Posters in place: {counts['posters']}")
+    if counts['queued']:
+        print(f"Queued for enrichment: {counts['queued']} (run again with --enrich)")
+    if counts['pipeline']:
+        print(f"Pipeline: {counts['pipeline']}")
+    print_network_stats(cache, store, breaker)
     
     if dry_run:
         print("\n[DRY RUN] No actual changes were made")
 
 
+def apply_saved_plan(plan_path, directory, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE):
+    """Execute a plan written by --plan (no metadata lookups)"""
+    plan = MovePlan.load(plan_path)
+    if os.path.abspath(directory) != plan.directory:
+        print(f"Error: {plan_path} was made for {plan.directory}")
+        sys.exit(1)
+    
+    counts = apply_plan(plan, concurrency, HostRateLimiter(rate))
+    
+    print(f"\n{'='*60}")
+    print("SUMMARY")
+    print('='*60)
+    print(f"Planned moves: {len(plan)}")
+    print(f"Moved: {counts['success']}")
+    print(f"Already applied: {counts['skipped']}")
+    print(f"Failed: {counts['failed']}")
+    print(f"Posters in place: {counts['posters']}")
+    if counts['queued']:
+        print(f"Queued for enrichment: {counts['queued']} (run again with --enrich)")
+    print(f"Moves: {get_move_engine().format_stats()}")
+
+
+def output_folder_names(directory):
+    """
+    Top-level names the organizer writes to (studio folders, others)
+    
+    Besides the studios of the built-in rules this includes every existing
+    folder whose actress subfolders hold [CODE]-[Title] items.
+    """
+    names = {'others', 'unknown', STATE_DIR_NAME}
+    names.update(get_studio_table().slugs())
+    for entry in list_dir(directory):
+        if entry.name in names or not entry.is_dir():
+            continue
+        for actress in list_dir(entry.path):
+            if actress.is_dir() and any(item.name.startswith('[') and ']-[' in item.name
+                                        for item in list_dir(actress.path)):
+                names.add(entry.name)
+                break
+    return names
+
+
+def watch_directory(directory, dry_run=False, isolate=False, concurrency=DEFAULT_CONCURRENCY,
+                    rate=DEFAULT_RATE, use_cache=True, use_store=True, refresh=False, stream=False,
+                    breaker=None, settle=DEFAULT_SETTLE, poll=None, move_workers=1):
+    """
+    Organize items as soon as they finish downloading (until Ctrl+C)
+    
+    The cache, metadata store, rate limiter and circuit breaker live for the
+    whole session, so each finished download costs one lookup and one move.
+    """
+    cache = get_page_cache() if use_cache else None
+    store = get_metadata_store() if use_store else None
+    limiter = HostRateLimiter(rate)
+    if not dry_run:
+        resume_interrupted_runs(directory, concurrency, limiter)
+    ignore = output_folder_names(directory)
+    totals = {'success': 0, 'failed': 0, 'javbus': 0, 'posters': 0, 'queued': 0}
+    
+    def handle(items):
+        print(f"\n{len(items)} finished: {', '.join(os.path.basename(path) for path, _ in items)}")
+        counts = process_items(items, directory, dry_run, isolate, concurrency, limiter,
+                               cache, store, refresh, stream, breaker, move_workers)
+        for key in totals:
+            totals[key] += counts[key]
+        # Our own moves land in studio folders; never pick those up as downloads
+        for path in counts['moved']:
+            ignore.add(Path(path).relative_to(directory).parts[0])
+        if dry_run:
+            # Nothing moved: do not report the same items again
+            ignore.update(os.path.basename(path) for path, _ in items)
+    
+    watch(directory, handle, settle, poll, ignore)
+    
+    print(f"\n{'='*60}")
+    print("SUMMARY")
+    print('='*60)
+    print(f"Success: {totals['success']}")
+    print(f"Failed: {totals['failed']}")
+    print(f"Data from javbus: {totals['javbus']}")
+    print(f"Posters in place: {totals['posters']}")
+    if totals['queued']:
+        print(f"Queued for enrichment: {totals['queued']} (run again with --enrich)")
+    print_network_stats(cache, store, breaker)
+
+
+def enrich_fallback_items(directory, dry_run=False, isolate=False, concurrency=DEFAULT_CONCURRENCY,
+                          rate=DEFAULT_RATE, use_cache=True, use_store=True, refresh=False,
+                          stream=False, breaker=None):
+    """Look up items organized with fallback rules again and move them into place"""
+    queue = EnrichQueue(directory)
+    entries = []
+    for code, entry in queue.items():
+        # All parts of a code are enriched together
+        members = [(member['path'], member['is_folder']) for member in [entry] + entry.get('parts', [])
+                   if os.path.exists(member['path'])]
+        if members:
+            entries.append((code, members))
+        elif not dry_run:
+            # Moved or deleted since; nothing left to enrich
+            queue.remove(code)
+    
+    print(f"Enriching {len(entries)} items organized with fallback rules")
+    if not entries:
+        if not dry_run:
+            queue.save()
+        return
+    
+    limiter = HostRateLimiter(rate)
+    cache = get_page_cache() if use_cache else None
+    store = get_metadata_store() if use_store else None
+    fetched = fetch_all([code for code, _ in entries],
+                        lambda code: fetch_metadata_from_javbus(code, isolate, cache, store, refresh,
+                                                                stream, breaker),
+                        concurrency, limiter=limiter,
+                        local=answered_locally(store, SCRAPER, refresh, breaker, None if isolate else cache))
+    
+    enriched_count = 0
+    poster_jobs = []
+    names = NameRegistry()
+    for code, members in entries:
+        metadata = fetched.get(code)
+        if not metadata:
+            print(f"  - {code}: still unavailable")
+            continue
+        moved = 0
+        for item_path, is_folder in members:
+            success, result, _ = organize_item(item_path, is_folder, metadata, directory,
+                                               dry_run, poster_jobs, names)
+            if success:
+                print(f"  OK {code}: {result}")
+                moved += 1
+            else:
+                print(f"  X {code}: {result}")
+        if moved == len(members):
+            enriched_count += 1
+            if not dry_run:
+                queue.remove(code)
+    
+    if not dry_run:
+        queue.save()
+    poster_count = download_queued_posters(poster_jobs, concurrency, limiter)
+    if not dry_run:
+        retry_failed_posters(concurrency, limiter)
+    
+    print(f"\n{'='*60}")
+    print("SUMMARY")
+    print('='*60)
+    print(f"Enriched: {enriched_count}")
+    print(f"Still queued: {len(entries) - enriched_count}")
+    print(f"Posters in place: {poster_count}")
+    print_network_stats(cache, store, breaker)
+    
+    if dry_run:
+        print("\n[DRY RUN] No actual changes were made")
+
+
+def get_option(name, default):
+    """Value following a command-line option, or default"""
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return default
+
+
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python hybrid_organizer.py <directory> [--dry-run] [--retry-failed] [--first-only]")
+        print("Usage: python hybrid_organizer.py <directory> [--dry-run] [--retry-failed] [--first-only] [--isolate] [--concurrency N] [--rate R] [--no-cache] [--no-store] [--refresh] [--stream] [--enrich] [--breaker-threshold N] [--breaker-reset S] [--watch] [--settle S] [--poll S] [--max-rate MB/s] [--verify-hash] [--plan FILE] [--apply FILE] [--move-workers N] [--label-confidence P]")
         sys.exit(1)
     
     directory = sys.argv[1]
     dry_run = '--dry-run' in sys.argv
     retry_failed = '--retry-failed' in sys.argv
     first_only = '--first-only' in sys.argv
+    isolate = '--isolate' in sys.argv
+    concurrency = int(get_option('--concurrency', DEFAULT_CONCURRENCY))
+    rate = float(get_option('--rate', DEFAULT_RATE))
+    use_cache = '--no-cache' not in sys.argv
+    use_store = '--no-store' not in sys.argv
+    refresh = '--refresh' in sys.argv
+    stream = '--stream' in sys.argv
+    threshold = int(get_option('--breaker-threshold', DEFAULT_THRESHOLD))
+    reset_timeout = float(get_option('--breaker-reset', DEFAULT_RESET_TIMEOUT))
+    breaker = CircuitBreaker(threshold, reset_timeout) if threshold > 0 else None
+    max_rate = float(get_option('--max-rate', 0)) * 1024 ** 2
+    move_workers = int(get_option('--move-workers', 1))
+    get_move_engine().configure(max_rate or None, '--verify-hash' in sys.argv)
+    # Created here so --no-store leaves the global metadata store alone
+    learner = get_label_learner(update=use_store)
+    label_confidence = get_option('--label-confidence', None)
+    if label_confidence is not None:
+        learner.configure(confidence=float(label_confidence))
     
     if not os.path.isdir(directory):
         print(f"Error: Directory not found: {directory}")
         sys.exit(1)
     
-    organize_av_directory(directory, dry_run, retry_failed, first_only)
+    if '--watch' in sys.argv:
+        poll = get_option('--poll', None)
+        watch_directory(os.path.abspath(directory), dry_run, isolate, concurrency, rate, use_cache,
+                        use_store, refresh, stream, breaker,
+                        float(get_option('--settle', DEFAULT_SETTLE)),
+                        float(poll) if poll is not None else None, move_workers)
+        return
+    
+    if '--apply' in sys.argv:
+        apply_saved_plan(get_option('--apply', None), directory, concurrency, rate)
+        return
+    
+    if '--enrich' in sys.argv:
+        enrich_fallback_items(directory, dry_run, isolate, concurrency, rate, use_cache, use_store,
+                              refresh, stream, breaker)
+        return
+    
+    organize_av_directory(directory, dry_run, retry_failed, first_only, isolate, concurrency, rate,
+                          use_cache, use_store, refresh, stream, breaker, get_option('--plan', None),
+                          move_workers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下载目录监视 - 下载完成的条目立即交给整理流程
+
+A watcher reports which top-level entries of the intake directory changed:
+InotifyWatcher uses Linux inotify (through libc, no extra packages) and
+PollingWatcher compares one os.scandir listing per interval everywhere else.
+CompletionTracker keeps the changed entries pending until they look
+finished: no partial-download files (Xunlei .xltd/.td, browser .part/
+.crdownload, qBittorrent .!qb, aria2 control files) and the same size and
+mtime for `settle` seconds. Only pending entries are examined, so the
+library is never rescanned.
+
+Usage:
+    python intake_watch.py <directory> [--settle S] [--poll S]
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+
+from video_scan import VIDEO_EXTENSIONS, contains_video
+
+PARTIAL_EXTENSIONS = {'.xltd', '.td', '.cfg', '.part', '.partial', '.crdownload', '.download',
+                      '.opdownload', '.!qb', '.!ut', '.bc!', '.aria2', '.tmp'}
+
+DEFAULT_SETTLE = 30.0   # seconds without size/mtime change before an item counts as finished
+DEFAULT_POLL = 5.0      # seconds between listings when inotify is not available
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def is_partial_name(name):
+    """True for files a download client is still writing (or its control files)"""
+    lower = name.lower()
+    return any(lower.endswith(ext) for ext in PARTIAL_EXTENSIONS)
+
+
+class InotifyWatcher:
+    """
+    Changed top-level names of a directory from Linux inotify
+
+    Raises OSError when inotify is not available (other platforms, no
+    watches left).
+    """
+
+    def __init__(self, directory):
+        import ctypes
+        import ctypes.util
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+        self.directory = directory
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, f'inotify_add_watch failed for {directory}')
+        self.overflowed = False
+
+    def wait(self, timeout):
+        """Names that changed within timeout seconds (empty set on timeout)"""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        names = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped; the caller lists the directory once
+                    self.overflowed = True
+                elif name:
+                    names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Changed top-level names of a directory from periodic os.scandir listings"""
+
+    def __init__(self, directory, interval=DEFAULT_POLL):
+        self.directory = directory
+        self.interval = interval
+        self.overflowed = False
+        self._listing = self._list()
+
+    def _list(self):
+        listing = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    listing[entry.name] = (st.st_ino, st.st_size, st.st_mtime)
+        except OSError:
+            pass
+        return listing
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        listing = self._list()
+        changed = {name for name, signature in listing.items()
+                   if self._listing.get(name) != signature}
+        changed.update(name for name in self._listing if name not in listing)
+        self._listing = listing
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(directory, poll=None):
+    """InotifyWatcher where available, otherwise (or with poll set) a PollingWatcher"""
+    if poll is None:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directory, poll or DEFAULT_POLL)
+
+
+def item_signature(path):
+    """
+    (size, mtime, partial) of a file or of all files below a folder
+
+    partial is True while any file is still being downloaded. Returns None
+    if the path is gone.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isdir(path):
+        partial = is_partial_name(path) or os.path.exists(path + '.aria2')
+        return st.st_size, st.st_mtime, partial
+
+    size, mtime, partial = 0, st.st_mtime, False
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            if is_partial_name(name):
+                partial = True
+            try:
+                file_st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            size += file_st.st_size
+            mtime = max(mtime, file_st.st_mtime)
+    return size, mtime, partial
+
+
+class CompletionTracker:
+    """
+    Pending top-level entries of the intake directory
+
+    Args:
+        directory: Intake directory
+        settle: Seconds an entry's size and mtime must stay unchanged
+        extensions: Video file extensions
+        ignore: Top-level names never reported (output folders, state)
+    """
+
+    def __init__(self, directory, settle=DEFAULT_SETTLE, extensions=VIDEO_EXTENSIONS, ignore=()):
+        self.directory = directory
+        self.settle = settle
+        self.extensions = extensions
+        self.ignore = set(ignore)
+        self.pending = {}   # name -> (signature, stable since)
+
+    def touch(self, names):
+        for name in names:
+            if name not in self.ignore and not name.startswith('.'):
+                self.pending.setdefault(name, (None, None))
+
+    def ready(self, now=None):
+        """
+        Remove and return (path, is_folder) for entries that finished
+
+        Folders without a video yet stay pending (a client may create the
+        folder long before the first file); entries that vanished are
+        dropped.
+        """
+        now = now or time.monotonic()
+        finished = []
+        for name, (previous, since) in list(self.pending.items()):
+            path = os.path.join(self.directory, name)
+            signature = item_signature(path)
+            if signature is None:
+                del self.pending[name]
+                continue
+            if signature != previous or signature[2]:
+                self.pending[name] = (signature, now)
+                continue
+            if now - since < self.settle:
+                continue
+
+            is_folder = os.path.isdir(path)
+            if is_folder:
+                if not contains_video(path, self.extensions):
+                    self.pending[name] = (signature, now)
+                    continue
+            elif os.path.splitext(name)[1].lower() not in self.extensions:
+                del self.pending[name]
+                continue
+            del self.pending[name]
+            finished.append((path, is_folder))
+        return sorted(finished)
+
+    def next_check(self):
+        """Seconds between checks of the pending entries (None: nothing pending)"""
+        if not self.pending:
+            return None
+        return max(1.0, min(self.settle / 4, 5.0))
+
+
+def watch(directory, handle, settle=DEFAULT_SETTLE, poll=None, ignore=None, idle_timeout=60.0):
+    """
+    Call handle(items) with finished (path, is_folder) items until interrupted
+
+    Args:
+        directory: Intake directory
+        handle: Called with each batch of finished items
+        settle: Seconds of unchanged size/mtime before an item is finished
+        poll: Poll interval in seconds instead of inotify (None: inotify if available)
+        ignore: Set of top-level names to ignore; handle may add to it
+        idle_timeout: Longest wait for an event while nothing is pending
+    """
+    watcher = open_watcher(directory, poll)
+    kind = 'inotify' if isinstance(watcher, InotifyWatcher) else f'polling every {watcher.interval:g}s'
+    print(f"Watching {directory} ({kind}, settle {settle:g}s); Ctrl+C to stop")
+    tracker = CompletionTracker(directory, settle)
+    if ignore is not None:
+        tracker.ignore = ignore
+    # Items already present are picked up like new downloads
+    tracker.touch(os.listdir(directory))
+    last_check = 0.0
+    try:
+        while True:
+            # Events only mark entries pending; a burst of writes during a
+            # download does not walk the entry more than once per interval
+            interval = tracker.next_check()
+            if interval is None:
+                timeout = idle_timeout
+            else:
+                timeout = max(0.0, last_check + interval - time.monotonic())
+            tracker.touch(watcher.wait(timeout))
+            if watcher.overflowed:
+                watcher.overflowed = False
+                tracker.touch(os.listdir(directory))
+            interval = tracker.next_check()
+            if interval is None or time.monotonic() - last_check < interval:
+                continue
+            last_check = time.monotonic()
+            items = tracker.ready(last_check)
+            if items:
+                handle(items)
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    finally:
+        watcher.close()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Print intake items as they finish downloading')
+    parser.add_argument('directory')
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE,
+                        help='Seconds of unchanged size/mtime before an item is finished')
+    parser.add_argument('--poll', type=float, default=None,
+                        help='Poll every N seconds instead of using inotify')
+    args = parser.parse_args()
+
+    def handle(items):
+        for path, is_folder in items:
+            print(f"{'Folder' if is_folder else 'File'} finished: {path}")
+
+    watch(args.directory, handle, args.settle, args.poll)
+
+
+if __name__ == "__main__":
+    main()
@@ -86,12 +86,35 @@ class JavBusParser(HTMLParser):
             self._next_is_actress = False
 
 
-def scrape_javbus(code):
+def parse_javbus(html, code):
+    """
+    Extract metadata from a detail page
+    
+    Returns:
+        dict with keys: studio, title, actresses
+        None if neither studio nor title was found
+    """
+    parser = JavBusParser()
+    parser.feed(html)
+    
+    # Validate results
+    if not parser.studio and not parser.title:
+        return None
+    
+    return {
+        'studio': parser.studio or 'Unknown',
+        'title': parser.title or code,
+        'actresses': parser.actresses
+    }
+
+
+def scrape_javbus(code, raise_errors=False):
     """
     Scrape metadata from javbus.com
     
     Args:
         code: AV code (e.g., SSIS-001)
+        raise_errors: Raise the underlying error instead of returning None
     
     Returns:
         dict with keys: studio, title, actresses
@@ -113,21 +136,11 @@ def scrape_javbus(code):
         with urlopen(req, timeout=10) as response:
             html = response.read().decode('utf-8', errors='ignore')
         
-        # Parse HTML
-        parser = JavBusParser()
-        parser.feed(html)
-        
-        # Validate results
-        if not parser.studio and not parser.title:
-            return None
-        
-        return {
-            'studio': parser.studio or 'Unknown',
-            'title': parser.title or code,
-            'actresses': parser.actresses
-        }
+        return parse_javbus(html, code)
     
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error scraping {code}: {e}", file=sys.stderr)
         return None
 
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JavBus 长连接会话 - 复用 TCP/TLS 连接和 Cookie
+
+urllib openers send "Connection: close", so every lookup used to pay a new
+TCP connect, proxy CONNECT and TLS handshake. JavBusSession keeps a small
+pool of http.client connections per host (tunnelled through the proxy when
+one is configured) and reuses them across requests and threads.
+
+Usage:
+    from javbus_session import get_session
+    session = get_session('http://127.0.0.1:7890')
+    response, body = session.get('https://www.javbus.com/SSIS-001')
+    print(session.stats())
+"""
+
+import os
+import ssl
+import threading
+import http.client
+import urllib.error
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit, urljoin
+
+# Both can be overridden from the environment, e.g. to run the organizers
+# against javbus_standin.py: AV_PROXY= JAVBUS_BASE_URL=http://127.0.0.1:8800
+DEFAULT_PROXY = os.environ.get('AV_PROXY', 'http://127.0.0.1:7890')
+
+JAVBUS_BASE_URL = os.environ.get('JAVBUS_BASE_URL', 'https://www.javbus.com').rstrip('/')
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,ja;q=0.8,en;q=0.7',
+    'Referer': JAVBUS_BASE_URL + '/',
+}
+
+# Age verification bypass, sent to the javbus host only
+DEFAULT_COOKIES = {'existmag': 'all'}
+
+REDIRECT_CODES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 5
+
+# Errors raised when a pooled keep-alive connection was closed by the peer
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+
+class ScrapeError(Exception):
+    """A detail page was fetched but did not yield metadata"""
+
+
+class AgeVerificationError(ScrapeError):
+    """The age verification page was served instead of the detail page"""
+
+
+class ParseError(ScrapeError):
+    """The page did not contain the expected fields"""
+
+
+class CircuitOpenError(Exception):
+    """The request was not sent because the circuit breaker is open"""
+
+
+class SessionResponse:
+    """
+    Wrapper around http.client.HTTPResponse
+
+    Closing it hands the connection back to the pool when the body was read
+    to the end, otherwise the connection is dropped.
+    """
+
+    def __init__(self, session, key, conn, response, url):
+        self._session = session
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+
+    def read(self, amt=None):
+        return self._response.read(amt)
+
+    def close(self):
+        if self._conn is None:
+            return
+        reusable = self._response.isclosed() and not self._response.will_close
+        if not reusable:
+            self._response.close()
+        self._session._release(self._key, self._conn, reusable)
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JavBusSession:
+    """
+    Keep-alive HTTP(S) session with a per-host connection pool
+
+    Args:
+        proxy: Proxy URL (e.g., 'http://127.0.0.1:7890'), None for direct
+        timeout: Socket timeout in seconds
+        max_idle_per_host: Idle connections kept per host
+    """
+
+    def __init__(self, proxy=DEFAULT_PROXY, timeout=20, max_idle_per_host=8):
+        self.proxy = proxy or None
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+
+        # Same relaxed TLS settings as the proxy-era scrapers
+        self.ssl_context = ssl.create_default_context()
+        self.ssl_context.check_hostname = False
+        self.ssl_context.verify_mode = ssl.CERT_NONE
+
+        self.cookies = {urlsplit(JAVBUS_BASE_URL).hostname: dict(DEFAULT_COOKIES)}
+
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'connections_opened': 0,
+            'connections_reused': 0,
+            'stale_retries': 0,
+        }
+
+    # Connection pool
+
+    def _new_connection(self, scheme, host, port):
+        if self.proxy:
+            proxy = urlsplit(self.proxy)
+            proxy_port = proxy.port or (443 if proxy.scheme == 'https' else 80)
+            if scheme == 'https':
+                conn = http.client.HTTPSConnection(
+                    proxy.hostname, proxy_port, timeout=self.timeout, context=self.ssl_context
+                )
+                conn.set_tunnel(host, port)
+            else:
+                conn = http.client.HTTPConnection(proxy.hostname, proxy_port, timeout=self.timeout)
+        elif scheme == 'https':
+            conn = http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self.ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+        with self._lock:
+            self._stats['connections_opened'] += 1
+        return conn
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self._stats['connections_reused'] += 1
+                return idle.pop(), True
+        return self._new_connection(*key), False
+
+    def _release(self, key, conn, reusable):
+        if reusable:
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.max_idle_per_host:
+                    idle.append(conn)
+                    return
+        conn.close()
+
+    # Cookies
+
+    def _cookie_header(self, host):
+        with self._lock:
+            jar = self.cookies.get(host)
+            if not jar:
+                return None
+            return '; '.join(f'{name}={value}' for name, value in jar.items())
+
+    def _store_cookies(self, host, response):
+        for header in response.headers.get_all('Set-Cookie') or []:
+            cookie = SimpleCookie()
+            try:
+                cookie.load(header)
+            except Exception:
+                continue
+            with self._lock:
+                jar = self.cookies.setdefault(host, {})
+                for name, morsel in cookie.items():
+                    jar[name] = morsel.value
+
+    # Requests
+
+    def _send(self, key, method, target, headers):
+        conn, reused = self._acquire(key)
+        try:
+            conn.request(method, target, headers=headers)
+            return conn, conn.getresponse()
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            # The server dropped an idle keep-alive connection; retry once
+            with self._lock:
+                self._stats['stale_retries'] += 1
+            conn = self._new_connection(*key)
+            conn.request(method, target, headers=headers)
+            return conn, conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+
+    def open(self, url, headers=None, method='GET'):
+        """
+        Send a request and return a SessionResponse (redirects are followed)
+
+        Raises:
+            urllib.error.HTTPError for 4xx/5xx responses, so callers keep the
+            same error handling they had with urllib openers.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            scheme = parts.scheme or 'https'
+            host = parts.hostname
+            port = parts.port or (443 if scheme == 'https' else 80)
+            key = (scheme, host, port)
+
+            request_headers = dict(DEFAULT_HEADERS)
+            cookie = self._cookie_header(host)
+            if cookie:
+                request_headers['Cookie'] = cookie
+            if headers:
+                request_headers.update(headers)
+
+            if self.proxy and scheme == 'http':
+                target = url
+            else:
+                target = parts.path or '/'
+                if parts.query:
+                    target += '?' + parts.query
+
+            with self._lock:
+                self._stats['requests'] += 1
+            conn, response = self._send(key, method, target, request_headers)
+            self._store_cookies(host, response)
+            wrapped = SessionResponse(self, key, conn, response, url)
+
+            if response.status in REDIRECT_CODES and response.getheader('Location'):
+                location = urljoin(url, response.getheader('Location'))
+                wrapped.read()
+                wrapped.close()
+                url = location
+                continue
+
+            if response.status >= 400:
+                wrapped.read()
+                wrapped.close()
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+
+            return wrapped
+
+        raise urllib.error.URLError(f'Too many redirects: {url}')
+
+    def get(self, url, headers=None):
+        """
+        Fetch a URL and read the whole body
+
+        Returns:
+            (SessionResponse, body bytes); the connection is already released
+        """
+        with self.open(url, headers=headers) as response:
+            body = response.read()
+        return response, body
+
+    def stats(self):
+        """Return request / connection counters"""
+        with self._lock:
+            return dict(self._stats)
+
+    def format_stats(self):
+        stats = self.stats()
+        return (f"{stats['requests']} requests, "
+                f"{stats['connections_opened']} connections opened, "
+                f"{stats['connections_reused']} reused")
+
+    def close(self):
+        with self._lock:
+            pools = list(self._idle.values())
+            self._idle = {}
+        for idle in pools:
+            for conn in idle:
+                conn.close()
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(proxy=DEFAULT_PROXY):
+    """Return the process-wide session for a proxy (created on first use)"""
+    key = proxy or None
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = JavBusSession(proxy=key)
+            _sessions[key] = session
+        return session
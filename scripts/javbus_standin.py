@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地 JavBus 替身服务器 - 离线测试并发、缓存、重试和限速
+
+Serves recorded detail pages (fetch_full_page.py output, a directory of
+them, or the page cache), placeholder posters, 404s and age verification
+pages over keep-alive HTTP/1.1, with configurable latency, jitter, server
+errors and 429 responses. Point the scrapers and organizers at it with:
+
+    AV_PROXY= JAVBUS_BASE_URL=http://127.0.0.1:8800 python hybrid_organizer.py <dir> --dry-run
+
+Usage:
+    python javbus_standin.py [<page.html|directory> ...] [--cache] [--synthetic]
+                             [--port 8800] [--latency MS] [--jitter MS]
+                             [--error-rate P] [--throttle-rate P] [--max-rps N]
+                             [--age-rate P] [--missing-rate P] [--poster-kb N] [--seed N]
+
+    --synthetic: 没有录制页面的番号也生成一个详情页（否则返回 404）
+    --error-rate / --throttle-rate: 随机返回 500 / 429 的比例
+    --max-rps: 每秒请求数上限，超过时返回 429（Retry-After: 1）
+    --age-rate: 即使带了 existmag=all 也返回年龄验证页的比例
+    --missing-rate: 对存在的番号也返回 404 的比例
+
+GET /__stats returns request counts per status as JSON.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from async_fetch import TokenBucket
+from bench_parsers import load_pages
+
+LIVE_BASE_URL = 'https://www.javbus.com'
+
+CODE_PATH = re.compile(r'^/([A-Za-z0-9][A-Za-z0-9_-]*)/?$')
+
+AGE_VERIFICATION_PAGE = '''<!DOCTYPE html><html><head><title>Age Verification JavBus</title></head>
+<body><div class="modal" id="ageVerify"><h4>Age Verification</h4>
+<p>You must be 18 years or older to enter this site.</p>
+<form><input type="checkbox" name="driver-verify"> <button type="submit">OK</button></form>
+</div></body></html>'''
+
+NOT_FOUND_PAGE = '''<!DOCTYPE html><html><head><title>404 Page Not Found! - JavBus</title></head>
+<body><h4>404 Page Not Found!</h4></body></html>'''
+
+SYNTHETIC_STUDIOS = ['エスワン ナンバーワンスタイル', 'ムーディーズ', 'アイデアポケット', 'プレステージ',
+                     'マドンナ', 'kawaii', 'FALENO', 'ダスッ！']
+
+
+def synthetic_page(code, base_url):
+    """Detail page in the javbus layout for a code that was never recorded"""
+    digest = int(hashlib.md5(code.encode()).hexdigest(), 16)
+    studio = SYNTHETIC_STUDIOS[digest % len(SYNTHETIC_STUDIOS)]
+    actresses = [f'女優{(digest >> (8 * i)) % 500:03d}' for i in range(1 + digest % 3)]
+    cover = f'{base_url}/pics/cover/{code.lower().replace("-", "")}_b.jpg'
+
+    stars = ''.join(
+        f'<a class="avatar-box" href="{base_url}/star/{i}"><div class="photo-frame">'
+        f'<img src="/pics/actress/{i}_a.jpg" title="{name}"></div><span>{name}</span></a>'
+        for i, name in enumerate(actresses))
+    genres = ''.join(
+        f'<span class="genre"><label><a href="{base_url}/genre/{i}">ジャンル{i}</a></label></span>'
+        for i in range(10))
+    samples = ''.join(
+        f'<a class="sample-box" href="{base_url}/pics/sample/{code}_{i}.jpg"><div class="photo-frame">'
+        f'<img src="{base_url}/pics/sample/{code}_{i}.jpg" title="{code} - 樣品圖像 - {i}"></div></a>'
+        for i in range(20))
+    filler = ''.join(f'<li><a href="{base_url}/genre/{i}">類別{i}</a></li>\n' for i in range(150))
+
+    return f'''<!DOCTYPE html><html><head><meta charset="utf-8"><title>{code} - JavBus</title></head>
+<body><nav><ul>{filler}</ul></nav>
+<div class="container"><h3>{code} {studio} 作品 {digest % 10000}</h3>
+<div class="row movie"><div class="col-md-9 screencap">
+<a class="bigImage" href="{cover}"><img src="{cover}" title="{code}"></a></div>
+<div class="col-md-3 info"><p><span class="header">識別碼:</span> <span>{code}</span></p>
+<p><span class="header">製作商:</span> <a href="{base_url}/studio/{digest % 97:x}">{studio}</a></p>
+<p class="header">類別:</p><p>{genres}</p></div></div>
+<div id="avatar-waterfall">{stars}</div></div>
+<div id="sample-waterfall">{samples}</div>
+</body></html>'''
+
+
+def placeholder_jpeg(size):
+    """Bytes that look like a JPEG (SOI ... EOI) of roughly the given size"""
+    return b'\xff\xd8\xff\xe0\x00\x10JFIF\x00' + b'\x00' * max(0, size - 15) + b'\xff\xd9'
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the corpus, fault settings and counters"""
+
+    daemon_threads = True
+
+    def __init__(self, address, pages, options):
+        super().__init__(address, StandInHandler)
+        self.base_url = f'http://{address[0]}:{self.server_address[1]}'
+        self.pages = {code: html.replace(LIVE_BASE_URL, self.base_url) for code, html in pages}
+        self.options = options
+        self.poster = placeholder_jpeg(options.poster_kb * 1024)
+        self.started = formatdate(time.time(), usegmt=True)
+        self.bucket = TokenBucket(options.max_rps, burst=max(1, int(options.max_rps))) \
+            if options.max_rps > 0 else None
+        self.random = random.Random(options.seed)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def roll(self, probability):
+        """True with the given probability (seeded, thread-safe)"""
+        if probability <= 0:
+            return False
+        with self._lock:
+            return self.random.random() < probability
+
+    def delay(self):
+        options = self.options
+        with self._lock:
+            jitter = self.random.uniform(-options.jitter, options.jitter) if options.jitter else 0
+        return max(0.0, options.latency + jitter) / 1000
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.options.verbose:
+            super().log_message(format, *args)
+
+    def send_body(self, status, body, content_type='text/html; charset=utf-8', headers=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.server.count(status)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading (e.g. a streaming parse finished early)
+                self.close_connection = True
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        server = self.server
+        options = server.options
+
+        if self.path == '/__stats':
+            body = json.dumps({str(key): value for key, value in sorted(server.stats.items(), key=str)})
+            self.send_body(200, body, 'application/json')
+            return
+
+        time.sleep(server.delay())
+
+        if server.bucket is not None and not server.bucket.try_acquire():
+            self.send_body(429, 'Too Many Requests', 'text/plain', {'Retry-After': '1'})
+            return
+        if server.roll(options.throttle_rate):
+            self.send_body(429, 'Too Many Requests', 'text/plain', {'Retry-After': '1'})
+            return
+        if server.roll(options.error_rate):
+            self.send_body(500, 'Internal Server Error', 'text/plain')
+            return
+
+        if self.path.startswith('/pics/'):
+            self.send_body(200, server.poster, 'image/jpeg')
+            return
+
+        match = CODE_PATH.match(self.path)
+        if not match:
+            self.send_body(404, NOT_FOUND_PAGE)
+            return
+
+        if 'existmag=all' not in (self.headers.get('Cookie') or '') or server.roll(options.age_rate):
+            server.count('age_verification')
+            self.send_body(200, AGE_VERIFICATION_PAGE)
+            return
+
+        code = match.group(1).upper()
+        html = server.pages.get(code)
+        if html is None and options.synthetic:
+            html = synthetic_page(code, server.base_url)
+        if html is None or server.roll(options.missing_rate):
+            self.send_body(404, NOT_FOUND_PAGE)
+            return
+
+        body = html.encode('utf-8')
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        headers = {'ETag': etag, 'Last-Modified': server.started}
+        if self.headers.get('If-None-Match') == etag:
+            server.count(304)
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_body(200, body, headers=headers)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Local javbus stand-in server')
+    parser.add_argument('paths', nargs='*', help='Recorded detail pages or directories of them')
+    parser.add_argument('--cache', action='store_true', help='Also serve pages from the page cache')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='Generate a detail page for codes that were not recorded')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--latency', type=float, default=0, help='Base latency in ms')
+    parser.add_argument('--jitter', type=float, default=0, help='Uniform +/- jitter in ms')
+    parser.add_argument('--error-rate', type=float, default=0, help='Share of 500 responses')
+    parser.add_argument('--throttle-rate', type=float, default=0, help='Share of 429 responses')
+    parser.add_argument('--max-rps', type=float, default=0, help='Requests/sec before answering 429')
+    parser.add_argument('--age-rate', type=float, default=0, help='Share of age verification pages')
+    parser.add_argument('--missing-rate', type=float, default=0, help='Share of 404s for known codes')
+    parser.add_argument('--poster-kb', type=int, default=60, help='Placeholder poster size')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for the random faults')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    pages = load_pages(args.paths, args.cache)
+    if not pages and not args.synthetic:
+        parser.error('no pages to serve (pass recorded pages, --cache or --synthetic)')
+
+    server = StandInServer((args.host, args.port), pages, args)
+    print(f"Serving {len(pages)} recorded pages{' + synthetic pages' if args.synthetic else ''} "
+          f"on {server.base_url}")
+    print(f"  AV_PROXY= JAVBUS_BASE_URL={server.base_url} python hybrid_organizer.py <dir> --dry-run")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print('\n' + ', '.join(f'{key}: {value}' for key, value in sorted(server.stats.items(), key=str)))
+
+
+if __name__ == "__main__":
+    main()
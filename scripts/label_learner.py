@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+番号前缀厂牌学习 - 从已抓取的元数据统计 前缀 -> 厂牌
+
+The studio table (studios.json) lists about thirty labels; every other
+label falls back to 'Unknown' when javbus cannot be reached. Scraped
+metadata already says which studio each code belongs to, so this module
+counts, per label (SSIS, LUXU, ...), the codes seen for each studio and
+lets fallback mode use the dominant studio of a label once enough codes
+agree on it.
+
+Counts come from the metadata store, the page cache (pages without a
+stored result are parsed) and the metadata.json files of organized
+libraries. Each code is counted once, whichever source it came from.
+The result is one small JSON file in the global state folder: per label
+the number of codes and the top studios with their counts, and each
+studio's display name once. The codes counted so far are kept apart in
+label-codes.db, which only update and rebuild open, so the file every
+organizer loads does not grow with the scrape history. It grows by
+itself: the first lookup in a process adds the store rows written since
+the last update, skipping codes counted before (a page counted by rebuild
+and scraped into the store later, a code looked up again with --refresh
+or by both scrapers). Organizers running without the store do not update
+it. rebuild recounts everything.
+
+A label resolves when at least --min-codes codes were seen and the top
+studio has at least --confidence of them.
+
+Usage:
+    python label_learner.py rebuild [--library DIR ...] [--no-pages]
+    python label_learner.py update
+    python label_learner.py lookup <LABEL|CODE> [--confidence P] [--min-codes N]
+    python label_learner.py stats [--confidence P] [--min-codes N]
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from av_state import global_state_dir, STATE_DIR_NAME
+from extract_code import extract_av_code, code_family, code_label
+from studio_table import get_studio_table
+from metadata_store import get_metadata_store
+from page_cache import get_page_cache
+
+DEFAULT_CONFIDENCE = 0.6    # share of a label's codes the top studio needs
+DEFAULT_MIN_CODES = 2       # codes of a label seen before it is trusted
+TOP_STUDIOS = 3             # studios kept per label
+UNKNOWN_STUDIOS = {'', 'unknown', 'others'}
+
+
+class LabelLearner:
+    """
+    Label -> studio statistics learned from scraped metadata
+
+    Args:
+        path: Statistics file (default: label-studios.json in the global state folder)
+        counted_path: Database of the codes counted so far (default: label-codes.db
+            next to the statistics file)
+        confidence: Share of a label's codes the top studio needs to be used
+        min_codes: Codes of a label that must have been seen
+    """
+
+    def __init__(self, path=None, confidence=DEFAULT_CONFIDENCE, min_codes=DEFAULT_MIN_CODES,
+                 counted_path=None):
+        self.path = path or global_state_dir() / 'label-studios.json'
+        self.counted_path = counted_path or os.path.join(os.path.dirname(str(self.path)), 'label-codes.db')
+        self.confidence = confidence
+        self.min_codes = min_codes
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        # label -> [total codes, slug, codes, slug, codes, ...] most codes first
+        self.labels = data.get('labels', {})
+        self.studios = data.get('studios', {})     # slug -> display name
+        self.codes = data.get('codes', 0)
+        self.mined_until = data.get('mined_until', 0)
+        self.built_at = data.get('built_at')
+
+    def configure(self, confidence=None, min_codes=None):
+        if confidence is not None:
+            self.confidence = confidence
+        if min_codes is not None:
+            self.min_codes = min_codes
+
+    def save(self):
+        data = {'built_at': self.built_at, 'mined_until': self.mined_until, 'codes': self.codes,
+                'studios': self.studios, 'labels': self.labels}
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+        os.replace(tmp, self.path)
+
+    # Learning
+
+    def _open_counted(self, reset=False):
+        """Database of the codes already in the counts (emptied for a rebuild)"""
+        db = sqlite3.connect(str(self.counted_path))
+        db.execute('CREATE TABLE IF NOT EXISTS counted (code TEXT PRIMARY KEY)')
+        if reset:
+            db.execute('DELETE FROM counted')
+        return db
+
+    def _count(self, counts, counted, code, metadata):
+        """Add one code's studio to counts {label: {slug: codes}}; False if unusable or counted before"""
+        if not metadata or metadata.get('source') == 'fallback':
+            return False
+        if counted.execute('SELECT 1 FROM counted WHERE code = ?', (code,)).fetchone():
+            return False
+        studio = (metadata.get('studio') or '').strip()
+        family = code_family(code)
+        label = code_label(code)
+        if not label or (family and family.studio) or studio.lower() in UNKNOWN_STUDIOS:
+            return False
+        table = get_studio_table()
+        slug = table.normalize(studio)
+        self.studios.setdefault(slug, table.display.get(slug, studio))
+        studios = counts.setdefault(label, {})
+        studios[slug] = studios.get(slug, 0) + 1
+        counted.execute('INSERT INTO counted VALUES (?)', (code,))
+        return True
+
+    def _merge(self, counts):
+        """Fold counts into the stored labels, keeping the top studios of each"""
+        for label, studios in counts.items():
+            entry = self.labels.get(label, [0])
+            merged = dict(zip(entry[1::2], entry[2::2]))
+            for slug, n in studios.items():
+                merged[slug] = merged.get(slug, 0) + n
+            ranked = sorted(merged.items(), key=lambda item: (-item[1], item[0]))[:TOP_STUDIOS]
+            self.labels[label] = [entry[0] + sum(studios.values())] + [x for pair in ranked for x in pair]
+
+    def update(self):
+        """
+        Count store rows written since the last update
+
+        Codes counted before (from any source) are skipped.
+
+        Returns:
+            Number of codes counted
+        """
+        with self._lock:
+            counts = {}
+            added = 0
+            rows = get_metadata_store().successes(self.mined_until)
+            if not rows:
+                return 0
+            counted = self._open_counted()
+            try:
+                for code, metadata, fetched_at in rows:
+                    added += self._count(counts, counted, code, metadata)
+                    self.mined_until = max(self.mined_until, fetched_at)
+                self._merge(counts)
+                self.codes += added
+                counted.commit()
+                self.save()
+            finally:
+                counted.close()
+            return added
+
+    def rebuild(self, libraries=(), pages=True):
+        """
+        Recount from the metadata store, the page cache and library metadata.json files
+
+        Returns:
+            {source: codes counted}
+        """
+        with self._lock:
+            counts = {}
+            seen = set()
+            self.studios = {}
+            counted_db = self._open_counted(reset=True)
+            counted = {'store': 0, 'pages': 0, 'libraries': 0}
+            # Store rows written from now on are new to update()
+            mined_until = started = time.time()
+
+            for code, metadata, fetched_at in get_metadata_store().successes():
+                seen.add(code)
+                counted['store'] += self._count(counts, counted_db, code, metadata)
+                mined_until = max(mined_until, fetched_at)
+
+            if pages:
+                from complete_javbus_scraper import parse_javbus_complete
+                cache = get_page_cache()
+                for code in cache.codes():
+                    if code in seen:
+                        continue
+                    body = cache.read(code)
+                    if not body:
+                        continue
+                    try:
+                        metadata = parse_javbus_complete(body.decode('utf-8', errors='ignore'), code)
+                    except Exception:
+                        continue
+                    counted['pages'] += self._count(counts, counted_db, code, metadata)
+
+            for library in libraries:
+                for root, dirs, files in os.walk(library):
+                    dirs[:] = [d for d in dirs if d != STATE_DIR_NAME and not d.startswith('.')]
+                    if 'metadata.json' not in files:
+                        continue
+                    try:
+                        with open(os.path.join(root, 'metadata.json'), encoding='utf-8') as f:
+                            metadata = json.load(f)
+                    except (OSError, ValueError):
+                        continue
+                    code = (metadata.get('code') or extract_av_code(os.path.basename(root)) or '').upper()
+                    if not code:
+                        continue
+                    counted['libraries'] += self._count(counts, counted_db, code, metadata)
+
+            self.labels = {}
+            self._merge(counts)
+            self.codes = sum(counted.values())
+            self.mined_until = mined_until
+            self.built_at = started
+            counted_db.commit()
+            counted_db.close()
+            self.save()
+            return counted
+
+    # Lookups
+
+    def studio_stats(self, label):
+        """(total codes, [(slug, display name, codes), ...]) for a label, or None"""
+        entry = self.labels.get(label.upper())
+        if not entry:
+            return None
+        return entry[0], [(slug, self.studios.get(slug, slug), n) for slug, n in zip(entry[1::2], entry[2::2])]
+
+    def studio_for_label(self, label, confidence=None, min_codes=None):
+        """Display name of the label's dominant studio, or None below the thresholds"""
+        entry = self.labels.get(label.upper()) if label else None
+        if not entry:
+            return None
+        confidence = self.confidence if confidence is None else confidence
+        min_codes = self.min_codes if min_codes is None else min_codes
+        if entry[0] < min_codes or len(entry) < 3 or entry[2] < confidence * entry[0]:
+            return None
+        return self.studios.get(entry[1], entry[1])
+
+    def resolvable(self, confidence=None, min_codes=None):
+        """Number of labels that resolve at the thresholds"""
+        return sum(1 for label in self.labels if self.studio_for_label(label, confidence, min_codes))
+
+
+_learner = None
+_learner_lock = threading.Lock()
+
+
+def get_label_learner(update=True):
+    """
+    Process-wide learner, updated from the metadata store on first use
+
+    Args:
+        update: Count new store rows when the learner is created (False
+            when the caller runs without the store)
+    """
+    global _learner
+    with _learner_lock:
+        if _learner is None:
+            _learner = LabelLearner()
+            if not update:
+                return _learner
+            try:
+                _learner.update()
+            except Exception as e:
+                print(f"  ! Label statistics not updated: {e}")
+        return _learner
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Label -> studio statistics from scraped metadata')
+    parser.add_argument('command', choices=['rebuild', 'update', 'lookup', 'stats'])
+    parser.add_argument('label', nargs='?', help='Label or code (lookup)')
+    parser.add_argument('--library', action='append', default=[],
+                        help='rebuild: also count metadata.json files below this library')
+    parser.add_argument('--no-pages', action='store_true', help='rebuild: do not parse cached pages')
+    parser.add_argument('--confidence', type=float, default=DEFAULT_CONFIDENCE)
+    parser.add_argument('--min-codes', type=int, default=DEFAULT_MIN_CODES)
+    args = parser.parse_args()
+
+    learner = LabelLearner(confidence=args.confidence, min_codes=args.min_codes)
+    if args.command in ('lookup', 'stats'):
+        learner.update()
+    if args.command == 'rebuild':
+        started = time.perf_counter()
+        counted = learner.rebuild(args.library, pages=not args.no_pages)
+        print(f"Counted {learner.codes} codes ({counted['store']} stored, {counted['pages']} cached pages, "
+              f"{counted['libraries']} metadata.json) in {time.perf_counter() - started:.1f}s")
+    elif args.command == 'update':
+        print(f"Counted {learner.update()} new codes")
+    elif args.command == 'lookup':
+        if not args.label:
+            parser.error('label is required')
+        label = args.label.upper()
+        code = extract_av_code(label)
+        if code:
+            label = code_label(code) or label
+        stats = learner.studio_stats(label)
+        if not stats:
+            print(json.dumps({"error": f"No codes seen for {label}"}))
+            sys.exit(1)
+        total, top = stats
+        print(json.dumps({'label': label, 'studio': learner.studio_for_label(label), 'codes': total,
+                          'top': [{'slug': slug, 'studio': display, 'codes': n, 'share': round(n / total, 3)}
+                                  for slug, display, n in top]},
+                         ensure_ascii=False, indent=2))
+        sys.exit(0 if learner.studio_for_label(label) else 1)
+    if args.command in ('rebuild', 'update', 'stats'):
+        size = os.path.getsize(learner.path) if os.path.exists(learner.path) else 0
+        print(f"{learner.path}: {len(learner.labels)} labels from {learner.codes} codes, {size / 1024:.1f} KB")
+        print(f"  resolvable at confidence {learner.confidence:.0%}, min {learner.min_codes} codes: "
+              f"{learner.resolvable()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+库索引 - 记录库中每个视频的番号、位置、大小和元数据状态
+
+--reorganize and cleanup.py used to os.walk the whole library and stat
+metadata.json next to every video. The index keeps one row per video (code,
+path, size, mtime) and one row per folder (mtime, whether metadata.json is
+present, parent folder) in <library>/.av-organizer/index.db. The folder rows
+double as a change journal: adding, removing or renaming an entry updates
+the mtime of the folder that holds it, so refresh() only re-lists folders
+whose mtime differs from the recorded one. Below an unchanged folder the
+recorded subfolders are stat'ed instead of listed, and the metadata status
+comes from the folder listing instead of a stat of metadata.json.
+Organizers record the items they move so the index stays current between
+refreshes; --full re-lists everything.
+
+Usage:
+    python library_index.py <library> [--list] [--full]
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import threading
+
+from av_state import STATE_DIR_NAME, library_state_dir
+from extract_code import extract_av_code
+from video_scan import list_dir
+
+VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.wmv', '.flv', '.mov', '.m4v', '.rmvb', '.ts'}
+
+METADATA_FILENAME = 'metadata.json'
+
+SCHEMA_VERSION = 2
+
+# A folder modified this recently may change again within the same mtime
+# tick (FAT/SMB shares have 2 s resolution); it is listed again next time
+RACY_SECONDS = 2.0
+
+
+def is_item_folder_name(name):
+    """[番号] 标题"""
+    return name.startswith('[') and ']' in name
+
+
+class LibraryIndex:
+    """
+    SQLite index of the videos in one library
+
+    Args:
+        base_dir: Library root
+        extensions: Video file extensions
+    """
+
+    def __init__(self, base_dir, extensions=VIDEO_EXTENSIONS):
+        self.base_dir = os.path.abspath(base_dir)
+        self.extensions = extensions
+        self.path = library_state_dir(self.base_dir) / 'index.db'
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        if self._db.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            # Older layout: the index is derived data, rebuild it
+            self._db.executescript('''
+                DROP TABLE IF EXISTS folders;
+                DROP TABLE IF EXISTS items;
+            ''')
+            self._db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS folders (
+                path TEXT PRIMARY KEY,
+                parent TEXT,
+                mtime REAL NOT NULL,
+                has_metadata INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS folders_parent ON folders (parent);
+            CREATE TABLE IF NOT EXISTS items (
+                path TEXT PRIMARY KEY,
+                folder TEXT NOT NULL,
+                code TEXT,
+                size INTEGER,
+                mtime REAL
+            );
+            CREATE INDEX IF NOT EXISTS items_folder ON items (folder);
+        ''')
+        self._db.commit()
+        self.relisted = 0
+        self.reused = 0
+
+    def _list_folder(self, folder, parent, mtime, stats):
+        """Re-list one folder, replace its rows and return its (subfolder, mtime) pairs"""
+        subdirs = []
+        items = []
+        has_metadata = False
+        for entry in list_dir(folder, stats):
+            if entry.name == STATE_DIR_NAME:
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # Like os.walk: symlinked folders are not descended into
+                if not entry.is_symlink():
+                    if stats is not None:
+                        stats.stat += 1
+                    try:
+                        subdirs.append((entry.path, entry.stat(follow_symlinks=False).st_mtime))
+                    except OSError:
+                        pass
+            elif entry.name == METADATA_FILENAME:
+                has_metadata = True
+            elif os.path.splitext(entry.name)[1].lower() in self.extensions:
+                if stats is not None:
+                    stats.stat += 1
+                try:
+                    st = entry.stat()
+                    size, item_mtime = st.st_size, st.st_mtime
+                except OSError:
+                    size = item_mtime = None
+                items.append((entry.path, folder, extract_av_code(entry.name), size, item_mtime))
+
+        self._db.execute('DELETE FROM items WHERE folder = ?', (folder,))
+        self._db.executemany('INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)', items)
+        if time.time() - mtime < RACY_SECONDS:
+            mtime = -1.0
+        self._db.execute('INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?)',
+                         (folder, parent, mtime, has_metadata))
+        self.relisted += 1
+        return subdirs
+
+    def refresh(self, stats=None, full=False):
+        """
+        Bring the index up to date with the library
+
+        A folder is listed again only when its mtime changed; the recorded
+        subfolders of an unchanged folder are stat'ed to decide whether to
+        descend. Rows of folders that are gone are dropped.
+
+        Args:
+            stats: video_scan.ScanStats to count filesystem calls
+            full: List every folder regardless of the recorded mtimes
+        """
+        if stats is not None:
+            stats.stat += 1
+        try:
+            root_mtime = os.stat(self.base_dir).st_mtime
+        except OSError:
+            return
+
+        with self._lock:
+            known = {}
+            children = {}
+            for path, parent, mtime in self._db.execute('SELECT path, parent, mtime FROM folders'):
+                known[path] = mtime
+                children.setdefault(parent, []).append(path)
+
+            seen = set()
+            pending = [(self.base_dir, None, root_mtime)]
+            while pending:
+                folder, parent, mtime = pending.pop()
+                seen.add(folder)
+                if full or known.get(folder) != mtime:
+                    pending.extend((subdir, folder, subdir_mtime) for subdir, subdir_mtime
+                                   in self._list_folder(folder, parent, mtime, stats))
+                    continue
+                self.reused += 1
+                for subdir in children.get(folder, ()):
+                    if stats is not None:
+                        stats.stat += 1
+                    try:
+                        pending.append((subdir, folder, os.lstat(subdir).st_mtime))
+                    except OSError:
+                        pass
+
+            gone = [(path,) for path in known if path not in seen]
+            self._db.executemany('DELETE FROM items WHERE folder = ?', gone)
+            self._db.executemany('DELETE FROM folders WHERE path = ?', gone)
+            self._db.commit()
+
+    def record(self, video_path):
+        """Re-list the folder of a video that was just moved or written"""
+        folder = os.path.dirname(os.path.abspath(video_path))
+        try:
+            mtime = os.stat(folder).st_mtime
+        except OSError:
+            return
+        with self._lock:
+            self._list_folder(folder, os.path.dirname(folder), mtime, None)
+            self._db.commit()
+
+    def forget(self, video_path):
+        """Drop a video that was moved away or deleted"""
+        with self._lock:
+            self._db.execute('DELETE FROM items WHERE path = ?', (os.path.abspath(video_path),))
+            self._db.commit()
+
+    def videos(self):
+        """
+        All indexed videos in path order
+
+        Returns:
+            List of dicts with path, folder, code, size, mtime, has_metadata
+        """
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT items.path, items.folder, items.code, items.size, items.mtime, '
+                'folders.has_metadata FROM items LEFT JOIN folders ON folders.path = items.folder '
+                'ORDER BY items.path').fetchall()
+        return [dict(zip(('path', 'folder', 'code', 'size', 'mtime', 'has_metadata'), row),
+                     has_metadata=bool(row[5]))
+                for row in rows]
+
+    def format_stats(self):
+        return f"{self.relisted} folders listed, {self.reused} unchanged folders skipped"
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Per-library video index')
+    parser.add_argument('directory', help='Library root')
+    parser.add_argument('--list', action='store_true', help='Print every indexed video')
+    parser.add_argument('--full', action='store_true', help='List every folder again')
+    args = parser.parse_args()
+
+    from video_scan import ScanStats
+    index = LibraryIndex(args.directory)
+    stats = ScanStats()
+    index.refresh(stats, full=args.full)
+    videos = index.videos()
+    if args.list:
+        for video in videos:
+            status = 'ok' if video['has_metadata'] else 'no metadata'
+            print(f"{video['code'] or '-'}\t{status}\t{video['path']}")
+    standard = sum(1 for video in videos
+                   if video['has_metadata'] and is_item_folder_name(os.path.basename(video['folder'])))
+    print(f"{len(videos)} videos, {standard} in item folders with metadata")
+    print(f"{index.format_stats()} ({stats.format()})")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
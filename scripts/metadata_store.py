@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+元数据库 - 按番号保存抓取结果和失败记录（负缓存）
+
+One SQLite table keyed by code and scraper holds the parsed metadata of
+successful lookups and, for failures, the error class and the earliest time
+the code may be retried. The scrapers do not produce the same fields (the
+complete scraper strips the code from the title, the enhanced one keeps it
+and reports 'Unknown' studios it cannot parse), so each organizer only
+reuses the rows of the scraper it uses itself. Organizers consult it before
+touching the network, so codes that 404 or keep hitting the age
+verification page are not re-requested on every --retry-failed run.
+
+Usage:
+    python metadata_store.py show <code> [--source SCRAPER]
+    python metadata_store.py stats
+    python metadata_store.py forget <code> [--source SCRAPER]
+"""
+
+import sys
+import json
+import time
+import socket
+import sqlite3
+import threading
+import urllib.error
+
+from av_state import global_state_dir
+from javbus_session import AgeVerificationError, ParseError, CircuitOpenError
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# First retry delay per error class; doubled on every further failure
+RETRY_DELAYS = {
+    'not_found': 7 * DAY,
+    'parse_failed': 1 * DAY,
+    'age_verification': 6 * HOUR,
+    'rate_limited': 15 * 60,
+    'http_error': 1 * HOUR,
+    'timeout': 30 * 60,
+    'network': 30 * 60,
+    'unknown': 1 * HOUR,
+}
+MAX_RETRY_DELAY = 30 * DAY
+
+
+def classify_error(error):
+    """Map a scraper exception to an error class (None: no request was made)"""
+    if isinstance(error, CircuitOpenError):
+        return None
+    if isinstance(error, urllib.error.HTTPError):
+        if error.code == 404:
+            return 'not_found'
+        if error.code == 429:
+            return 'rate_limited'
+        return 'http_error'
+    if isinstance(error, AgeVerificationError):
+        return 'age_verification'
+    if isinstance(error, ParseError):
+        return 'parse_failed'
+    if isinstance(error, (socket.timeout, TimeoutError)):
+        return 'timeout'
+    if isinstance(error, urllib.error.URLError):
+        if isinstance(error.reason, (socket.timeout, TimeoutError)):
+            return 'timeout'
+        return 'network'
+    if isinstance(error, OSError):
+        return 'network'
+    return 'unknown'
+
+
+def retry_delay(error_class, attempts):
+    """Seconds to wait before retrying after the given number of failures"""
+    delay = RETRY_DELAYS.get(error_class, RETRY_DELAYS['unknown'])
+    return min(MAX_RETRY_DELAY, delay * 2 ** max(0, attempts - 1))
+
+
+class MetadataStore:
+    """
+    SQLite store of lookup results keyed by code and source (scraper name)
+
+    Args:
+        path: Database file (default: <state dir>/metadata.db)
+    """
+
+    def __init__(self, path=None):
+        self.path = path or global_state_dir() / 'metadata.db'
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS metadata (
+                code TEXT NOT NULL,
+                status TEXT NOT NULL,
+                metadata TEXT,
+                source TEXT NOT NULL,
+                error_class TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                fetched_at REAL NOT NULL,
+                next_retry_at REAL,
+                PRIMARY KEY (code, source)
+            )''')
+        self._db.commit()
+        self.hits = 0
+        self.negative_hits = 0
+        self.fetched = 0
+
+    @staticmethod
+    def normalize_code(code):
+        return code.upper().strip().replace(' ', '-')
+
+    @staticmethod
+    def _entry(row):
+        entry = dict(zip(('code', 'status', 'metadata', 'source', 'error_class',
+                          'attempts', 'fetched_at', 'next_retry_at'), row))
+        if entry['metadata']:
+            entry['metadata'] = json.loads(entry['metadata'])
+        return entry
+
+    def lookup(self, code, source):
+        """Row for a code and source as a dict, or None"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT code, status, metadata, source, error_class, attempts, fetched_at, next_retry_at '
+                'FROM metadata WHERE code = ? AND source = ?', (self.normalize_code(code), source)).fetchone()
+        return self._entry(row) if row else None
+
+    def lookup_all(self, code):
+        """Rows of every source for a code"""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT code, status, metadata, source, error_class, attempts, fetched_at, next_retry_at '
+                'FROM metadata WHERE code = ? ORDER BY source', (self.normalize_code(code),)).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def get_metadata(self, code, source):
+        """Stored metadata for a code the source scraped successfully, or None"""
+        entry = self.lookup(code, source)
+        if entry and entry['status'] == 'ok':
+            return entry['metadata']
+        return None
+
+    def is_known_failure(self, code, source, now=None):
+        """Error class if the code failed and is not due for a retry yet"""
+        entry = self.lookup(code, source)
+        if not entry or entry['status'] != 'failed':
+            return None
+        if (now or time.time()) < (entry['next_retry_at'] or 0):
+            return entry['error_class']
+        return None
+
+    def record_success(self, code, metadata, source):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, NULL, 0, ?, NULL)',
+                (self.normalize_code(code), 'ok', json.dumps(metadata, ensure_ascii=False),
+                 source, time.time()))
+            self._db.commit()
+
+    def record_failure(self, code, error_class, source):
+        code = self.normalize_code(code)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT status, attempts FROM metadata WHERE code = ? AND source = ?',
+                                   (code, source)).fetchone()
+            if row and row[0] == 'ok':
+                # Keep good metadata; a transient failure does not erase it
+                return
+            attempts = (row[1] if row else 0) + 1
+            self._db.execute(
+                'INSERT OR REPLACE INTO metadata VALUES (?, ?, NULL, ?, ?, ?, ?, ?)',
+                (code, 'failed', source, error_class, attempts, now, now + retry_delay(error_class, attempts)))
+            self._db.commit()
+
+    def forget(self, code, source=None):
+        """Drop a code's rows (of one source, or of all)"""
+        with self._lock:
+            if source is None:
+                self._db.execute('DELETE FROM metadata WHERE code = ?', (self.normalize_code(code),))
+            else:
+                self._db.execute('DELETE FROM metadata WHERE code = ? AND source = ?',
+                                 (self.normalize_code(code), source))
+            self._db.commit()
+
+    def fetch(self, code, scrape, source, refresh=False):
+        """
+        Return metadata for a code, asking scrape(code) only when needed
+
+        Args:
+            code: AV code
+            scrape: code -> metadata; must raise on failure (raise_errors=True)
+            source: Scraper name ('complete', 'enhanced'); only its rows are reused
+            refresh: Ignore stored results and negative entries
+
+        Returns:
+            Metadata dict or None (failure now or a known failure)
+        """
+        if not refresh:
+            metadata = self.get_metadata(code, source)
+            if metadata:
+                self.hits += 1
+                return metadata
+            error_class = self.is_known_failure(code, source)
+            if error_class:
+                self.negative_hits += 1
+                return None
+
+        self.fetched += 1
+        try:
+            metadata = scrape(code)
+        except Exception as e:
+            error_class = classify_error(e)
+            if error_class:
+                self.record_failure(code, error_class, source)
+            return None
+        if not metadata:
+            self.record_failure(code, 'unknown', source)
+            return None
+        self.record_success(code, metadata, source)
+        return metadata
+
+    def successes(self, since=0):
+        """(code, metadata, fetched_at) of every successful lookup (any source) stored after since"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT code, metadata, fetched_at FROM metadata "
+                "WHERE status = 'ok' AND fetched_at > ? ORDER BY fetched_at", (since,)).fetchall()
+        return [(code, json.loads(metadata), fetched_at) for code, metadata, fetched_at in rows]
+
+    def counts(self):
+        """Number of rows per status / error class"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT CASE status WHEN 'ok' THEN 'ok' ELSE error_class END, COUNT(*) "
+                "FROM metadata GROUP BY 1").fetchall()
+        return dict(rows)
+
+    def format_stats(self):
+        return (f"{self.hits} answered from store, {self.negative_hits} skipped as known failures, "
+                f"{self.fetched} looked up")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_metadata_store():
+    """Process-wide store in the default location"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MetadataStore()
+        return _store
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='AV metadata store')
+    parser.add_argument('command', choices=['show', 'stats', 'forget'])
+    parser.add_argument('code', nargs='?')
+    parser.add_argument('--source', help="Scraper whose row to show/forget ('complete', 'enhanced'; default: all)")
+    args = parser.parse_args()
+
+    store = get_metadata_store()
+    if args.command == 'stats':
+        print(f"{store.path}")
+        for status, count in sorted(store.counts().items()):
+            print(f"  {status}: {count}")
+    elif not args.code:
+        parser.error('code is required')
+    elif args.command == 'forget':
+        store.forget(args.code, args.source)
+        print(f"Forgot {store.normalize_code(args.code)}")
+    else:
+        entries = store.lookup_all(args.code)
+        if args.source:
+            entries = [entry for entry in entries if entry['source'] == args.source]
+        if not entries:
+            print(json.dumps({"error": "Not in store"}))
+            sys.exit(1)
+        print(json.dumps(entries, ensure_ascii=False, indent=2))
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
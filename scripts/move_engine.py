@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+移动引擎 - 同一设备直接 rename，跨设备分块复制、可续传、校验后再删除源文件
+
+shutil.move falls back to a blocking copy2 + rmtree when source and target
+are on different filesystems (intake SSD -> NAS): no progress, no way to
+limit throughput, and an interrupted move starts over. MoveEngine renames
+when st_dev matches. Otherwise it copies in chunks with copy_file_range /
+sendfile (plain read/write where those are missing) into <target>.partial,
+reports progress, can cap the rate, continues an existing .partial after an
+interruption, checks size (and optionally SHA-256) and only then renames
+the copy into place and removes the source.
+
+Usage:
+    from move_engine import get_move_engine
+    get_move_engine().move(source, target)
+
+    python move_engine.py <source> <target> [--max-rate MB/s] [--verify-hash]
+"""
+
+import os
+import sys
+import time
+import errno
+import shutil
+import hashlib
+import threading
+
+PARTIAL_SUFFIX = '.partial'
+CHUNK_SIZE = 8 * 1024 * 1024
+PROGRESS_INTERVAL = 1.0     # seconds between progress lines
+# Slack when comparing a copy's mtime with its source: FAT/exFAT keep 2 s,
+# many SMB/NFS mounts 1 s or 100 ns of the time copystat set
+MTIME_SLACK = 2.0
+
+
+class VerificationError(OSError):
+    """The copy does not match the source; the source is kept"""
+
+
+def same_device(source, target):
+    """True if target's folder is on the same filesystem as source"""
+    try:
+        return os.stat(source).st_dev == os.stat(os.path.dirname(os.path.abspath(target))).st_dev
+    except OSError:
+        return False
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def same_copy(source, copy):
+    """True if copy has the size and mtime of source (the link target for symlinks)"""
+    try:
+        if os.path.islink(source):
+            return os.path.islink(copy) and os.readlink(source) == os.readlink(copy)
+        src_st, dst_st = os.lstat(source), os.lstat(copy)
+    except OSError:
+        return False
+    return src_st.st_size == dst_st.st_size and abs(src_st.st_mtime - dst_st.st_mtime) <= MTIME_SLACK
+
+
+def _tree_entries(source):
+    """Relative paths of the files and symlinks in a folder"""
+    for root, dirs, files in os.walk(source):
+        relative = os.path.relpath(root, source)
+        for name in files + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            yield os.path.normpath(os.path.join(relative, name))
+
+
+def tree_copied(source, copy):
+    """True if every file and symlink of source has a same_copy under copy"""
+    return all(same_copy(os.path.join(source, entry), os.path.join(copy, entry))
+               for entry in _tree_entries(source))
+
+
+def _copy_range(src_fd, dst_fd, offset, count):
+    """Copy up to count bytes at offset in the kernel where possible; returns bytes copied"""
+    if hasattr(os, 'copy_file_range'):
+        try:
+            return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        try:
+            os.lseek(dst_fd, offset, os.SEEK_SET)
+            return os.sendfile(dst_fd, src_fd, offset, count)
+        except OSError as e:
+            if e.errno not in (errno.ENOSYS, errno.EINVAL):
+                raise
+    data = os.pread(src_fd, count, offset) if hasattr(os, 'pread') else None
+    if data is None:
+        os.lseek(src_fd, offset, os.SEEK_SET)
+        data = os.read(src_fd, count)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    return os.write(dst_fd, data)
+
+
+class Progress:
+    """Prints a line every PROGRESS_INTERVAL seconds while a file is copied"""
+
+    def __init__(self, name, total, interval=PROGRESS_INTERVAL):
+        self.name = name
+        self.total = total
+        self.interval = interval
+        self.started = time.monotonic()
+        self._last = self.started
+
+    def __call__(self, copied, resumed=0):
+        # Copies that finish within one interval print nothing
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        elapsed = max(now - self.started, 1e-6)
+        percent = copied / self.total if self.total else 1.0
+        print(f"    {self.name}: {percent:.0%} of {self.total / 1024 ** 2:.0f} MB, "
+              f"{(copied - resumed) / elapsed / 1024 ** 2:.1f} MB/s", flush=True)
+
+
+class MoveEngine:
+    """
+    Moves files and folders, renaming when possible
+
+    Args:
+        max_rate: Copy throughput cap in bytes/sec (None: unlimited)
+        verify_hash: Compare SHA-256 of source and copy (size is always compared)
+        progress: Print progress of cross-device copies
+    """
+
+    def __init__(self, max_rate=None, verify_hash=False, progress=True):
+        self.max_rate = max_rate
+        self.verify_hash = verify_hash
+        self.progress = progress
+        self._lock = threading.Lock()
+        self.renamed = 0
+        self.copied = 0
+        self.resumed = 0
+        self.copied_bytes = 0
+        self.copy_seconds = 0.0
+
+    def configure(self, max_rate=None, verify_hash=False, progress=True):
+        self.max_rate = max_rate
+        self.verify_hash = verify_hash
+        self.progress = progress
+
+    def move(self, source, target):
+        """
+        Move a file or folder to target (the full new path, not its folder)
+
+        Returns:
+            'renamed' or 'copied'
+
+        Raises:
+            OSError (VerificationError if the copy did not match; the source
+            is left in place in both cases)
+        """
+        source, target = str(source), str(target)
+        if same_device(source, target):
+            try:
+                os.rename(source, target)
+                with self._lock:
+                    self.renamed += 1
+                return 'renamed'
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+        if os.path.isdir(source) and not os.path.islink(source):
+            self._copy_tree(source, target)
+        else:
+            self._copy_file(source, target)
+        with self._lock:
+            self.copied += 1
+        return 'copied'
+
+    def finish(self, source, target):
+        """
+        Complete a move that was interrupted (the process was killed)
+
+        The source is only removed when target holds a copy of all of it.
+        An existing target is never removed.
+
+        Returns:
+            True if the item is now at target, False if move() has to run
+            again (it continues a .partial copy left behind, or takes a new
+            name if target is something else)
+        """
+        source, target = str(source), str(target)
+        if not os.path.lexists(target):
+            return False
+        if not os.path.lexists(source):
+            return True
+        source_is_dir = os.path.isdir(source) and not os.path.islink(source)
+        target_is_dir = os.path.isdir(target) and not os.path.islink(target)
+        if source_is_dir != target_is_dir:
+            return False
+        # The copy was renamed into place but the source was not removed yet
+        if source_is_dir:
+            if not tree_copied(source, target):
+                return False
+            shutil.rmtree(source)
+            return True
+        if same_copy(source, target):
+            os.unlink(source)
+            return True
+        # The source changed after it was copied, or target was put there
+        # by someone else: leave both
+        return False
+
+    def _copy_file(self, source, target, remove_source=True):
+        """Chunked copy into target.partial, verify, rename into place, remove source"""
+        if os.path.islink(source):
+            os.symlink(os.readlink(source), target)
+            if remove_source:
+                os.unlink(source)
+            return
+
+        partial = target + PARTIAL_SUFFIX
+        src_st = os.stat(source)
+        total = src_st.st_size
+
+        # Continue an interrupted copy if the partial file was written after
+        # the source last changed and is not longer than it
+        offset = 0
+        try:
+            part_st = os.stat(partial)
+            if part_st.st_size <= total and part_st.st_mtime >= src_st.st_mtime:
+                offset = part_st.st_size
+        except OSError:
+            pass
+        resumed = offset
+        if resumed:
+            with self._lock:
+                self.resumed += 1
+
+        report = Progress(os.path.basename(source), total) if self.progress else None
+        started = time.monotonic()
+        with open(source, 'rb') as src, open(partial, 'r+b' if offset else 'wb') as dst:
+            src_fd, dst_fd = src.fileno(), dst.fileno()
+            os.ftruncate(dst_fd, offset)
+            while offset < total:
+                count = _copy_range(src_fd, dst_fd, offset, min(CHUNK_SIZE, total - offset))
+                if count <= 0:
+                    break
+                offset += count
+                if self.max_rate:
+                    # Sleep until the average rate is back under the cap
+                    ahead = (offset - resumed) / self.max_rate - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+                if report is not None:
+                    report(offset, resumed)
+            dst.flush()
+            os.fsync(dst_fd)
+        elapsed = time.monotonic() - started
+
+        copied_size = os.path.getsize(partial)
+        if copied_size != total:
+            raise VerificationError(f"size mismatch for {source}: {copied_size} != {total}")
+        if self.verify_hash and file_digest(source) != file_digest(partial):
+            os.unlink(partial)
+            raise VerificationError(f"SHA-256 mismatch for {source}")
+
+        shutil.copystat(source, partial)
+        os.replace(partial, target)
+        if remove_source:
+            os.unlink(source)
+        with self._lock:
+            self.copied_bytes += total - resumed
+            self.copy_seconds += elapsed
+
+    def _copy_tree(self, source, target):
+        """
+        Copy a folder into target.partial, verify it, rename it into place
+        and only then remove the source
+
+        Files an interrupted run already copied into target.partial are
+        kept; the source stays complete until the whole copy is in place.
+        """
+        partial = target + PARTIAL_SUFFIX
+        for root, _, _ in os.walk(source):
+            os.makedirs(os.path.normpath(os.path.join(partial, os.path.relpath(root, source))),
+                        exist_ok=True)
+        for entry in _tree_entries(source):
+            path, copy = os.path.join(source, entry), os.path.join(partial, entry)
+            if not same_copy(path, copy):
+                if os.path.islink(copy):
+                    os.unlink(copy)
+                self._copy_file(path, copy, remove_source=False)
+        if not tree_copied(source, partial):
+            raise VerificationError(f"{source} changed while it was copied")
+        os.replace(partial, target)
+        shutil.rmtree(source)
+
+    def format_stats(self):
+        rate = self.copied_bytes / self.copy_seconds / 1024 ** 2 if self.copy_seconds else 0
+        text = (f"{self.renamed} renamed, {self.copied} copied across devices "
+                f"({self.copied_bytes / 1024 ** 3:.2f} GB, {rate:.1f} MB/s)")
+        if self.resumed:
+            text += f", {self.resumed} resumed"
+        return text
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_move_engine():
+    """Process-wide engine (configure() it from the command line)"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = MoveEngine()
+        return _engine
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Move a file or folder (rename or verified copy)')
+    parser.add_argument('source')
+    parser.add_argument('target')
+    parser.add_argument('--max-rate', type=float, default=None, help='Copy rate cap in MB/s')
+    parser.add_argument('--verify-hash', action='store_true', help='Compare SHA-256 before deleting')
+    args = parser.parse_args()
+
+    engine = get_move_engine()
+    engine.configure(args.max_rate * 1024 ** 2 if args.max_rate else None, args.verify_hash)
+    try:
+        how = engine.move(args.source, args.target)
+    except OSError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"{how}: {args.target}")
+    print(engine.format_stats())
+
+
+if __name__ == "__main__":
+    main()
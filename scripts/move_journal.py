@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预写日志 - 被中断的整理从日志继续, 不重新扫描、不重新抓取
+
+Before the first move of a run, the move plan (targets, poster jobs,
+metadata.json contents, enrichment entries) is written to a new
+<library>/.av-organizer/journal-<run id>.jsonl and synced; items planned while
+earlier ones are already moving are appended as they come. Every move then
+appends a "started" record with its target before touching the filesystem
+and a "done" or "failed" record afterwards. The file is deleted when the
+run, posters included, has finished.
+
+A journal whose process (the pid and start time in its plan record) is no
+longer running belongs to an interrupted run. Files are named by a random
+run id rather than the pid: in a container the organizer is PID 1 on every
+start. The next run replays it before scanning: finished items
+are skipped, moves that were started are completed by the move engine or
+moved again (under a new name when the target is not a complete copy of
+the source; nothing at the target is deleted), and the rest of the plan
+is applied with the metadata recorded in it.
+
+Usage:
+    python move_journal.py <library>      # show interrupted runs
+"""
+
+import os
+import sys
+import json
+import uuid
+import threading
+from pathlib import Path
+
+from av_state import STATE_DIR_NAME, library_state_dir
+from move_plan import MovePlan
+
+
+_own_runs = set()     # names of the journals this process created
+
+
+def process_running(pid):
+    """True if pid is a live process"""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        return _windows_process_running(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def process_start_time(pid):
+    """
+    When pid was started, in a unit of the platform (None if unknown)
+
+    Only compared with itself: a pid that was reused by another process
+    reports a different value.
+    """
+    if os.name == 'nt':
+        return _windows_process_start_time(pid)
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Fields after the parenthesised command name; starttime is field 22
+    try:
+        return int(stat.rsplit(b')', 1)[1].split()[19])
+    except (IndexError, ValueError):
+        return None
+
+
+def _windows_process_running(pid):
+    """OpenProcess/GetExitCodeProcess (os.kill(pid, 0) terminates the process on Windows)"""
+    import ctypes
+    from ctypes import wintypes
+
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    STILL_ACTIVE = 259
+    ERROR_ACCESS_DENIED = 5
+
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    kernel32.GetExitCodeProcess.argtypes = (wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD))
+    kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        # Another user's process exists but may not be queried
+        return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+    try:
+        code = wintypes.DWORD()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+            return True
+        return code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _windows_process_start_time(pid):
+    """Creation time of a process from GetProcessTimes (None if it cannot be queried)"""
+    import ctypes
+    from ctypes import wintypes
+
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    kernel32.GetProcessTimes.argtypes = (wintypes.HANDLE,) + (ctypes.POINTER(wintypes.FILETIME),) * 4
+    kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return None
+    try:
+        times = [wintypes.FILETIME() for _ in range(4)]
+        if not kernel32.GetProcessTimes(handle, *(ctypes.byref(t) for t in times)):
+            return None
+        return times[0].dwHighDateTime << 32 | times[0].dwLowDateTime
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def run_alive(path):
+    """True if the process that wrote a journal is still running it"""
+    if Path(path).name in _own_runs:
+        return True
+    try:
+        with open(path, encoding='utf-8') as f:
+            header = json.loads(f.readline())
+    except FileNotFoundError:
+        # Finished and deleted meanwhile
+        return True
+    except (OSError, ValueError):
+        # Killed before the plan record was complete
+        return False
+    pid = header.get('pid')
+    if not isinstance(pid, int) or pid == os.getpid():
+        # Our pid but not our run: an earlier process had the same pid
+        return False
+    if not process_running(pid):
+        return False
+    # A live process with the recorded pid is ours only if it started then
+    started = header.get('pid_started')
+    return started is None or process_start_time(pid) in (started, None)
+
+
+class MoveJournal:
+    """
+    Append-only record of one run's plan and of each move's progress
+
+    Args:
+        path: Journal file
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.state = {}     # item number -> 'started' / 'done' / 'failed'
+        self._file = None
+        self._mode = 'a'
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, directory):
+        """New journal for a run of this process in the library's state folder"""
+        journal = cls(library_state_dir(directory) / f'journal-{uuid.uuid4().hex}.jsonl')
+        # Never appended to an existing file: that is another run's record
+        journal._mode = 'x'
+        _own_runs.add(journal.path.name)
+        return journal
+
+    def _sync(self):
+        with self._lock:
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+
+    def _append(self, record, sync=False):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, self._mode, encoding='utf-8')
+                self._mode = 'a'
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            # A killed process loses nothing that was flushed; fsync only
+            # where a lost record would cost a rescrape
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def begin(self, plan):
+        """Record the plan (as far as it is made) before the first move"""
+        self._append({'op': 'plan', 'pid': os.getpid(), 'pid_started': process_start_time(os.getpid()),
+                      'tool': plan.tool, 'directory': plan.directory, 'created': plan.created})
+        for n, item in enumerate(plan.items):
+            self._append(dict(item, op='item', n=n))
+        self._sync()
+
+    def add(self, n, item):
+        """Record item number n, planned after begin(), before it is moved"""
+        self._append(dict(item, op='item', n=n), sync=True)
+
+    def started(self, n, target):
+        self.state[n] = 'started'
+        self._append({'op': 'started', 'n': n, 'target': str(target)})
+
+    def done(self, n):
+        self.state[n] = 'done'
+        self._append({'op': 'done', 'n': n})
+
+    def failed(self, n):
+        self.state[n] = 'failed'
+        self._append({'op': 'failed', 'n': n})
+
+    def load(self):
+        """
+        Read a journal back
+
+        Returns:
+            The MovePlan it recorded (targets as last started), or None if
+            the process died before the first item was recorded
+        """
+        header = None
+        items = {}
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn last line of a killed process
+                    break
+                op = record.pop('op')
+                if op == 'plan':
+                    header = record
+                elif op == 'item':
+                    items[record.pop('n')] = record
+                elif op == 'started':
+                    items[record['n']]['target'] = record['target']
+                    self.state[record['n']] = 'started'
+                elif op in ('done', 'failed'):
+                    self.state[record['n']] = op
+        if header is None or not items:
+            return None
+
+        plan = MovePlan(header['directory'], header['tool'])
+        plan.created = header['created']
+        plan.items.extend(items[n] for n in sorted(items))
+        return plan
+
+    def counts(self):
+        states = list(self.state.values())
+        return {state: states.count(state) for state in ('started', 'done', 'failed')}
+
+    def complete(self):
+        """The run finished: the journal is no longer needed"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        _own_runs.discard(self.path.name)
+
+
+def interrupted_journals(directory):
+    """Journals in a library whose process is no longer running, oldest first"""
+    state_dir = Path(directory) / STATE_DIR_NAME
+    found = []
+    for path in state_dir.glob('journal-*.jsonl'):
+        try:
+            # A concurrent run (--watch) may finish and delete its journal meanwhile
+            found.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            continue
+    return [MoveJournal(path) for _, path in sorted(found) if not run_alive(path)]
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python move_journal.py <library>")
+        sys.exit(1)
+
+    journals = interrupted_journals(sys.argv[1])
+    if not journals:
+        print("No interrupted runs")
+    for journal in journals:
+        plan = journal.load()
+        if plan is None:
+            print(f"{journal.path.name}: interrupted before anything was planned")
+            continue
+        counts = journal.counts()
+        print(f"{journal.path.name}: {plan.tool}, {len(plan)} planned moves, {counts['done']} done, "
+              f"{counts['started']} interrupted, {counts['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
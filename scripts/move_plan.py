@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+移动计划 - 先生成完整的 JSON 计划，再离线执行
+
+The plan phase does all lookups and decides every target path; the apply
+phase only touches the filesystem. A plan lists, per item, the source, the
+target, whether it is a folder, and optionally a poster to download, a
+metadata file to write and an enrichment queue entry. Applying creates all
+target folders in one pass first, then moves the items in plan order.
+Items whose source is gone and whose target exists count as already done,
+so an interrupted apply can simply be run again.
+
+Usage:
+    python hybrid_organizer.py <dir> --plan plan.json     # lookups only, writes the plan
+    python hybrid_organizer.py <dir> --apply plan.json    # filesystem work only
+    python move_plan.py plan.json                         # summary of a saved plan
+"""
+
+import os
+import sys
+import json
+import time
+
+from move_engine import get_move_engine
+from name_registry import NameRegistry
+
+PLAN_VERSION = 1
+
+
+class MovePlan:
+    """
+    Ordered list of planned moves for one library
+
+    Args:
+        directory: Library root the plan was made for
+        tool: Name of the organizer that made it
+    """
+
+    def __init__(self, directory, tool):
+        self.directory = os.path.abspath(directory)
+        self.tool = tool
+        self.created = time.time()
+        self.items = []
+        # Target names claimed while planning (not saved with the plan)
+        self.names = NameRegistry()
+        self._made = set()
+
+    def add(self, source, target, is_folder, code=None, status='ok', poster=None,
+            metadata_file=None, enqueue=None):
+        """
+        Add one move
+
+        Args:
+            source: Current path
+            target: New path (full path, not its folder)
+            is_folder: Whether the item is a folder
+            code: AV code (None if none was found)
+            status: 'ok', or why the item goes to others (e.g. code_not_found)
+            poster: Organizer-specific poster job (dict), downloaded after the moves
+            metadata_file: {'path': ..., 'data': {...}} written after the move
+            enqueue: {'reason': ...} to add the item to the enrichment queue
+        """
+        item = {'source': str(source), 'target': str(target), 'is_folder': is_folder,
+                'code': code, 'status': status}
+        if poster:
+            item['poster'] = poster
+        if metadata_file:
+            item['metadata_file'] = {'path': str(metadata_file['path']), 'data': metadata_file['data']}
+        if enqueue:
+            item['enqueue'] = enqueue
+        self.items.append(item)
+        return item
+
+    def __len__(self):
+        return len(self.items)
+
+    def save(self, path):
+        data = {'version': PLAN_VERSION, 'tool': self.tool, 'directory': self.directory,
+                'created': self.created, 'items': self.items}
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != PLAN_VERSION:
+            raise ValueError(f"unsupported plan version: {data.get('version')}")
+        plan = cls(data['directory'], data.get('tool'))
+        plan.created = data.get('created', plan.created)
+        plan.items.extend(data['items'])
+        return plan
+
+    def folders(self):
+        """Deepest folders that must exist before the moves (one makedirs each)"""
+        needed = set()
+        for item in self.items:
+            needed.add(os.path.dirname(item['target']))
+            if item.get('metadata_file'):
+                needed.add(os.path.dirname(item['metadata_file']['path']))
+        needed.discard('')
+        # A folder created by makedirs of one of its descendants needs no call
+        ancestors = set()
+        for folder in needed:
+            parent = os.path.dirname(folder)
+            while parent not in ancestors and parent != os.path.dirname(parent):
+                ancestors.add(parent)
+                parent = os.path.dirname(parent)
+        return sorted(folder for folder in needed if folder not in ancestors)
+
+    def apply(self, on_moved=None, on_error=None, journal=None, on_skipped=None):
+        """
+        Execute the moves
+
+        Args:
+            on_moved: item -> None, called after each successful move
+            on_error: (item, exception) -> None, called when a move fails
+            journal: MoveJournal to record each move in; items it has as
+                done are skipped and started ones are completed first
+            on_skipped: item -> None, called for items that were already applied
+
+        Returns:
+            Dict of counts: moved, skipped (already applied), missing, failed
+        """
+        counts = {'moved': 0, 'skipped': 0, 'missing': 0, 'failed': 0}
+        for folder in self.folders():
+            os.makedirs(folder, exist_ok=True)
+            self._made.add(folder)
+
+        for n, item in enumerate(self.items):
+            try:
+                outcome = self.move_item(n, item, journal)
+            except OSError as e:
+                counts['failed'] += 1
+                if on_error is not None:
+                    on_error(item, e)
+                else:
+                    print(f"  X {item['source']}: {e}")
+                continue
+            counts[outcome] += 1
+            if outcome == 'moved':
+                self.complete_item(n, item, journal)
+                if on_moved is not None:
+                    on_moved(item)
+            elif outcome == 'skipped' and on_skipped is not None and os.path.lexists(item['target']):
+                on_skipped(item)
+        return counts
+
+    def move_item(self, n, item, journal=None):
+        """
+        Move item number n into place (complete_item finishes it)
+
+        Returns:
+            'moved', 'skipped' (applied or given up on before) or 'missing'
+
+        Raises:
+            OSError if the move failed (recorded in the journal)
+        """
+        source, target = item['source'], item['target']
+        state = journal.state.get(n) if journal is not None else None
+        if state in ('done', 'failed'):
+            return 'skipped'
+        engine = get_move_engine()
+        # A move the previous run started may only need its last step
+        if state == 'started' and engine.finish(source, target):
+            return 'moved'
+        if not os.path.lexists(source):
+            if os.path.lexists(target):
+                return 'skipped'
+            print(f"  ! Source is gone: {source}")
+            return 'missing'
+        if os.path.lexists(target) and os.path.abspath(target) != os.path.abspath(source):
+            # Created since the plan was made (a saved plan, another
+            # process): list the folder again and take the next free name
+            folder, name = os.path.split(target)
+            stem, ext = (name, '') if item['is_folder'] else os.path.splitext(name)
+            self.names.forget(folder)
+            target = item['target'] = self.names.claim(folder, stem, ext)
+        folder = os.path.dirname(target)
+        if folder not in self._made:
+            os.makedirs(folder, exist_ok=True)
+            self._made.add(folder)
+        if journal is not None:
+            journal.started(n, target)
+        try:
+            engine.move(source, target)
+        except OSError:
+            if journal is not None:
+                journal.failed(n)
+            raise
+        return 'moved'
+
+    def complete_item(self, n, item, journal=None):
+        """Write the item's metadata file and record it as done"""
+        metadata_file = item.get('metadata_file')
+        if metadata_file:
+            with open(metadata_file['path'], 'w', encoding='utf-8') as f:
+                json.dump(metadata_file['data'], f, ensure_ascii=False, indent=2)
+        if journal is not None:
+            journal.done(n)
+
+    def posters(self):
+        """Poster jobs of all items"""
+        return [item['poster'] for item in self.items if item.get('poster')]
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python move_plan.py <plan.json>")
+        sys.exit(1)
+
+    plan = MovePlan.load(sys.argv[1])
+    statuses = {}
+    for item in plan.items:
+        statuses[item['status']] = statuses.get(item['status'], 0) + 1
+    pending = sum(1 for item in plan.items if os.path.lexists(item['source']))
+    print(f"{plan.tool} plan for {plan.directory}, made {time.ctime(plan.created)}")
+    print(f"{len(plan)} moves ({pending} not applied yet), {len(plan.posters())} posters, "
+          f"{len(plan.folders())} folders")
+    for status, count in sorted(statuses.items()):
+        print(f"  {status}: {count}")
+
+
+if __name__ == "__main__":
+    main()
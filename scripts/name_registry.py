@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目标文件名登记 - 在内存中解决重名，不再逐个 exists() 试探
+
+Finding a free "[CODE]-[Title]_N" name used to stat _1, _2, ... until one
+did not exist, once per item: a round trip per probe on a network share and
+O(n^2) probes for a title with many copies. NameRegistry lists each target
+folder once with os.scandir, remembers every name handed out since, and
+keeps the next free counter per name, so a claim costs no filesystem call
+after the first one per folder. Claims are serialized by a lock, so threads
+moving into the same actress folder never get the same name.
+
+Names are compared case-insensitively (Windows and SMB/NAS shares are), so
+on a case-sensitive filesystem an item may get a suffix it did not strictly
+need, never a name that overwrites another file.
+"""
+
+import os
+import threading
+
+
+class NameRegistry:
+    """Names in use per target folder: existing entries plus claimed ones"""
+
+    def __init__(self):
+        self._names = {}    # folder -> set of casefolded names
+        self._next = {}     # (folder, stem, ext) -> next counter to try
+        self._lock = threading.Lock()
+        self.listed = 0
+
+    def _names_in(self, folder):
+        names = self._names.get(folder)
+        if names is None:
+            names = set()
+            try:
+                with os.scandir(folder) as it:
+                    names.update(entry.name.casefold() for entry in it)
+            except OSError:
+                # Not created yet: nothing can collide except our own claims
+                pass
+            self._names[folder] = names
+            self.listed += 1
+        return names
+
+    def claim(self, folder, stem, ext=''):
+        """
+        Reserve stem+ext in folder, or stem_N+ext with the lowest free N
+
+        Returns:
+            The full path that was reserved
+        """
+        folder = str(folder)
+        with self._lock:
+            names = self._names_in(folder)
+            name = f"{stem}{ext}"
+            if name.casefold() in names:
+                key = (folder, stem, ext)
+                counter = self._next.get(key, 1)
+                while f"{stem}_{counter}{ext}".casefold() in names:
+                    counter += 1
+                name = f"{stem}_{counter}{ext}"
+                self._next[key] = counter + 1
+            names.add(name.casefold())
+        return os.path.join(folder, name)
+
+    def release(self, path):
+        """Give a claimed name back (the move did not happen)"""
+        folder, name = os.path.split(str(path))
+        with self._lock:
+            names = self._names.get(folder)
+            if names is not None:
+                names.discard(name.casefold())
+            for key in [key for key in self._next if key[0] == folder]:
+                del self._next[key]
+
+    def forget(self, folder):
+        """Drop what is known about a folder; the next claim lists it again"""
+        folder = str(folder)
+        with self._lock:
+            self._names.pop(folder, None)
+            for key in [key for key in self._next if key[0] == folder]:
+                del self._next[key]
@@ -2,61 +2,20 @@
 """
 Studio Name Normalizer - Normalize studio names to folder names
 
+Names are looked up in the shared studio table (studios.json, see
+studio_table.py).
+
 Usage:
     python normalize_studio.py <studio_name>
 
 Returns normalized folder name
 """
 
+import os
 import sys
-import re
 
-
-# Studio name mappings (original -> normalized folder name)
-STUDIO_MAPPINGS = {
-    # S1 variations
-    's1': 's1',
-    's1 no.1 style': 's1',
-    's1 no. 1 style': 's1',
-    
-    # IdeaPocket variations
-    'ideapocket': 'ideapocket',
-    'idea pocket': 'ideapocket',
-    
-    # MOODYZ variations
-    'moodyz': 'moodyz',
-    'moody\'s': 'moodyz',
-    
-    # Prestige variations
-    'prestige': 'prestige',
-    
-    # E-Body variations
-    'e-body': 'e-body',
-    'ebody': 'e-body',
-    
-    # FALENO variations
-    'faleno': 'faleno',
-    'faleno star': 'faleno',
-    
-    # Attackers variations
-    'attackers': 'attackers',
-    
-    # KM Produce variations
-    'km produce': 'km-produce',
-    'kmproduce': 'km-produce',
-    
-    # Madonna variations
-    'madonna': 'madonna',
-    
-    # Premium variations
-    'premium': 'premium',
-    
-    # kawaii variations
-    'kawaii': 'kawaii',
-    'kawaii*': 'kawaii',
-    
-    # Add more as needed
-}
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from studio_table import get_studio_table
 
 
 def normalize_studio(studio_name):
@@ -67,24 +26,10 @@ def normalize_studio(studio_name):
         studio_name: Original studio name from javbus
     
     Returns:
-        Normalized folder name (lowercase, hyphenated)
+        Normalized folder name from studios.json (lowercase, hyphenated
+        slug of the name when the studio is not listed)
     """
-    if not studio_name:
-        return 'others'
-    
-    # Lowercase and clean
-    cleaned = studio_name.lower().strip()
-    
-    # Check mappings
-    if cleaned in STUDIO_MAPPINGS:
-        return STUDIO_MAPPINGS[cleaned]
-    
-    # Default: lowercase, replace spaces with hyphens
-    normalized = re.sub(r'[^\w\s-]', '', cleaned)  # Remove special chars
-    normalized = re.sub(r'[\s]+', '-', normalized)  # Spaces to hyphens
-    normalized = re.sub(r'-+', '-', normalized)     # Multiple hyphens to one
-    
-    return normalized or 'others'
+    return get_studio_table().normalize(studio_name)
 
 
 def main():
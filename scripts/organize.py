@@ -3,26 +3,38 @@
 AV Organizer - Complete workflow to organize AV directory
 
 Usage:
-    python organize.py <directory> [--dry-run] [--first-only]
+    python organize.py <directory> [--dry-run] [--first-only] [--isolate] [--no-store] [--refresh]
+                       [--max-rate MB/s] [--verify-hash]
 
 Options:
     --dry-run: Show what would be done without making changes
     --first-only: Process only the first item (for testing)
+    --isolate: Run extract/scrape/normalize scripts as subprocesses (old behaviour)
+    --no-store: Do not read or write the metadata store (by default stored
+                results are reused and known failures are not retried early)
+    --refresh: Ignore stored results and look every code up again
+    --max-rate: Cap cross-device moves (copies) at this many MB/s
+    --verify-hash: Compare SHA-256 of a cross-device copy before deleting
+                   the source (by default only the size is compared)
 """
 
 import os
 import sys
-import json
-import shutil
-import subprocess
 from pathlib import Path
 import re
 
 # Video file extensions
 VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.wmv', '.flv', '.mov', '.m4v', '.rmvb'}
+SCRAPER = 'basic'     # Only this scraper's rows are reused from the metadata store
 
 # Get script directory
 SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import av_api
+from move_engine import get_move_engine
+from name_registry import NameRegistry
+from metadata_store import get_metadata_store
 
 
 def scan_directory(directory):
@@ -52,56 +64,23 @@ def scan_directory(directory):
     return results
 
 
-def extract_code(filename):
-    """Extract AV code from filename using script"""
-    try:
-        result = subprocess.run(
-            ['python', str(SCRIPT_DIR / 'extract_code.py'), filename],
-            capture_output=True,
-            text=True,
-            encoding='utf-8'
-        )
-        
-        if result.returncode == 0:
-            return result.stdout.strip()
-        return None
-    except Exception as e:
-        print(f"  Error extracting code: {e}")
-        return None
+def extract_code(filename, isolate=False):
+    """Extract AV code from filename"""
+    return av_api.extract_code(filename, isolate)
 
 
-def fetch_metadata(code):
-    """Fetch metadata from javbus using script"""
-    try:
-        result = subprocess.run(
-            ['python', str(SCRIPT_DIR / 'javbus_scraper.py'), code],
-            capture_output=True,
-            text=True,
-            encoding='utf-8'
-        )
-        
-        if result.returncode == 0:
-            return json.loads(result.stdout)
-        return None
-    except Exception as e:
-        print(f"  Error fetching metadata: {e}")
-        return None
+def fetch_metadata(code, isolate=False, store=None, refresh=False):
+    """Fetch metadata from javbus (stored results and known failures first)"""
+    if store is not None:
+        # Stored results and known failures are answered without a request
+        return store.fetch(code, lambda c: av_api.scrape(c, SCRAPER, isolate=isolate, raise_errors=True),
+                           SCRAPER, refresh=refresh)
+    return av_api.scrape(code, SCRAPER, isolate=isolate)
 
 
-def normalize_studio(studio_name):
-    """Normalize studio name using script"""
-    try:
-        result = subprocess.run(
-            ['python', str(SCRIPT_DIR / 'normalize_studio.py'), studio_name],
-            capture_output=True,
-            text=True,
-            encoding='utf-8'
-        )
-        
-        return result.stdout.strip()
-    except Exception as e:
-        print(f"  Error normalizing studio: {e}")
-        return 'others'
+def normalize_studio(studio_name, isolate=False):
+    """Normalize studio name to folder name"""
+    return av_api.normalize_studio(studio_name, isolate)
 
 
 def sanitize_filename(filename):
@@ -115,15 +94,18 @@ def sanitize_filename(filename):
     return sanitized[:200]
 
 
-def organize_item(item_path, is_folder, metadata, base_directory, dry_run=False):
+def organize_item(item_path, is_folder, metadata, base_directory, dry_run=False, isolate=False,
+                  names=None):
     """
     Rename and move item to studio folder
     
+    names is the NameRegistry duplicates are resolved against.
+    
     Returns:
         (success, new_path_or_error)
     """
     # Get studio folder name
-    studio_folder = normalize_studio(metadata['studio'])
+    studio_folder = normalize_studio(metadata['studio'], isolate)
     
     # Create studio directory path
     studio_path = Path(base_directory) / studio_folder
@@ -132,26 +114,11 @@ def organize_item(item_path, is_folder, metadata, base_directory, dry_run=False)
     safe_title = sanitize_filename(metadata['title'])
     new_name = f"[{metadata['code']}]-[{safe_title}]"
     
-    if is_folder:
-        # Move entire folder
-        new_path = studio_path / new_name
-    else:
-        # Move single file, preserve extension
-        ext = Path(item_path).suffix
-        new_path = studio_path / f"{new_name}{ext}"
-    
-    # Handle duplicate names
-    if new_path.exists():
-        counter = 1
-        original_new_path = new_path
-        while new_path.exists():
-            if is_folder:
-                new_path = original_new_path.parent / f"{original_new_path.name}_{counter}"
-            else:
-                stem = original_new_path.stem
-                ext = original_new_path.suffix
-                new_path = original_new_path.parent / f"{stem}_{counter}{ext}"
-            counter += 1
+    # Handle duplicate names (preserve the extension of a single file)
+    if names is None:
+        names = NameRegistry()
+    ext = '' if is_folder else Path(item_path).suffix
+    new_path = Path(names.claim(studio_path, new_name, ext))
     
     if dry_run:
         print(f"  [DRY RUN] Would move to: {new_path}")
@@ -162,33 +129,26 @@ def organize_item(item_path, is_folder, metadata, base_directory, dry_run=False)
         studio_path.mkdir(exist_ok=True)
         
         # Move item
-        shutil.move(str(item_path), str(new_path))
+        get_move_engine().move(item_path, new_path)
         
         return (True, str(new_path))
     except Exception as e:
+        names.release(new_path)
         return (False, str(e))
 
 
-def handle_failed_item(item_path, is_folder, base_directory, reason, dry_run=False):
+def handle_failed_item(item_path, is_folder, base_directory, reason, dry_run=False, names=None):
     """Move failed items to /others folder"""
     others_path = Path(base_directory) / 'others'
     
     # Keep original name
     item_name = os.path.basename(item_path)
-    new_path = others_path / item_name
+    stem, ext = (item_name, '') if is_folder else os.path.splitext(item_name)
     
     # Handle duplicates
-    if new_path.exists():
-        counter = 1
-        original_new_path = new_path
-        while new_path.exists():
-            if is_folder:
-                new_path = original_new_path.parent / f"{original_new_path.name}_{counter}"
-            else:
-                stem = original_new_path.stem
-                ext = original_new_path.suffix
-                new_path = original_new_path.parent / f"{stem}_{counter}{ext}"
-            counter += 1
+    if names is None:
+        names = NameRegistry()
+    new_path = Path(names.claim(others_path, stem, ext))
     
     if dry_run:
         print(f"  [DRY RUN] Would move to /others: {item_name} (reason: {reason})")
@@ -196,13 +156,15 @@ def handle_failed_item(item_path, is_folder, base_directory, reason, dry_run=Fal
     
     try:
         others_path.mkdir(exist_ok=True)
-        shutil.move(str(item_path), str(new_path))
+        get_move_engine().move(item_path, new_path)
         print(f"  Moved to /others: {item_name} (reason: {reason})")
     except Exception as e:
+        names.release(new_path)
         print(f"  Error moving to /others: {e}")
 
 
-def organize_av_directory(directory, dry_run=False, first_only=False):
+def organize_av_directory(directory, dry_run=False, first_only=False, isolate=False, use_store=True,
+                          refresh=False):
     """
     Complete workflow to organize AV directory
     """
@@ -216,6 +178,8 @@ def organize_av_directory(directory, dry_run=False, first_only=False):
     
     success_count = 0
     failed_count = 0
+    store = get_metadata_store() if use_store else None
+    names = NameRegistry()
     
     for item_path, is_folder in items:
         item_name = os.path.basename(item_path)
@@ -227,24 +191,24 @@ def organize_av_directory(directory, dry_run=False, first_only=False):
         
         # Extract code
         print("Extracting code...")
-        code = extract_code(item_name)
+        code = extract_code(item_name, isolate)
         
         if not code:
             print("  ✗ Code not found")
             failed_count += 1
-            handle_failed_item(item_path, is_folder, directory, 'code_not_found', dry_run)
+            handle_failed_item(item_path, is_folder, directory, 'code_not_found', dry_run, names)
             continue
         
         print(f"  ✓ Code: {code}")
         
         # Fetch metadata
         print("Fetching metadata from javbus.com...")
-        metadata = fetch_metadata(code)
+        metadata = fetch_metadata(code, isolate, store, refresh)
         
         if not metadata:
             print("  ✗ Metadata not found on javbus.com")
             failed_count += 1
-            handle_failed_item(item_path, is_folder, directory, 'metadata_not_found', dry_run)
+            handle_failed_item(item_path, is_folder, directory, 'metadata_not_found', dry_run, names)
             continue
         
         print(f"  ✓ Studio: {metadata['studio']}")
@@ -254,7 +218,7 @@ def organize_av_directory(directory, dry_run=False, first_only=False):
         
         # Organize
         print("Organizing...")
-        success, result = organize_item(item_path, is_folder, metadata, directory, dry_run)
+        success, result = organize_item(item_path, is_folder, metadata, directory, dry_run, isolate, names)
         
         if success:
             print(f"  ✓ Moved to: {result}")
@@ -262,7 +226,7 @@ def organize_av_directory(directory, dry_run=False, first_only=False):
         else:
             print(f"  ✗ Error: {result}")
             failed_count += 1
-            handle_failed_item(item_path, is_folder, directory, 'move_error', dry_run)
+            handle_failed_item(item_path, is_folder, directory, 'move_error', dry_run, names)
     
     # Summary
     print(f"\n{'='*60}")
@@ -271,25 +235,42 @@ def organize_av_directory(directory, dry_run=False, first_only=False):
     print(f"Total items: {len(items)}")
     print(f"Success: {success_count}")
     print(f"Failed: {failed_count}")
+    print(f"Moves: {get_move_engine().format_stats()}")
+    if store is not None:
+        print(f"Metadata store: {store.format_stats()}")
     
     if dry_run:
         print("\n[DRY RUN] No actual changes were made")
 
 
+def get_option(name, default):
+    """Value following a command-line option, or default"""
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return default
+
+
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python organize.py <directory> [--dry-run] [--first-only]")
+        print("Usage: python organize.py <directory> [--dry-run] [--first-only] [--isolate] [--no-store] [--refresh] [--max-rate MB/s] [--verify-hash]")
         sys.exit(1)
     
     directory = sys.argv[1]
     dry_run = '--dry-run' in sys.argv
     first_only = '--first-only' in sys.argv
+    isolate = '--isolate' in sys.argv
+    use_store = '--no-store' not in sys.argv
+    refresh = '--refresh' in sys.argv
+    max_rate = float(get_option('--max-rate', 0)) * 1024 ** 2
+    get_move_engine().configure(max_rate or None, '--verify-hash' in sys.argv)
     
     if not os.path.isdir(directory):
         print(f"Error: Directory not found: {directory}")
         sys.exit(1)
     
-    organize_av_directory(directory, dry_run, first_only)
+    organize_av_directory(directory, dry_run, first_only, isolate, use_store, refresh)
 
 
 if __name__ == "__main__":
@@ -3,15 +3,23 @@
 """
 AV 完整整理脚本 v2.0
 新目录结构: 厂商/女优/[番号] 标题/
+
+两阶段执行:
+    python organize_v2.py <目录> --plan plan.json    # 只抓取元数据, 写出完整的移动计划
+    python organize_v2.py <目录> --apply plan.json   # 只执行文件操作, 中断后可重新执行
+
+普通运行是一条流水线: 抓取、移动、写元数据和下载海报各有线程, 相互重叠执行。
+计划逐条写入预写日志 (.av-organizer/journal-<run id>.jsonl) 后才移动,
+被中断时下次运行先从日志继续, 不重新扫描和抓取。
+已有的有效海报不再下载; 下载失败的海报记入重试队列, 在之后的运行中重试。
+同一番号的分段和版本 (ABC-123-CD1, ABC-123-C) 只抓取一次, 放进同一个影片文件夹, 文件名保留后缀。
+FC2-PPV、HEYZO、加勒比、一本道、259LUXU 等非标准番号按各自的格式识别; 没有数据源的番号 (FC2) 不联网。
 """
 
 import os
 import sys
-import re
 import json
-import shutil
-import urllib.request
-import urllib.error
+import threading
 from pathlib import Path
 
 # 设置控制台编码
@@ -23,85 +31,34 @@ if sys.platform == 'win32':
 # 导入爬虫
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from complete_javbus_scraper import scrape_javbus_complete
+from javbus_session import get_session, DEFAULT_PROXY, JAVBUS_BASE_URL
+from page_cache import get_page_cache
+from metadata_store import get_metadata_store
+from library_index import LibraryIndex
+from video_scan import ScanStats
+from move_engine import get_move_engine
+from move_plan import MovePlan
+from move_journal import MoveJournal, interrupted_journals
+from pipeline import Stage, Pipeline
+from extract_code import extract_av_code, split_code, group_by_code, code_family, has_source
+from studio_table import get_studio_table
+from poster_downloader import get_poster_downloader
+from async_fetch import (fetch_all, host_of_url, HostRateLimiter, answered_locally,
+                         DEFAULT_CONCURRENCY, DEFAULT_RATE)
 
 # 视频扩展名
 VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.wmv', '.flv', '.mov', '.m4v', '.rmvb', '.ts'}
-
-# 厂商映射
-STUDIO_MAPPING = {
-    'エスワン ナンバーワンスタイル': 's1',
-    'S1 NO.1 STYLE': 's1',
-    'アイデアポケット': 'ideapocket',
-    'IDEA POCKET': 'ideapocket',
-    'ムーディーズ': 'moodyz',
-    "MOODYZ": 'moodyz',
-    'プレステージ': 'prestige',
-    'PRESTIGE': 'prestige',
-    'FALENO': 'faleno',
-    'FALENO STAR': 'faleno-star',
-    'kawaii': 'kawaii',
-    'E-BODY': 'e-body',
-    'Madonna': 'madonna',
-    'ATTACKERS': 'attackers',
-    'アタッカーズ': 'attackers',
-    'Das': 'das',
-    'ダスッ！': 'das',
-    'プレミアム': 'premium',
-    'PREMIUM': 'premium',
-    'SODクリエイト': 'sod-create',
-    'SOD CREATE': 'sod-create',
-    '本中': 'hon-naka',
-    'ROYAL': 'royal',
-    'WANZ': 'wanz-factory',
-    'DAHLIA': 'dahlia',
-    'JETビデオ': 'jet-eizou',
-    '溜池ゴロー': 'tameike-goro',
-    'Glory Quest': 'glory-quest',
-}
+SCRAPER = 'complete'     # 元数据库中只复用这个抓取器的结果
 
 def extract_code_from_filename(filename):
     """从文件名提取番号"""
-    # 移除扩展名
-    name = os.path.splitext(filename)[0]
-    
-    # 移除已有的方括号
-    name = re.sub(r'[\[\]]', '', name)
-    
-    # 常见番号格式: 字母-数字
-    patterns = [
-        r'([A-Z]{2,10}[-\s]?\d{3,5})',  # SONE-586, IPX 123
-        r'([A-Z]{3,10}\d{3,5})',         # MIDV456
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, name, re.IGNORECASE)
-        if match:
-            code = match.group(1).upper()
-            # 规范化: 统一用横杠
-            code = re.sub(r'\s+', '-', code)
-            # 确保字母和数字之间有横杠
-            code = re.sub(r'([A-Z]+)(\d+)', r'\1-\2', code)
-            return code
-    
-    return None
+    return extract_av_code(filename)
 
 def normalize_studio(studio_name):
-    """规范化厂商名称"""
+    """规范化厂商名称 (studios.json 中的厂商, 未知厂商归入 others)"""
     if not studio_name:
         return 'unknown'
-    
-    # 直接映射
-    if studio_name in STUDIO_MAPPING:
-        return STUDIO_MAPPING[studio_name]
-    
-    # 部分匹配
-    studio_lower = studio_name.lower()
-    for key, value in STUDIO_MAPPING.items():
-        if key.lower() in studio_lower or studio_lower in key.lower():
-            return value
-    
-    # 未知厂商
-    return 'others'
+    return get_studio_table().lookup(studio_name) or 'others'
 
 def sanitize_filename(name):
     """清理文件名中的非法字符"""
@@ -116,47 +73,63 @@ def sanitize_filename(name):
     # 限制长度
     return name[:200]
 
-def download_poster(url, save_path, proxy='http://127.0.0.1:7890'):
-    """下载海报"""
-    try:
-        # 代理设置
-        proxy_handler = urllib.request.ProxyHandler({'http': proxy, 'https': proxy})
-        opener = urllib.request.build_opener(proxy_handler)
-        opener.addheaders = [
-            ('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'),
-            ('Referer', 'https://www.javbus.com/'),
-        ]
-        
-        # 下载
-        response = opener.open(url, timeout=30)
-        with open(save_path, 'wb') as f:
-            f.write(response.read())
-        
-        return True
-    except Exception as e:
-        print(f"  ✗ 海报下载失败: {e}")
-        return False
+def download_poster(url, save_path, proxy=DEFAULT_PROXY, limiter=None):
+    """下载海报; 已有有效海报时不发请求, 失败的记入重试队列"""
+    return get_poster_downloader().download(url, save_path, proxy, limiter=limiter)
+
+def fetch_metadata(code, proxy, cache=None, store=None, refresh=False):
+    """抓取元数据; 有元数据库时先查库, 已知失败的番号在重试时间前不联网; 没有数据源的番号 (FC2) 不联网"""
+    if not has_source(code):
+        return None
+    if store is None:
+        return scrape_javbus_complete(code, proxy, cache=cache)
+    return store.fetch(
+        code,
+        lambda c: scrape_javbus_complete(c, proxy, cache=cache, raise_errors=True),
+        SCRAPER,
+        refresh=refresh,
+    )
 
-def organize_single_file(file_path, base_dir, proxy='http://127.0.0.1:7890', dry_run=False):
+def organize_single_file(file_path, base_dir, proxy=DEFAULT_PROXY, dry_run=False,
+                         prefetched=None, poster_jobs=None, cache=None, store=None, index=None,
+                         plan=None, part=None, poster=True):
     """
     整理单个视频文件
     
     新结构: base_dir/厂商/女优/[番号] 标题/文件
+    同一番号的分段和版本 (-CD1, -C) 放进同一个影片文件夹, 文件名保留后缀
+    
+    prefetched: 已并发抓取的 {番号: 元数据} (命中时不再联网)
+    poster_jobs: 传入列表时海报下载任务 (url, 保存路径, 代理) 追加到列表, 由调用方并发下载
+    cache: 详情页磁盘缓存 (PageCache), None 表示不缓存
+    store: 元数据库 (MetadataStore), 先查库再联网
+    index: 库索引 (LibraryIndex), 移动后更新
+    plan: 移动计划 (MovePlan), 传入时只把移动、海报和元数据写入计划, 不动文件
+    part: 分段/版本后缀 (None 时从文件名提取)
+    poster: False 时不下载海报 (由同一番号的第一个分段下载)
     """
     filename = os.path.basename(file_path)
     print(f"\n处理: {filename}")
     
     # 1. 提取番号
-    code = extract_code_from_filename(filename)
+    code, found_part = split_code(filename)
+    if part is None:
+        part = found_part
     if not code:
         print(f"  ✗ 无法提取番号")
         return False, 'no_code'
     
     print(f"  ✓ 番号: {code}")
+    if not has_source(code):
+        print(f"  ✗ {code_family(code).name} 番号没有可用的数据源, 跳过")
+        return False, 'no_source'
     
     # 2. 爬取元数据
-    print(f"  爬取中...")
-    metadata = scrape_javbus_complete(code, proxy)
+    if prefetched is not None and code in prefetched:
+        metadata = prefetched[code]
+    else:
+        print(f"  爬取中...")
+        metadata = fetch_metadata(code, proxy, cache, store)
     
     if not metadata or not metadata.get('title'):
         print(f"  ✗ 爬取失败")
@@ -179,6 +152,18 @@ def organize_single_file(file_path, base_dir, proxy='http://127.0.0.1:7890', dry
     
     # 完整路径
     target_dir = Path(base_dir) / studio_folder / actress_folder / video_folder_name
+    ext = os.path.splitext(filename)[1]
+    new_video_name = f"[{code}] {title}-{part}{ext}" if part else f"[{code}] {title}{ext}"
+    target_video_path = target_dir / new_video_name
+    
+    if plan is not None:
+        poster_job = None
+        if poster and metadata.get('poster_url'):
+            poster_job = {'url': metadata['poster_url'], 'path': str(target_dir / 'cover.jpg'), 'proxy': proxy}
+        plan.add(file_path, target_video_path, False, code, poster=poster_job,
+                 metadata_file={'path': target_dir / 'metadata.json', 'data': metadata})
+        print(f"  ✓ 计划移动到: {target_video_path}")
+        return True, None
     
     # 4. 创建目录
     if not dry_run:
@@ -187,13 +172,9 @@ def organize_single_file(file_path, base_dir, proxy='http://127.0.0.1:7890', dry
     print(f"  目标: {target_dir}")
     
     # 5. 移动/复制视频文件
-    ext = os.path.splitext(filename)[1]
-    new_video_name = f"[{code}] {title}{ext}"
-    target_video_path = target_dir / new_video_name
-    
     if not dry_run:
         try:
-            shutil.move(file_path, target_video_path)
+            get_move_engine().move(file_path, target_video_path)
             print(f"  ✓ 视频已移动")
         except Exception as e:
             print(f"  ✗ 移动失败: {e}")
@@ -202,9 +183,11 @@ def organize_single_file(file_path, base_dir, proxy='http://127.0.0.1:7890', dry
         print(f"  [Dry Run] 将移动到: {target_video_path}")
     
     # 6. 下载海报
-    if metadata.get('poster_url'):
+    if poster and metadata.get('poster_url'):
         poster_path = target_dir / 'cover.jpg'
-        if not dry_run:
+        if not dry_run and poster_jobs is not None:
+            poster_jobs.append((metadata['poster_url'], str(poster_path), proxy))
+        elif not dry_run:
             print(f"  下载海报...")
             if download_poster(metadata['poster_url'], poster_path, proxy):
                 print(f"  ✓ 海报已保存")
@@ -219,6 +202,9 @@ def organize_single_file(file_path, base_dir, proxy='http://127.0.0.1:7890', dry
         with open(metadata_path, 'w', encoding='utf-8') as f:
             json.dump(metadata, f, ensure_ascii=False, indent=2)
         print(f"  ✓ 元数据已保存")
+        if index is not None:
+            index.forget(file_path)
+            index.record(target_video_path)
     else:
         print(f"  [Dry Run] 将保存元数据到: {metadata_path}")
     
@@ -252,8 +238,12 @@ def scan_all_videos_recursively(base_dir):
     
     return videos
 
-def is_video_in_standard_location(video_path):
-    """检查视频是否在标准位置且有完整元数据"""
+def is_video_in_standard_location(video_path, has_metadata=None):
+    """
+    检查视频是否在标准位置且有完整元数据
+    
+    has_metadata: 库索引中记录的 metadata.json 状态, None 时查看文件
+    """
     video_folder = Path(video_path).parent
     
     # 检查文件夹名格式: [番号] 标题
@@ -262,22 +252,213 @@ def is_video_in_standard_location(video_path):
         return False
     
     # 检查是否有 metadata.json
-    metadata_path = video_folder / 'metadata.json'
-    if not metadata_path.exists():
-        return False
+    if has_metadata is None:
+        has_metadata = (video_folder / 'metadata.json').exists()
     
-    return True
+    return has_metadata
+
+def download_posters(poster_jobs, concurrency, limiter):
+    """并发下载海报 (url, 保存路径, 代理); 已有的有效海报跳过"""
+    if not poster_jobs:
+        return
+    print(f"\n下载 {len(poster_jobs)} 张海报...")
+    saved = get_poster_downloader().download_all([job + (False,) for job in poster_jobs],
+                                                 concurrency, limiter)
+    failed_posters = len(poster_jobs) - saved
+    if failed_posters > 0:
+        print(f"  ⚠ {failed_posters} 张海报下载失败(非致命错误, 已记入重试队列)")
+
+def retry_failed_posters(concurrency, limiter):
+    """重试之前运行中下载失败、已到重试时间的海报"""
+    retried, saved = get_poster_downloader().retry(concurrency, limiter)
+    if retried:
+        print(f"重试 {retried} 张之前失败的海报: {saved} 张成功")
+
+def apply_plan(plan, concurrency, limiter, index=None, journal=None):
+    """
+    执行移动计划, 然后并发下载海报
+    
+    journal: 预写日志 (MoveJournal), 每次移动都记入日志, 海报下载完后删除;
+             日志中已完成的条目补下缺失的海报
+    """
+    poster_jobs = []
+    
+    def on_moved(item):
+        print(f"  ✓ {os.path.basename(item['source'])} -> {item['target']}")
+        if item.get('poster'):
+            poster = item['poster']
+            poster_jobs.append((poster['url'], poster['path'], poster['proxy']))
+        if index is not None:
+            index.forget(item['source'])
+            index.record(item['target'])
+    
+    def on_skipped(item):
+        poster = item.get('poster')
+        if poster:
+            # 已有的海报不发请求
+            poster_jobs.append((poster['url'], poster['path'], poster['proxy']))
+    
+    print(f"\n执行移动计划: {len(plan)} 个文件, {len(plan.folders())} 个目标文件夹...")
+    counts = plan.apply(on_moved, journal=journal, on_skipped=on_skipped if journal is not None else None)
+    download_posters(poster_jobs, concurrency, limiter)
+    if journal is not None:
+        journal.complete()
+    return counts
+
+def resume_interrupted_runs(base_dir, concurrency, limiter, index=None):
+    """从预写日志继续被中断的整理 (不重新扫描和抓取)"""
+    for journal in interrupted_journals(base_dir):
+        plan = journal.load()
+        if plan is None:
+            # 在生成计划时被中断, 没有移动过文件
+            journal.complete()
+            continue
+        if plan.tool != 'organize_v2':
+            continue
+        progress = journal.counts()
+        print(f"\n继续被中断的整理: 计划 {len(plan)} 个文件, 已完成 {progress['done']} 个, "
+              f"中断 {progress['started']} 个")
+        counts = apply_plan(plan, concurrency, limiter, index, journal)
+        print(f"继续完成: 移动 {counts['moved']}, 已完成 {counts['skipped']}, "
+              f"失败 {counts['failed'] + counts['missing']}")
+
+def organize_pipeline(videos, base_dir, proxy, concurrency, limiter, cache=None, store=None,
+                      refresh=False, index=None, move_workers=1):
+    """
+    流水线整理: 按番号分组 → 抓取 → 生成计划 → 移动 → 写元数据 → 下载海报
+    
+    同一番号的分段和版本 (ABC-123-CD1, ABC-123-C) 是一个单元: 一次抓取、一张海报、一个影片文件夹。
+    
+    各阶段用有界队列连接、各有自己的线程数, 抓取下一批的同时移动上一批。
+    目标路径按扫描顺序决定; 计划逐条写入预写日志后才移动。
+    
+    Returns:
+        (成功数, {失败原因: 数量}, Pipeline)
+    """
+    plan = MovePlan(base_dir, 'organize_v2')
+    journal = MoveJournal.create(base_dir)
+    journal.begin(plan)
+    errors = {}
+    lock = threading.Lock()
+    fetched = {}
+    host = host_of_url(JAVBUS_BASE_URL)
+    local = answered_locally(store, SCRAPER, refresh, cache=cache)
+    
+    def fail(error):
+        with lock:
+            errors[error] = errors.get(error, 0) + 1
+    
+    def fetch(unit):
+        code, members = unit
+        if not code:
+            print(f"\n处理: {os.path.basename(members[0][0])}\n  ✗ 无法提取番号")
+            fail('no_code')
+            return None
+        # 同一番号 (含分段和版本) 只抓取一次; 不联网就能回答的番号 (没有数据源、
+        # 元数据库或新鲜的页面缓存中已有) 不占用请求配额
+        if not local(code):
+            limiter.bucket(host).acquire()
+        fetched[code] = fetch_metadata(code, proxy, cache, store, refresh)
+        return unit
+    
+    def decide(unit):
+        code, members = unit
+        numbers = []
+        for i, (video, part) in enumerate(members):
+            success, error = organize_single_file(video, base_dir, proxy, prefetched={code: fetched[code]},
+                                                  plan=plan, part=part, poster=i == 0)
+            if not success:
+                fail(error)
+                continue
+            n = len(plan.items) - 1
+            journal.add(n, plan.items[n])
+            numbers.append(n)
+        return numbers or None
+    
+    def move(numbers):
+        moved = []
+        for n in numbers:
+            item = plan.items[n]
+            try:
+                outcome = plan.move_item(n, item, journal)
+            except OSError as e:
+                print(f"  ✗ 移动失败: {os.path.basename(item['source'])}: {e}")
+                fail('move_failed')
+                continue
+            if outcome != 'moved':
+                fail(outcome)
+                continue
+            moved.append(n)
+        return moved or None
+    
+    def write_metadata(numbers):
+        for n in numbers:
+            item = plan.items[n]
+            plan.complete_item(n, item, journal)
+            if index is not None:
+                index.forget(item['source'])
+                index.record(item['target'])
+            print(f"  ✓ {os.path.basename(item['source'])} -> {item['target']}")
+        return numbers
+    
+    def poster(numbers):
+        # 每个番号一张海报, 记在第一个分段上
+        job = next((plan.items[n]['poster'] for n in numbers if plan.items[n].get('poster')), None)
+        if job:
+            if not download_poster(job['url'], job['path'], job['proxy'], limiter):
+                print(f"  ⚠ 海报下载失败(非致命错误)")
+        return numbers
+    
+    pipeline = Pipeline([
+        Stage('fetch', fetch, concurrency),
+        Stage('plan', decide, ordered=True),
+        Stage('move', move, move_workers),
+        Stage('metadata', write_metadata),
+        Stage('poster', poster, concurrency),
+    ])
+    done = pipeline.run(group_by_code(videos, os.path.basename))
+    journal.complete()
+    return sum(len(numbers) for numbers in done), errors, pipeline
+
+def apply_saved_plan(plan_path, base_dir, concurrency, rate, index=None):
+    """执行 --plan 保存的移动计划 (不联网抓取元数据)"""
+    plan = MovePlan.load(plan_path)
+    if plan.directory != base_dir:
+        print(f"错误: {plan_path} 是为 {plan.directory} 生成的")
+        sys.exit(1)
+    
+    counts = apply_plan(plan, concurrency, HostRateLimiter(rate), index)
+    
+    print("\n" + "=" * 70)
+    print("整理完成")
+    print("=" * 70)
+    print(f"成功: {counts['moved']}")
+    print(f"已执行过: {counts['skipped']}")
+    print(f"失败: {counts['failed'] + counts['missing']}")
+    print(f"移动: {get_move_engine().format_stats()}")
 
 def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='AV 完整整理脚本 v2.0')
     parser.add_argument('directory', help='要整理的目录')
-    parser.add_argument('--proxy', default='http://127.0.0.1:7890', help='代理地址')
+    parser.add_argument('--proxy', default=DEFAULT_PROXY, help='代理地址')
     parser.add_argument('--dry-run', action='store_true', help='预览模式(不实际移动文件)')
     parser.add_argument('--first-only', action='store_true', help='只处理第一个文件(测试用)')
     parser.add_argument('--file', help='只处理指定的单个文件')
     parser.add_argument('--reorganize', action='store_true', help='重新整理所有非标准位置的视频')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='并发抓取/下载数量')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='每个主机每秒最多请求数')
+    parser.add_argument('--no-cache', action='store_true', help='不使用详情页磁盘缓存')
+    parser.add_argument('--no-store', action='store_true', help='不读写元数据库')
+    parser.add_argument('--refresh', action='store_true', help='忽略元数据库中的结果重新抓取')
+    parser.add_argument('--no-index', action='store_true', help='不使用库索引(--reorganize 时遍历整个目录)')
+    parser.add_argument('--max-rate', type=float, default=None, help='跨磁盘移动(复制)时每秒最多写入多少 MB')
+    parser.add_argument('--verify-hash', action='store_true', help='跨磁盘移动时比较 SHA-256 后再删除源文件')
+    parser.add_argument('--plan', metavar='FILE', help='只抓取元数据并把移动计划写入 FILE, 不移动文件')
+    parser.add_argument('--apply', metavar='FILE', help='执行 --plan 保存的移动计划(只做文件操作)')
+    parser.add_argument('--move-workers', type=int, default=1, help='同时进行的移动数量(目标在不同磁盘时可调大)')
+    parser.add_argument('--full', action='store_true', help='--reorganize 时重新列出库中所有文件夹(忽略目录修改时间记录)')
     
     args = parser.parse_args()
     
@@ -295,6 +476,23 @@ def main():
     print(f"模式: {'预览' if args.dry_run else '执行'}")
     print("=" * 70)
     
+    cache = None if args.no_cache else get_page_cache()
+    store = None if args.no_store else get_metadata_store()
+    index = None if args.no_index else LibraryIndex(base_dir)
+    get_move_engine().configure(args.max_rate * 1024 ** 2 if args.max_rate else None, args.verify_hash)
+    
+    # 执行保存的移动计划
+    if args.apply:
+        apply_saved_plan(args.apply, base_dir, args.concurrency, args.rate, index)
+        sys.exit(0)
+    
+    # 先继续被中断的整理
+    if interrupted_journals(base_dir) and not args.plan:
+        if args.dry_run:
+            print("\n有被中断的整理, 去掉 --dry-run 后会先继续执行")
+        else:
+            resume_interrupted_runs(base_dir, args.concurrency, HostRateLimiter(args.rate), index)
+    
     # 处理单个文件
     if args.file:
         file_path = os.path.abspath(args.file)
@@ -302,16 +500,27 @@ def main():
             print(f"错误: 文件不存在: {file_path}")
             sys.exit(1)
         
-        success, error = organize_single_file(file_path, base_dir, args.proxy, args.dry_run)
+        success, error = organize_single_file(file_path, base_dir, args.proxy, args.dry_run,
+                                              cache=cache, store=store, index=index)
         sys.exit(0 if success else 1)
     
     # 重新整理模式: 扫描所有视频，只处理非标准位置的
     if args.reorganize:
         print("\n重新整理模式: 扫描所有视频...")
-        all_videos = scan_all_videos_recursively(base_dir)
-        
-        # 过滤出非标准位置的视频
-        videos = [v for v in all_videos if not is_video_in_standard_location(v)]
+        if index is not None:
+            # 只重新列出修改时间有变化的文件夹, 元数据状态取自索引
+            scan_stats = ScanStats()
+            index.refresh(scan_stats, full=args.full)
+            indexed = index.videos()
+            all_videos = [v['path'] for v in indexed]
+            videos = [v['path'] for v in indexed
+                      if not is_video_in_standard_location(v['path'], v['has_metadata'])]
+            print(f"库索引: {index.format_stats()} ({scan_stats.format()})")
+        else:
+            all_videos = scan_all_videos_recursively(base_dir)
+            
+            # 过滤出非标准位置的视频
+            videos = [v for v in all_videos if not is_video_in_standard_location(v)]
         
         print(f"找到 {len(all_videos)} 个视频文件")
         print(f"其中 {len(videos)} 个需要重新整理\n")
@@ -324,6 +533,9 @@ def main():
         print("\n扫描视频文件...")
         videos = scan_videos(base_dir)
     
+    # 固定处理顺序, 保证移动结果可复现
+    videos.sort()
+    
     if not videos:
         print("未找到视频文件")
         sys.exit(0)
@@ -338,16 +550,42 @@ def main():
     success_count = 0
     failed_count = 0
     errors = {}
-    
-    # 处理每个视频
-    for video in videos:
-        success, error = organize_single_file(video, base_dir, args.proxy, args.dry_run)
+    limiter = HostRateLimiter(args.rate)
+    pipeline = None
+    
+    if not args.dry_run and not args.plan:
+        # 抓取、移动、写元数据、下载海报重叠执行
+        success_count, errors, pipeline = organize_pipeline(
+            videos, base_dir, args.proxy, args.concurrency, limiter, cache, store, args.refresh,
+            index, args.move_workers)
+        failed_count = sum(errors.values())
+        retry_failed_posters(args.concurrency, limiter)
+    else:
+        # 预览或只生成计划: 先并发抓取所有番号的元数据, 再按扫描顺序逐个处理
+        units = group_by_code(videos, os.path.basename)
+        codes = [code for code, _ in units if code]
+        print(f"并发抓取 {len(codes)} 个番号 (并发 {args.concurrency}, 每主机 {args.rate}/s)...")
+        prefetched = fetch_all(codes, lambda code: fetch_metadata(code, args.proxy, cache, store, args.refresh),
+                               args.concurrency, limiter=limiter,
+                               local=answered_locally(store, SCRAPER, args.refresh, cache=cache))
+        plan = MovePlan(base_dir, 'organize_v2') if args.plan else None
         
-        if success:
-            success_count += 1
-        else:
-            failed_count += 1
-            errors[error] = errors.get(error, 0) + 1
+        for code, members in units:
+            for i, (video, part) in enumerate(members):
+                success, error = organize_single_file(video, base_dir, args.proxy, args.dry_run,
+                                                      prefetched, index=index, plan=plan, part=part,
+                                                      poster=i == 0)
+                
+                if success:
+                    success_count += 1
+                else:
+                    failed_count += 1
+                    errors[error] = errors.get(error, 0) + 1
+        
+        if plan is not None:
+            plan.save(args.plan)
+            print(f"\n移动计划已保存: {args.plan} ({len(plan)} 个文件, {len(plan.folders())} 个目标文件夹)")
+            print(f"执行: python organize_v2.py \"{base_dir}\" --apply \"{args.plan}\"")
     
     # 总结
     print("\n" + "=" * 70)
@@ -355,6 +593,15 @@ def main():
     print("=" * 70)
     print(f"成功: {success_count}")
     print(f"失败: {failed_count}")
+    print(f"移动: {get_move_engine().format_stats()}")
+    if pipeline is not None:
+        print(f"流水线: {pipeline.format_stats()}")
+    print(f"海报: {get_poster_downloader().format_stats()}")
+    print(f"网络连接: {get_session(args.proxy).format_stats()}")
+    if cache is not None:
+        print(f"页面缓存: {cache.format_stats()}")
+    if store is not None:
+        print(f"元数据库: {store.format_stats()}")
     
     if errors:
         print("\n失败原因统计:")
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JavBus 详情页磁盘缓存 - 压缩存储、TTL、条件请求、LRU 容量上限
+
+Raw detail-page bodies are stored zlib-compressed under their SHA-256
+(identical pages are stored once) and indexed by normalized code in a small
+SQLite table. Fresh entries are served without touching the network; stale
+entries are revalidated with If-None-Match / If-Modified-Since.
+
+Usage:
+    python page_cache.py stats
+    python page_cache.py clear
+"""
+
+import os
+import sys
+import time
+import zlib
+import sqlite3
+import hashlib
+import tempfile
+import threading
+
+from av_state import global_state_dir
+
+DEFAULT_TTL = 7 * 24 * 3600         # seconds
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2  # compressed bytes on disk
+
+
+class PageCache:
+    """
+    Content-addressed cache of raw detail pages keyed by code
+
+    Args:
+        directory: Cache directory (default: <state dir>/page-cache)
+        ttl: Seconds an entry is served without revalidation
+        max_bytes: Size cap for stored objects; least recently used
+                   entries are evicted beyond it
+    """
+
+    def __init__(self, directory=None, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or global_state_dir() / 'page-cache'
+        self.objects = self.directory / 'objects'
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.directory / 'index.db'), check_same_thread=False)
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )''')
+        self._db.commit()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_key(code):
+        return code.upper().strip().replace(' ', '-')
+
+    def _object_path(self, digest):
+        return self.objects / digest[:2] / f'{digest}.z'
+
+    # Index access
+
+    def get(self, code):
+        """Index entry for a code as a dict, or None"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT digest, size, etag, last_modified, fetched_at FROM entries WHERE key = ?',
+                (self.normalize_key(code),)).fetchone()
+        if not row:
+            return None
+        return dict(zip(('digest', 'size', 'etag', 'last_modified', 'fetched_at'), row))
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    def has_fresh(self, code):
+        """True if a fresh entry exists for the code"""
+        entry = self.get(code)
+        return bool(entry and self.is_fresh(entry))
+
+    def read(self, code, entry=None):
+        """Cached body bytes for a code (None if missing or unreadable)"""
+        entry = entry or self.get(code)
+        if not entry:
+            return None
+        try:
+            with open(self._object_path(entry['digest']), 'rb') as f:
+                body = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            self.invalidate(code)
+            return None
+        with self._lock:
+            self._db.execute('UPDATE entries SET last_access = ? WHERE key = ?',
+                             (time.time(), self.normalize_key(code)))
+            self._db.commit()
+        return body
+
+    def put(self, code, body, etag=None, last_modified=None):
+        """Store a page body and evict old entries past the size cap"""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            # A temp name of its own: concurrent fetches may store the same body
+            fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=str(path.parent))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(zlib.compress(body, 6))
+                os.replace(tmp, str(path))
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        size = path.stat().st_size
+
+        now = time.time()
+        with self._lock:
+            old = self._db.execute('SELECT digest FROM entries WHERE key = ?',
+                                   (self.normalize_key(code),)).fetchone()
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (self.normalize_key(code), digest, size, etag, last_modified, now, now))
+            self._db.commit()
+        if old and old[0] != digest:
+            self._drop_object_if_unused(old[0])
+        self.evict()
+
+    def refresh(self, code, etag=None, last_modified=None):
+        """Mark an entry as revalidated (304 Not Modified)"""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'UPDATE entries SET fetched_at = ?, last_access = ?, '
+                'etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE key = ?',
+                (now, now, etag, last_modified, self.normalize_key(code)))
+            self._db.commit()
+
+    def invalidate(self, code):
+        """Forget a code (e.g. an age verification page was cached)"""
+        with self._lock:
+            row = self._db.execute('SELECT digest FROM entries WHERE key = ?',
+                                   (self.normalize_key(code),)).fetchone()
+            self._db.execute('DELETE FROM entries WHERE key = ?', (self.normalize_key(code),))
+            self._db.commit()
+        if row:
+            self._drop_object_if_unused(row[0])
+
+    def _drop_object_if_unused(self, digest):
+        with self._lock:
+            used = self._db.execute('SELECT 1 FROM entries WHERE digest = ? LIMIT 1',
+                                    (digest,)).fetchone()
+        if not used:
+            try:
+                self._object_path(digest).unlink()
+            except OSError:
+                pass
+
+    def codes(self):
+        """All cached codes"""
+        with self._lock:
+            return [row[0] for row in self._db.execute('SELECT key FROM entries ORDER BY key')]
+
+    def count(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def total_bytes(self):
+        """Size of all stored objects (each digest counted once)"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)'
+            ).fetchone()
+        return row[0]
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits max_bytes"""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return 0
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT key, digest, size FROM entries ORDER BY last_access').fetchall()
+        evicted = 0
+        for key, digest, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.invalidate(key)
+            if not self._object_path(digest).exists():
+                total -= size
+            evicted += 1
+        return evicted
+
+    # Fetch through the cache
+
+    def fetch(self, session, url, code):
+        """
+        Return the page body for a code, using the network only when needed
+
+        Fresh entries are returned directly. Stale entries are revalidated
+        with conditional headers; a 304 reuses the cached body. An entry
+        whose body cannot be read is dropped and the page fetched without
+        conditions, so an empty 304 body is never stored.
+        HTTP errors from the session propagate unchanged.
+        """
+        entry = self.get(code)
+        cached = self.read(code, entry) if entry else None
+        if cached is None:
+            # read() dropped an entry whose object is missing or corrupt
+            entry = None
+        elif self.is_fresh(entry):
+            self.hits += 1
+            return cached
+
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        with session.open(url, headers=headers) as response:
+            body = response.read()
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+
+        if response.status == 304:
+            if cached is not None:
+                self.refresh(code, etag, last_modified)
+                self.revalidated += 1
+                return cached
+            # Not modified, but nothing usable to reuse: ask again unconditionally
+            self.invalidate(code)
+            with session.open(url, headers={}) as response:
+                body = response.read()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if response.status == 304:
+                raise OSError(f"304 Not Modified without conditional headers for {code}")
+
+        self.misses += 1
+        self.put(code, body, etag, last_modified)
+        return body
+
+    def format_stats(self):
+        return (f"{self.hits} hits, {self.revalidated} revalidated, {self.misses} fetched, "
+                f"{self.total_bytes() / 1024 ** 2:.1f} MB on disk")
+
+    def clear(self):
+        with self._lock:
+            digests = [row[0] for row in self._db.execute('SELECT DISTINCT digest FROM entries')]
+            self._db.execute('DELETE FROM entries')
+            self._db.commit()
+        for digest in digests:
+            try:
+                self._object_path(digest).unlink()
+            except OSError:
+                pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """Process-wide cache in the default location"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PageCache()
+        return _cache
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='JavBus page cache')
+    parser.add_argument('command', choices=['stats', 'clear'])
+    args = parser.parse_args()
+
+    cache = get_page_cache()
+    if args.command == 'clear':
+        cache.clear()
+        print(f"Cleared {cache.directory}")
+    else:
+        print(f"{cache.directory}: {cache.count()} pages, {cache.total_bytes() / 1024 ** 2:.1f} MB")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
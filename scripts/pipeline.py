@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线 - 抓取、移动、海报下载和元数据写入重叠执行
+
+Each stage runs its own worker threads and hands items to the next stage
+through a bounded queue, so the network is busy fetching the next items
+while the disk moves the previous ones and a slow stage holds back its
+producers instead of buffering the whole run. An ordered stage sees items
+in input order (for decisions that must be reproducible, such as picking
+target names). Every stage reports how busy its workers were; the run
+takes about as long as the busiest stage instead of the sum of all of them.
+
+Usage:
+    from pipeline import Stage, Pipeline
+    results = Pipeline([Stage('fetch', fetch, workers=4),
+                        Stage('move', move)]).run(items)
+"""
+
+import sys
+import time
+import queue
+import threading
+
+DEFAULT_QUEUE_SIZE = 16     # items waiting between two stages
+
+_DONE = object()       # end of input, one per worker
+_DROPPED = object()    # an earlier stage dropped the item; keeps ordered stages in step
+
+
+class Stage:
+    """
+    One step of a pipeline
+
+    Args:
+        name: Shown in the utilisation report
+        func: item -> item for the next stage, or None to drop it
+        workers: Threads running func
+        ordered: Call func in input order (one worker)
+    """
+
+    def __init__(self, name, func, workers=1, ordered=False):
+        self.name = name
+        self.func = func
+        self.workers = 1 if ordered else max(1, workers)
+        self.ordered = ordered
+        self.items = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def _call(self, item):
+        started = time.monotonic()
+        try:
+            result = self.func(item)
+        except Exception as e:
+            print(f"  ! {self.name}: {e}", file=sys.stderr)
+            result = None
+            with self._lock:
+                self.errors += 1
+        with self._lock:
+            self.busy += time.monotonic() - started
+            self.items += 1
+            if result is None:
+                self.dropped += 1
+        return result
+
+    def utilisation(self, wall):
+        return self.busy / (self.workers * wall) if wall > 0 else 0.0
+
+
+class Pipeline:
+    """
+    Stages connected by bounded queues
+
+    Args:
+        stages: Stage list, first to last
+        queue_size: Capacity of each queue between stages
+    """
+
+    def __init__(self, stages, queue_size=DEFAULT_QUEUE_SIZE):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.wall = 0.0
+
+    def _worker(self, stage, inbox, outbox, successors, remaining, lock):
+        waiting = {}
+        next_seq = 0
+        while True:
+            entry = inbox.get()
+            if entry is _DONE:
+                break
+            if stage.ordered:
+                # Hold items that overtook an earlier one
+                waiting[entry[0]] = entry[1]
+                ready = []
+                while next_seq in waiting:
+                    ready.append((next_seq, waiting.pop(next_seq)))
+                    next_seq += 1
+            else:
+                ready = [entry]
+            for seq, item in ready:
+                if item is not _DROPPED:
+                    item = stage._call(item)
+                    if item is None:
+                        item = _DROPPED
+                outbox.put((seq, item))
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            # The last worker of a stage ends every worker of the next one
+            for _ in range(successors):
+                outbox.put(_DONE)
+
+    def run(self, items):
+        """
+        Push items through every stage
+
+        Returns:
+            Results of the last stage (not dropped), in completion order
+        """
+        started = time.monotonic()
+        queues = [queue.Queue(self.queue_size) for _ in self.stages]
+        results = queue.Queue()
+        threads = []
+        for i, stage in enumerate(self.stages):
+            if i + 1 < len(self.stages):
+                outbox, successors = queues[i + 1], self.stages[i + 1].workers
+            else:
+                outbox, successors = results, 1
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for _ in range(stage.workers):
+                thread = threading.Thread(target=self._worker, daemon=True,
+                                          args=(stage, queues[i], outbox, successors, remaining, lock))
+                thread.start()
+                threads.append(thread)
+
+        # Blocks while the first stage is queue_size items behind
+        for seq, item in enumerate(items):
+            queues[0].put((seq, item))
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_DONE)
+
+        collected = []
+        while True:
+            entry = results.get()
+            if entry is _DONE:
+                break
+            if entry[1] is not _DROPPED:
+                collected.append(entry[1])
+        for thread in threads:
+            thread.join()
+        self.wall = time.monotonic() - started
+        return collected
+
+    def format_stats(self):
+        parts = []
+        for stage in self.stages:
+            text = f"{stage.name} {stage.items}x{stage.workers} {stage.utilisation(self.wall):.0%}"
+            if stage.errors:
+                text += f" ({stage.errors} errors)"
+            parts.append(text)
+        return f"{self.wall:.1f}s; busy: " + ", ".join(parts)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+海报下载 - 流式写入临时文件后原子改名, 已有的有效海报不再下载, 失败的记入重试队列
+
+The organizers used to read each image into memory, write it in place (a
+killed run left a truncated cover.jpg behind) and download it again on
+every run. PosterDownloader first checks the target: a file of at least
+MIN_POSTER_BYTES that starts with a JPEG/PNG/WebP/GIF signature counts as
+present and costs no request. Otherwise the image is streamed into
+<target>.partial, checked the same way and renamed into place. Failed
+downloads go to a retry queue in ~/.av-organizer/poster-queue.json that is
+worked off (with growing delays) at the end of later runs.
+
+Usage:
+    python poster_downloader.py                  # show the retry queue
+    python poster_downloader.py --retry [--all]  # retry due (or all) entries
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+
+from av_state import global_state_dir
+from javbus_session import get_session, DEFAULT_PROXY
+from async_fetch import run_concurrent, host_of_url, DEFAULT_CONCURRENCY
+
+CHUNK_SIZE = 64 * 1024
+MIN_POSTER_BYTES = 1024
+RETRY_DELAY = 600           # seconds before the first retry; doubles per attempt
+MAX_ATTEMPTS = 6            # afterwards only `--retry --all` tries again
+
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+]
+POSTER_EXTENSIONS = ('.jpg', '.png', '.webp', '.gif')
+
+
+def image_extension(head):
+    """Extension for the image type of the first bytes of a file (None: not an image)"""
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    return None
+
+
+def is_valid_image(path):
+    """True if path is a plausible image: large enough and with an image signature"""
+    try:
+        if os.path.getsize(path) < MIN_POSTER_BYTES:
+            return False
+        with open(path, 'rb') as f:
+            return image_extension(f.read(16)) is not None
+    except OSError:
+        return False
+
+
+class PosterDownloader:
+    """
+    Skip-if-present, atomic poster downloads with a persistent retry queue
+
+    Args:
+        queue_path: Retry queue file (default: poster-queue.json in the global state folder)
+    """
+
+    def __init__(self, queue_path=None):
+        self.queue_path = queue_path or global_state_dir() / 'poster-queue.json'
+        self._lock = threading.Lock()
+        try:
+            with open(self.queue_path, encoding='utf-8') as f:
+                self.queue = json.load(f)
+        except (OSError, ValueError):
+            self.queue = {}
+        self.present = 0
+        self.downloaded = 0
+        self.failed = 0
+        self.bytes = 0
+
+    def _save_queue(self):
+        tmp = f"{self.queue_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.queue, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.queue_path)
+
+    def _queue_failure(self, url, path, proxy, match_ext, error):
+        with self._lock:
+            self.failed += 1
+            entry = self.queue.get(path) or {'attempts': 0}
+            entry.update(url=url, proxy=proxy, match_ext=match_ext, error=str(error)[:200],
+                         attempts=entry['attempts'] + 1)
+            entry['next_try'] = time.time() + RETRY_DELAY * 2 ** (entry['attempts'] - 1)
+            self.queue[path] = entry
+            self._save_queue()
+
+    def _dequeue(self, path):
+        with self._lock:
+            if self.queue.pop(path, None) is not None:
+                self._save_queue()
+
+    def existing(self, path, match_ext=False):
+        """The valid poster already at path (with match_ext: path with any image extension)"""
+        candidates = [path]
+        if match_ext:
+            stem = os.path.splitext(path)[0]
+            candidates = [stem + ext for ext in POSTER_EXTENSIONS]
+        for candidate in candidates:
+            if is_valid_image(candidate):
+                return candidate
+        return None
+
+    def download(self, url, path, proxy=DEFAULT_PROXY, match_ext=False, limiter=None):
+        """
+        Make sure a poster is at path
+
+        Args:
+            url: Image URL
+            path: Target file
+            proxy: Proxy for the request
+            match_ext: Give the file the extension of the image type that
+                arrives (e.g. [CODE]-poster.png) instead of keeping path's
+            limiter: HostRateLimiter to wait on before a request (none is
+                made for a poster that is present)
+
+        Returns:
+            True if a valid poster is in place (downloaded or already there)
+        """
+        path = str(path)
+        if self.existing(path, match_ext):
+            with self._lock:
+                self.present += 1
+            self._dequeue(path)
+            return True
+        if not url:
+            return False
+
+        if limiter is not None:
+            limiter.bucket(host_of_url(url)).acquire()
+        partial = f"{path}.partial"
+        try:
+            size = 0
+            with get_session(proxy).open(url) as response, open(partial, 'wb') as f:
+                head = response.read(CHUNK_SIZE)
+                ext = image_extension(head)
+                if ext is None:
+                    raise ValueError(f"not an image ({response.headers.get('Content-Type', 'no type')})")
+                while head:
+                    f.write(head)
+                    size += len(head)
+                    head = response.read(CHUNK_SIZE)
+            if size < MIN_POSTER_BYTES:
+                raise ValueError(f"image too small ({size} bytes)")
+            target = os.path.splitext(path)[0] + ext if match_ext else path
+            os.replace(partial, target)
+        except Exception as e:
+            try:
+                os.unlink(partial)
+            except OSError:
+                pass
+            print(f"  ! Poster {os.path.basename(path)}: {e} (queued for retry)")
+            self._queue_failure(url, path, proxy, match_ext, e)
+            return False
+
+        with self._lock:
+            self.downloaded += 1
+            self.bytes += size
+        self._dequeue(path)
+        return True
+
+    def download_all(self, jobs, concurrency=DEFAULT_CONCURRENCY, limiter=None):
+        """
+        Download (url, path, proxy, match_ext) jobs on a bounded pool
+
+        Jobs for the same path are done once; present posters cost no
+        request (and no rate token). Returns the number of posters in place.
+        """
+        jobs = list({str(job[1]): job for job in jobs}.values())
+        # download() takes the rate token itself, only when it makes a request
+        results = run_concurrent(jobs, lambda job: self.download(*job, limiter=limiter), concurrency,
+                                 local=lambda job: True)
+        return sum(1 for ok in results if ok)
+
+    def retry(self, concurrency=DEFAULT_CONCURRENCY, limiter=None, everything=False):
+        """
+        Download queued posters that are due again
+
+        Entries whose folder is gone (item moved or deleted) are dropped.
+
+        Returns:
+            (number retried, number now in place)
+        """
+        now = time.time()
+        jobs = []
+        with self._lock:
+            for path, entry in list(self.queue.items()):
+                if not os.path.isdir(os.path.dirname(path)):
+                    del self.queue[path]
+                elif everything or (entry['attempts'] < MAX_ATTEMPTS and entry['next_try'] <= now):
+                    jobs.append((entry['url'], path, entry['proxy'], entry.get('match_ext', False)))
+            self._save_queue()
+        if not jobs:
+            return 0, 0
+        return len(jobs), self.download_all(jobs, concurrency, limiter)
+
+    def format_stats(self):
+        text = (f"{self.downloaded} downloaded ({self.bytes / 1024 ** 2:.1f} MB), "
+                f"{self.present} already present, {self.failed} failed")
+        if self.queue:
+            text += f", {len(self.queue)} queued for retry"
+        return text
+
+
+_downloader = None
+_downloader_lock = threading.Lock()
+
+
+def get_poster_downloader():
+    """Process-wide downloader with the default retry queue"""
+    global _downloader
+    with _downloader_lock:
+        if _downloader is None:
+            _downloader = PosterDownloader()
+        return _downloader
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Poster retry queue')
+    parser.add_argument('--retry', action='store_true', help='Download queued posters that are due')
+    parser.add_argument('--all', action='store_true', help='With --retry: every queued poster')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    args = parser.parse_args()
+
+    downloader = get_poster_downloader()
+    if args.retry:
+        retried, saved = downloader.retry(args.concurrency, everything=args.all)
+        print(f"Retried {retried}, {saved} saved")
+        print(downloader.format_stats())
+        sys.exit(0)
+
+    if not downloader.queue:
+        print("No posters queued")
+    now = time.time()
+    for path, entry in sorted(downloader.queue.items()):
+        due = 'due' if entry['next_try'] <= now else f"in {(entry['next_try'] - now) / 60:.0f} min"
+        if entry['attempts'] >= MAX_ATTEMPTS:
+            due = 'given up'
+        print(f"{path}\n    {entry['attempts']} attempts, {due}: {entry['error']}")
+
+
+if __name__ == "__main__":
+    main()
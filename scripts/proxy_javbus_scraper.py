@@ -16,6 +16,78 @@ import urllib.error
 import ssl
 
 
+def parse_javbus_with_proxy(html, code):
+    """
+    Extract metadata from a detail page
+    
+    Returns:
+        dict with keys: code, studio, title, actresses, poster_url
+        None if neither studio nor title was found
+    """
+    # Extract metadata using regex
+    metadata = {
+        'code': code,
+        'studio': None,
+        'title': None,
+        'actresses': [],
+        'poster_url': None
+    }
+    
+    # Extract title from h3 tag
+    title_match = re.search(r'<h3>([^<]+)</h3>', html)
+    if title_match:
+        metadata['title'] = title_match.group(1).strip()
+    
+    # Extract studio
+    studio_match = re.search(r'<a[^>]*href="[^"]*\/studio\/[^"]*"[^>]*>([^<]+)</a>', html)
+    if studio_match:
+        metadata['studio'] = studio_match.group(1).strip()
+    
+    # Extract actresses - improved pattern
+    # Look for star name in the specific structure
+    actress_pattern = r'<a[^>]*class="avatar-box"[^>]*title="([^"]+)"'
+    actress_matches = re.findall(actress_pattern, html)
+    if actress_matches:
+        metadata['actresses'] = [a.strip() for a in actress_matches if a.strip()]
+    
+    # Alternative actress extraction from span tags in avatar section
+    if not metadata['actresses']:
+        actress_section = re.search(r'<div[^>]*id="avatar-waterfall"[^>]*>(.*?)</div[^>]*>', html, re.DOTALL)
+        if actress_section:
+            span_matches = re.findall(r'<span[^>]*>([^<]+)</span>', actress_section.group(1))
+            metadata['actresses'] = [a.strip() for a in span_matches if a.strip() and len(a.strip()) > 1]
+    
+    # Extract poster URL
+    # Pattern 1: bigImage link
+    poster_match = re.search(r'<a[^>]*class="bigImage"[^>]*href="([^"]+)"', html)
+    if poster_match:
+        poster_url = poster_match.group(1)
+        # Convert relative URL to absolute
+        if poster_url.startswith('//'):
+            metadata['poster_url'] = 'https:' + poster_url
+        elif poster_url.startswith('/'):
+            metadata['poster_url'] = 'https://www.javbus.com' + poster_url
+        else:
+            metadata['poster_url'] = poster_url
+    else:
+        # Pattern 2: Direct image from pics.dmm.co.jp
+        poster_match = re.search(r'<img[^>]*src="(https://pics\.dmm\.co\.jp/[^"]+)"', html)
+        if poster_match:
+            metadata['poster_url'] = poster_match.group(1)
+    
+    # Validate
+    if not metadata['studio'] and not metadata['title']:
+        return None
+    
+    # Set defaults
+    if not metadata['studio']:
+        metadata['studio'] = 'Unknown'
+    if not metadata['title']:
+        metadata['title'] = code
+    
+    return metadata
+
+
 def scrape_javbus_with_proxy(code, proxy='http://127.0.0.1:7890'):
     """
     Scrape metadata from javbus.com with proxy support
@@ -61,68 +133,7 @@ def scrape_javbus_with_proxy(code, proxy='http://127.0.0.1:7890'):
         response = opener.open(url, timeout=20)
         html = response.read().decode('utf-8', errors='ignore')
         
-        # Extract metadata using regex
-        metadata = {
-            'code': code,
-            'studio': None,
-            'title': None,
-            'actresses': [],
-            'poster_url': None
-        }
-        
-        # Extract title from h3 tag
-        title_match = re.search(r'<h3>([^<]+)</h3>', html)
-        if title_match:
-            metadata['title'] = title_match.group(1).strip()
-        
-        # Extract studio
-        studio_match = re.search(r'<a[^>]*href="[^"]*\/studio\/[^"]*"[^>]*>([^<]+)</a>', html)
-        if studio_match:
-            metadata['studio'] = studio_match.group(1).strip()
-        
-        # Extract actresses - improved pattern
-        # Look for star name in the specific structure
-        actress_pattern = r'<a[^>]*class="avatar-box"[^>]*title="([^"]+)"'
-        actress_matches = re.findall(actress_pattern, html)
-        if actress_matches:
-            metadata['actresses'] = [a.strip() for a in actress_matches if a.strip()]
-        
-        # Alternative actress extraction from span tags in avatar section
-        if not metadata['actresses']:
-            actress_section = re.search(r'<div[^>]*id="avatar-waterfall"[^>]*>(.*?)</div[^>]*>', html, re.DOTALL)
-            if actress_section:
-                span_matches = re.findall(r'<span[^>]*>([^<]+)</span>', actress_section.group(1))
-                metadata['actresses'] = [a.strip() for a in span_matches if a.strip() and len(a.strip()) > 1]
-        
-        # Extract poster URL
-        # Pattern 1: bigImage link
-        poster_match = re.search(r'<a[^>]*class="bigImage"[^>]*href="([^"]+)"', html)
-        if poster_match:
-            poster_url = poster_match.group(1)
-            # Convert relative URL to absolute
-            if poster_url.startswith('//'):
-                metadata['poster_url'] = 'https:' + poster_url
-            elif poster_url.startswith('/'):
-                metadata['poster_url'] = 'https://www.javbus.com' + poster_url
-            else:
-                metadata['poster_url'] = poster_url
-        else:
-            # Pattern 2: Direct image from pics.dmm.co.jp
-            poster_match = re.search(r'<img[^>]*src="(https://pics\.dmm\.co\.jp/[^"]+)"', html)
-            if poster_match:
-                metadata['poster_url'] = poster_match.group(1)
-        
-        # Validate
-        if not metadata['studio'] and not metadata['title']:
-            return None
-        
-        # Set defaults
-        if not metadata['studio']:
-            metadata['studio'] = 'Unknown'
-        if not metadata['title']:
-            metadata['title'] = code
-        
-        return metadata
+        return parse_javbus_with_proxy(html, code)
     
     except urllib.error.HTTPError as e:
         if e.code == 404:
@@ -13,48 +13,13 @@ import re
 import shutil
 import json
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from extract_code import extract_av_code, code_label
+from studio_table import get_studio_table
+
 # 视频文件扩展名
 VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.wmv', '.flv', '.mov', '.m4v', '.rmvb'}
 
-# 厂牌名称映射
-STUDIO_MAPPINGS = {
-    's1': 's1',
-    's1 no.1 style': 's1',
-    'ideapocket': 'ideapocket',
-    'idea pocket': 'ideapocket',
-    'moodyz': 'moodyz',
-    'prestige': 'prestige',
-    'e-body': 'e-body',
-    'ebody': 'e-body',
-    'faleno': 'faleno',
-    'attackers': 'attackers',
-    'madonna': 'madonna',
-    'premium': 'premium',
-    'kawaii': 'kawaii',
-}
-
-
-def extract_av_code(filename):
-    """从文件名提取番号"""
-    name = filename.upper()
-    
-    # 匹配模式: 字母+分隔符+数字
-    patterns = [
-        r'([A-Z]{2,6}[-\s]\d{3,5})',  # ABC-123 or ABC 123
-        r'([A-Z]{2,6}\d{3,5})',       # ABC123
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, name)
-        if match:
-            code = match.group(1)
-            # 标准化为连字符格式
-            code = re.sub(r'([A-Z]+)\s+(\d+)', r'\1-\2', code)
-            code = re.sub(r'([A-Z]+)(\d+)', r'\1-\2', code)
-            return code
-    
-    return None
-
 
 def fetch_javbus_metadata(code):
     """
@@ -65,45 +30,10 @@ def fetch_javbus_metadata(code):
     # 由于 Python 2.7 的限制,这里返回基于番号的默认数据
     # 实际使用时需要 Python 3 环境
     
-    studio_mapping = {
-        'SSIS': 'S1',
-        'SSNI': 'S1',
-        'IPX': 'IdeaPocket',
-        'IPZZ': 'IdeaPocket',
-        'HEZ': 'Hot Entertainment',
-        'MIDV': 'MOODYZ',
-        'MIAB': 'MOODYZ', 
-        'MIDA': 'MOODYZ',
-        'PRED': 'Premium',
-        'ABF': 'Prestige',
-        'SONE': 'S1',
-        'START': 'SOD Create',
-        'WAAA': 'Wanz Factory',
-        'DASS': 'DAS!',
-        'MEYD': 'Tameike Goro',
-        'MFYD': 'MOODYZ',
-        'JUR': 'Madonna',
-        'JUQ': 'Madonna',
-        'ROYD': 'Royal',
-        'EBWH': 'E-Body',
-        'HMN': 'Hon Naka',
-        'ADN': 'Attackers',
-        'NGOD': 'JET Eizou',
-        'DLDSS': 'DAHLIA',
-        'FSDSS': 'FALENO',
-        'CAWD': 'kawaii',
-        'URE': 'Madonna',
-        'ATID': 'Attackers',
-        'FNS': 'Faleno Star',
-        'FFT': 'Faleno',
-        'GVH': 'Glory Quest',
-    }
-    
-    # 从番号提取厂牌前缀
-    prefix_match = re.match(r'([A-Z]+)', code.upper())
-    if prefix_match:
-        prefix = prefix_match.group(1)
-        studio = studio_mapping.get(prefix, 'Unknown')
+    # 从番号提取厂牌前缀 (259LUXU-1234 取 LUXU)
+    prefix = code_label(code)
+    if prefix:
+        studio = get_studio_table().studio_for_label(prefix, 'Unknown')
     else:
         studio = 'Unknown'
     
@@ -115,21 +45,8 @@ def fetch_javbus_metadata(code):
 
 
 def normalize_studio(studio_name):
-    """标准化厂牌名称"""
-    if not studio_name:
-        return 'others'
-    
-    cleaned = studio_name.lower().strip()
-    
-    if cleaned in STUDIO_MAPPINGS:
-        return STUDIO_MAPPINGS[cleaned]
-    
-    # 默认处理: 小写,空格转连字符
-    normalized = re.sub(r'[^\w\s-]', '', cleaned)
-    normalized = re.sub(r'[\s]+', '-', normalized)
-    normalized = re.sub(r'-+', '-', normalized)
-    
-    return normalized if normalized else 'others'
+    """标准化厂牌名称 (studios.json, 未收录的厂牌转为小写连字符)"""
+    return get_studio_table().normalize(studio_name)
 
 
 def sanitize_filename(filename):
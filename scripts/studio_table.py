@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+厂牌表 - 厂牌名称/番号前缀到文件夹名的统一映射
+
+Every organizer maps studio names to folder names and code labels (SSIS,
+IPX, ...) to studios. The data lives in one file, studios.json: per studio
+its folder slug, display name, the names it appears under (English and
+Japanese spellings from javbus) and its code labels. The file is compiled
+once per process into:
+
+  - an exact-match dict of cleaned names (lowercase, single spaces)
+  - a label -> studio dict
+  - an Aho-Corasick automaton over all names, so a name that only contains
+    a known studio ("S1 NO.1 STYLE（エスワン）") is resolved in one pass over
+    the text instead of testing every known name as a substring
+
+The longest contained name wins (then the leftmost); names starting or
+ending with a letter or digit must match at word boundaries, so "Das" is
+not found inside "Madasu". normalize() slugifies unknown names, lookup()
+returns None for them.
+
+Python 2.7 compatible (simple_organizer imports it through extract_code);
+slugs and display names are returned as str there too.
+
+Usage:
+    python studio_table.py <studio_name>
+    python studio_table.py --label <LABEL>
+    python studio_table.py --bench [--rounds N]
+"""
+
+from __future__ import print_function
+import io
+import os
+import re
+import sys
+import json
+import time
+import threading
+
+STUDIOS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'studios.json')
+
+_SPACES_RE = re.compile(r'\s+', re.UNICODE)
+_SLUG_DROP_RE = re.compile(r'[^\w\s-]', re.UNICODE)
+_HYPHENS_RE = re.compile(r'-+')
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'ignore')
+    return value
+
+
+def _native(value):
+    """value as str: UTF-8 bytes on Python 2, so it joins with byte-string paths"""
+    if str is bytes and not isinstance(value, bytes):
+        return value.encode('utf-8')
+    return value
+
+
+def clean_name(name):
+    """Lowercase, trimmed, single-spaced form used as the lookup key"""
+    return _SPACES_RE.sub(' ', _text(name).lower().strip())
+
+
+def slugify(name):
+    """Folder name for a studio that is not in the table ('' if nothing is left)"""
+    normalized = _SLUG_DROP_RE.sub('', clean_name(name))
+    normalized = _SPACES_RE.sub('-', normalized)
+    return _HYPHENS_RE.sub('-', normalized).strip('-')
+
+
+def _word_char(char):
+    return char < u'\x80' and char.isalnum()
+
+
+class NameAutomaton(object):
+    """
+    Aho-Corasick automaton over cleaned studio names
+
+    Every state keeps the names ending there, including those of its
+    failure chain, longest first, so one pass over the text sees every
+    contained name.
+    """
+
+    def __init__(self, names):
+        # names: {cleaned name: slug}
+        self.goto = [{}]
+        self.outputs = [[]]
+        for name, slug in names.items():
+            state = 0
+            for char in name:
+                nxt = self.goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][char] = nxt
+                    self.goto.append({})
+                    self.outputs.append([])
+                state = nxt
+            self.outputs[state].append((len(name), slug, _word_char(name[0]), _word_char(name[-1])))
+
+        self.fail = [0] * len(self.goto)
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.outputs[nxt] = self.outputs[nxt] + self.outputs[self.fail[nxt]]
+        for outputs in self.outputs:
+            outputs.sort(reverse=True)
+
+    def search(self, text):
+        """Slug of the longest (then leftmost) name contained in text, or None"""
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        best = None     # (length, -start, slug)
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, slug, left, right in outputs[state]:
+                if best is not None and length < best[0]:
+                    break
+                start = end + 1 - length
+                if left and start > 0 and _word_char(text[start - 1]):
+                    continue
+                if right and end + 1 < len(text) and _word_char(text[end + 1]):
+                    continue
+                if best is None or (length, -start) > best[:2]:
+                    best = (length, -start, slug)
+                break
+        return best[2] if best else None
+
+
+class StudioTable(object):
+    """
+    Compiled studio table
+
+    Args:
+        path: studios.json to load (default: the one next to this script)
+    """
+
+    def __init__(self, path=STUDIOS_FILE):
+        self.path = path
+        started = time.time()
+        with io.open(path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        self.display = {}       # slug -> display name
+        self.by_name = {}       # cleaned name -> slug
+        self.by_label = {}      # code label -> slug
+        for studio in data['studios']:
+            slug = _native(studio['slug'])
+            self.display[slug] = _native(studio['name'])
+            for name in [studio['name'], slug] + studio.get('aliases', []):
+                self.by_name.setdefault(clean_name(name), slug)
+            for label in studio.get('labels', []):
+                self.by_label[label.upper()] = slug
+        self.automaton = NameAutomaton(self.by_name)
+        self.load_seconds = time.time() - started
+
+    def normalize(self, studio_name, default='others'):
+        """
+        Folder name (slug) for a studio name
+
+        Exact match first, then the longest known name contained in it,
+        otherwise the slugified name; default when nothing is left.
+        """
+        if not studio_name:
+            return default
+        return self.lookup(studio_name) or _native(slugify(studio_name)) or default
+
+    def lookup(self, studio_name):
+        """Slug of a listed studio the name is, or contains; None otherwise"""
+        if not studio_name:
+            return None
+        cleaned = clean_name(studio_name)
+        return self.by_name.get(cleaned) or self.automaton.search(cleaned)
+
+    def studio_for_label(self, label, default=None):
+        """Display name of the studio a code label belongs to"""
+        slug = self.by_label.get(label.upper())
+        return self.display[slug] if slug else default
+
+    def label_studios(self):
+        """{label: display studio name} for every known label"""
+        return dict((label, self.display[slug]) for label, slug in self.by_label.items())
+
+    def slugs(self):
+        """Every studio folder name in the table"""
+        return set(self.display)
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_studio_table():
+    """Process-wide table compiled from studios.json"""
+    global _table
+    with _table_lock:
+        if _table is None:
+            _table = StudioTable()
+        return _table
+
+
+def _substring_normalize(mapping, studio_name):
+    """The exact-then-substring loop organize_v2 used before this table"""
+    if studio_name in mapping:
+        return mapping[studio_name]
+    studio_lower = studio_name.lower()
+    for key, value in mapping.items():
+        if key.lower() in studio_lower or studio_lower in key.lower():
+            return value
+    return 'others'
+
+
+def bench(rounds):
+    """Print load time and lookups/sec for exact, contained and unknown names"""
+    loads = []
+    for _ in range(20):
+        loads.append(StudioTable().load_seconds)
+    table = get_studio_table()
+    print("Loaded {} studios, {} names, {} labels, {} automaton states in {:.2f} ms (best of 20)".format(
+        len(table.display), len(table.by_name), len(table.by_label), len(table.automaton.goto),
+        min(loads) * 1000))
+
+    names = sorted(table.by_name)
+    samples = [
+        ('exact', [name.upper() for name in names]),
+        ('contained', [u'{} ({})'.format(name, u'作品') for name in names]),
+        ('unknown', [u'Unknown Studio {}'.format(i) for i in range(len(names))]),
+    ]
+    print("\n{:10} {:>14} {:>14}".format('names', 'table/s', 'substring/s'))
+    for kind, batch in samples:
+        rates = []
+        for func in (table.normalize, lambda name: _substring_normalize(table.by_name, name)):
+            started = time.time()
+            for _ in range(rounds):
+                for name in batch:
+                    func(name)
+            elapsed = time.time() - started
+            rates.append(rounds * len(batch) / elapsed if elapsed else float('inf'))
+        print("{:10} {:14.0f} {:14.0f}".format(kind, rates[0], rates[1]))
+
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ['--bench']:
+        rounds = int(args[args.index('--rounds') + 1]) if '--rounds' in args else 200
+        bench(rounds)
+        return
+    if len(args) == 2 and args[0] == '--label':
+        studio = get_studio_table().studio_for_label(args[1])
+        if not studio:
+            sys.exit(1)
+        print(studio)
+        return
+    if len(args) != 1:
+        print("Usage: python studio_table.py <studio_name> | --label <LABEL> | --bench [--rounds N]")
+        sys.exit(1)
+    print(get_studio_table().normalize(args[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目录扫描 - 基于 os.scandir，找到第一个视频即停止
+
+Path.rglob('*') lists every file below a folder (samples, subtitles,
+screenshots) only to learn whether one of them is a video. The scanner here
+walks with os.scandir, reuses the type information each DirEntry already
+carries, stops descending as soon as a video is found and yields items
+lazily, so --first-only stops after the first item.
+
+Usage:
+    from video_scan import ScanStats, iter_items
+    stats = ScanStats()
+    for path, is_folder in iter_items(directory, stats=stats):
+        ...
+    print(stats.format())
+"""
+
+import os
+
+VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.wmv', '.flv', '.mov', '.m4v', '.rmvb'}
+
+
+class ScanStats:
+    """
+    Filesystem calls made by a scan
+
+    scandir: directories listed (one opendir/getdents sequence each)
+    stat: entries whose type had to be looked up with stat (symlinks; other
+          entries carry their type from the directory listing)
+    """
+
+    def __init__(self):
+        self.scandir = 0
+        self.stat = 0
+        self.entries = 0
+
+    def format(self):
+        return f"{self.scandir} directories listed, {self.entries} entries, {self.stat} stat calls"
+
+
+def list_dir(path, stats=None):
+    """Entries of a directory sorted by name ([] if it cannot be read)"""
+    if stats is not None:
+        stats.scandir += 1
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError:
+        return []
+    if stats is not None:
+        stats.entries += len(entries)
+    return sorted(entries, key=lambda entry: entry.name)
+
+
+def _is_file(entry, stats):
+    if stats is not None and entry.is_symlink():
+        stats.stat += 1
+    try:
+        return entry.is_file()
+    except OSError:
+        return False
+
+
+def _is_dir(entry, stats):
+    if stats is not None and entry.is_symlink():
+        stats.stat += 1
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def is_video_entry(entry, extensions=VIDEO_EXTENSIONS, stats=None):
+    """True for a regular file with a video extension"""
+    return (os.path.splitext(entry.name)[1].lower() in extensions
+            and _is_file(entry, stats))
+
+
+def contains_video(path, extensions=VIDEO_EXTENSIONS, stats=None):
+    """
+    True if any file below path is a video
+
+    Files of a directory are checked before descending into its
+    subdirectories; symlinked directories are not followed.
+    """
+    pending = [path]
+    while pending:
+        subdirs = []
+        for entry in list_dir(pending.pop(), stats):
+            if is_video_entry(entry, extensions, stats):
+                return True
+            if not entry.is_symlink() and _is_dir(entry, stats):
+                subdirs.append(entry.path)
+        pending.extend(reversed(subdirs))
+    return False
+
+
+def iter_items(directory, expand=(), skip_folders=False, extensions=VIDEO_EXTENSIONS, stats=None):
+    """
+    Lazily yield (path, is_folder) for top-level videos and video folders
+
+    Args:
+        directory: Directory to scan
+        expand: Names of top-level folders whose children are yielded as
+                items themselves (e.g. others/unknown when retrying)
+        skip_folders: Do not yield the remaining top-level folders
+        extensions: Video file extensions
+        stats: ScanStats to count filesystem calls
+
+    Items come in sorted path order.
+    """
+    entries = list_dir(directory, stats)
+    if expand:
+        # Same order as sorting the yielded paths: children of an expanded
+        # folder sort under "name/"
+        entries.sort(key=lambda entry: entry.name + '/'
+                     if entry.name in expand and _is_dir(entry, stats) else entry.name)
+
+    for entry in entries:
+        if is_video_entry(entry, extensions, stats):
+            yield entry.path, False
+        elif _is_dir(entry, stats):
+            if entry.name in expand:
+                for child in list_dir(entry.path, stats):
+                    if is_video_entry(child, extensions, stats):
+                        yield child.path, False
+                    elif _is_dir(child, stats) and contains_video(child.path, extensions, stats):
+                        yield child.path, True
+            elif not skip_folders and contains_video(entry.path, extensions, stats):
+                yield entry.path, True